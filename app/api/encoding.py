@@ -0,0 +1,69 @@
+from flask import current_app, request, Response
+from typing import Any
+import gzip
+import json
+
+# Optional fast encoders and compressors
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _default(obj: Any):
+    """Serialize numpy arrays and scalars."""
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    """Encode a payload compactly, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def negotiate_encoding(accept_encoding: str) -> str:
+    """Pick the best supported content coding the client accepts."""
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return 'identity'
+
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    """Build a JSON response, compressed when the client accepts it."""
+    body = dumps(payload)
+    response = Response(body, status=status, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+
+    if len(body) < current_app.config.get('API_COMPRESS_MIN_SIZE', 1024):
+        return response
+
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+    if encoding == 'br':
+        response.set_data(brotli.compress(body, quality=current_app.config.get('API_BROTLI_QUALITY', 5)))
+    elif encoding == 'gzip':
+        response.set_data(gzip.compress(body, compresslevel=current_app.config.get('API_GZIP_LEVEL', 6)))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
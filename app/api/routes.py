@@ -1,93 +1,179 @@
-from flask import jsonify, request, current_app
+from flask import jsonify, request, current_app, Response, send_file, stream_with_context
 from app.api import bp
-from app.services.geocoding import GeocodingService
-from app.services.analysis import AnalysisService
-from app.services.visualization import VisualizationService
-from app.services.reporting import ReportingService
+from app.api.encoding import dumps, json_response
 from werkzeug.utils import secure_filename
 import os
+import threading
 
-# Initialize services
+# Initialize services lazily. The service modules pull in pandas, numpy,
+# folium, geopy and reportlab, so they are imported on first use rather
+# than when the blueprint is registered.
 geocoding_service = None
 analysis_service = None
 visualization_service = None
 reporting_service = None
+address_autocomplete = None
+upload_store = None
+
+# Request bodies accepted as a raw (non-multipart) upload
+RAW_UPLOAD_TYPES = {'text/csv', 'application/gzip', 'application/zstd', 'application/octet-stream'}
 
 def get_geocoding_service():
     global geocoding_service
     if geocoding_service is None:
+        from app.services.geocoding import GeocodingService
         geocoding_service = GeocodingService()
     return geocoding_service
 
 def get_analysis_service():
     global analysis_service
     if analysis_service is None:
+        from app.services.analysis import AnalysisService
         analysis_service = AnalysisService()
     return analysis_service
 
 def get_visualization_service():
     global visualization_service
     if visualization_service is None:
+        from app.services.visualization import VisualizationService
         visualization_service = VisualizationService()
     return visualization_service
 
 def get_reporting_service():
     global reporting_service
     if reporting_service is None:
+        from app.services.reporting import ReportingService
         reporting_service = ReportingService()
     return reporting_service
 
+def get_upload_store():
+    global upload_store
+    if upload_store is None:
+        from app.services.uploads import UploadStore
+        upload_store = UploadStore()
+    return upload_store
+
+def refine_geocodes_in_background(app, analysis_id):
+    """Refine ZIP-centroid coordinates with street-level geocodes off the request path."""
+    def run():
+        with app.app_context():
+            try:
+                result = get_analysis_service().refine_geocodes(analysis_id, get_geocoding_service())
+                app.logger.info(f'Refined {result["refined"]} coordinates for {analysis_id}')
+            except Exception as e:
+                app.logger.error(f'Error refining geocodes for {analysis_id}: {str(e)}')
+    
+    thread = threading.Thread(target=run, name=f'refine-{analysis_id}', daemon=True)
+    thread.start()
+    return thread
+
+def get_address_autocomplete():
+    global address_autocomplete
+    if address_autocomplete is None:
+        from app.services.autocomplete import AddressAutocomplete
+        address_autocomplete = AddressAutocomplete()
+    return address_autocomplete
+
 @bp.route('/upload', methods=['POST'])
 def upload_file():
-    """Handle file upload."""
+    """Handle file upload.
+
+    Accepts a multipart ``file`` or a raw request body (``?filename=``),
+    plain or gzip/zstd compressed. Content that was already processed
+    returns its existing analysis without reprocessing.
+    """
     try:
-        if 'file' not in request.files:
+        from app.services.uploads import UPLOAD_SUFFIXES, csv_name
+        
+        if 'file' in request.files:
+            file = request.files['file']
+            filename, stream = file.filename, file.stream
+        elif request.mimetype in RAW_UPLOAD_TYPES:
+            filename, stream = request.args.get('filename', 'upload.csv'), request.stream
+        else:
             current_app.logger.error('No file part in request')
             return jsonify({'error': 'No file part'}), 400
         
-        file = request.files['file']
-        if file.filename == '':
+        if filename == '':
             current_app.logger.error('No selected file')
             return jsonify({'error': 'No selected file'}), 400
         
-        if not file.filename.endswith('.csv'):
-            current_app.logger.error(f'Invalid file type: {file.filename}')
-            return jsonify({'error': 'Only CSV files are allowed'}), 400
+        if not filename.endswith(UPLOAD_SUFFIXES):
+            current_app.logger.error(f'Invalid file type: {filename}')
+            return jsonify({'error': 'Only CSV files (optionally .gz or .zst compressed) are allowed'}), 400
         
-        if file:
+        try:
+            # Stream the body to disk, decompressing and hashing it on the way
+            store = get_upload_store()
             try:
-                # Create upload directory if it doesn't exist
-                upload_dir = current_app.config['UPLOAD_FOLDER']
-                os.makedirs(upload_dir, exist_ok=True)
-                
-                # Save the file
-                filename = secure_filename(file.filename)
-                file_path = os.path.join(upload_dir, filename)
-                file.save(file_path)
-                
-                current_app.logger.info(f'File saved successfully: {file_path}')
-                
-                # Process the uploaded file
-                analysis_service = get_analysis_service()
-                result = analysis_service.process_csv(file_path)
-                
-                if isinstance(result, dict) and result.get('error'):
-                    current_app.logger.error(f'Error processing CSV: {result["error"]}')
-                    return jsonify({'error': result['error']}), 400
-                
-                return jsonify({
-                    'message': 'File uploaded and processed successfully',
-                    'filename': filename,
-                    'analysis': result
-                }), 200
-                
-            except Exception as e:
-                current_app.logger.error(f'Error handling file upload: {str(e)}')
-                return jsonify({'error': f'Error processing file: {str(e)}'}), 500
+                stored = store.save_stream(stream)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            upload = {k: stored[k] for k in ('sha256', 'compression', 'received_bytes', 'csv_bytes')}
+            
+            analysis_service = get_analysis_service()
+            filename = secure_filename(csv_name(filename))
+            
+            # Same content as an earlier upload: reuse its analysis
+            existing = store.lookup(stored['sha256'])
+            if existing:
+                os.remove(stored['path'])
+                result = analysis_service.activate(existing['analysis_id'])
+                if not result.get('error'):
+                    current_app.logger.info(f'Upload matches analysis {existing["analysis_id"]}')
+                    return jsonify({
+                        'message': 'File already processed',
+                        'filename': filename,
+                        'duplicate': True,
+                        'upload': upload,
+                        'analysis': result
+                    }), 200
+                return jsonify({'error': result['error']}), 500
+            
+            file_path = os.path.join(store.upload_folder, filename)
+            os.replace(stored['path'], file_path)
+            current_app.logger.info(f'File saved successfully: {file_path}')
+            
+            # Process the uploaded file
+            result = analysis_service.process_csv(file_path)
+            
+            if isinstance(result, dict) and result.get('error'):
+                current_app.logger.error(f'Error processing CSV: {result["error"]}')
+                return jsonify({'error': result['error']}), 400
+            store.record(stored['sha256'], result['analysis_id'], filename)
+            
+            # Households already have ZIP-centroid coordinates; refine them in the background
+            if current_app.config.get('GEOCODING_BACKGROUND_REFINE', False):
+                refine_geocodes_in_background(current_app._get_current_object(), result['analysis_id'])
+            
+            return jsonify({
+                'message': 'File uploaded and processed successfully',
+                'filename': filename,
+                'duplicate': False,
+                'upload': upload,
+                'analysis': result
+            }), 200
+            
+        except Exception as e:
+            current_app.logger.error(f'Error handling file upload: {str(e)}')
+            return jsonify({'error': f'Error processing file: {str(e)}'}), 500
     except Exception as e:
         current_app.logger.error(f'Unexpected error in upload_file: {str(e)}')
         return jsonify({'error': 'An unexpected error occurred'}), 500
 
+@bp.route('/upload/<analysis_id>/issues', methods=['GET'])
+def upload_issues(analysis_id):
+    """Download the per-row validation issues of an upload as CSV."""
+    try:
+        issues_file = get_analysis_service().issues_file(analysis_id)
+        return send_file(issues_file, mimetype='text/csv', as_attachment=True,
+                         download_name=os.path.basename(issues_file))
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error in upload_issues: {str(e)}")
+        return jsonify({'error': 'Could not load validation issues. Please try again.'}), 500
+
 @bp.route('/geocode', methods=['POST'])
 def geocode_address():
     """Geocode an address."""
@@ -121,6 +207,55 @@ def geocode_address():
         current_app.logger.error(f"Error in geocode_address: {str(e)}")
         return jsonify({'error': 'Geocoding service error. Please try again.'}), 500
 
+@bp.route('/geocode/autocomplete', methods=['GET'])
+def autocomplete_address():
+    """Suggest known addresses with coordinates as the user types."""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 10, type=int) or 10, 50)
+        if len(query) < 2:
+            return jsonify({'suggestions': []}), 200
+        
+        dataset = get_analysis_service().datasets.current()
+        autocomplete = get_address_autocomplete()
+        autocomplete.refresh(get_geocoding_service(), dataset)
+        
+        return jsonify({'suggestions': autocomplete.suggest(query, limit)}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in autocomplete_address: {str(e)}")
+        return jsonify({'error': 'Autocomplete failed. Please try again.'}), 500
+
+@bp.route('/reverse-geocode', methods=['POST'])
+def reverse_geocode():
+    """Resolve a point picked on the map to an address."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        try:
+            latitude = float(data['lat'])
+            longitude = float(data['lng'])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Numeric lat and lng are required'}), 400
+        
+        geocoding_service = get_geocoding_service()
+        result = geocoding_service.reverse_geocode(latitude, longitude)
+        
+        if result is None:
+            return jsonify({'error': 'Could not find an address for this point.'}), 400
+        
+        return jsonify({
+            'address': result['address'],
+            'lat': latitude,
+            'lng': longitude
+        }), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in reverse_geocode: {str(e)}")
+        return jsonify({'error': 'Geocoding service error. Please try again.'}), 500
+
 @bp.route('/analyze', methods=['POST'])
 def analyze_data():
     """Analyze data based on directions and threshold."""
@@ -132,6 +267,11 @@ def analyze_data():
         reference_point = data.get('reference_point')
         directions = data.get('directions', [])
         threshold = data.get('threshold')
+        # 'rows' (default) or 'columnar' parallel arrays
+        format = data.get('format') or request.args.get('format', 'rows')
+        # Optionally return only the first page; the rest via /analyze/<result_id>/points
+        page_size = data.get('page_size')
+        sort = data.get('sort', 'contribution')
         
         if not reference_point:
             return jsonify({'error': 'Reference point is required'}), 400
@@ -139,34 +279,400 @@ def analyze_data():
         if not directions:
             return jsonify({'error': 'At least one direction must be selected'}), 400
         
+        if format not in ('rows', 'columnar'):
+            return jsonify({'error': f'Unsupported points format: {format}'}), 400
+        
         # Add threshold to reference point for filtering
         reference_point['threshold'] = threshold
         
         analysis_service = get_analysis_service()
         
-        # Load the most recent processed data
-        processed_files = [f for f in os.listdir(current_app.config['UPLOAD_FOLDER']) 
-                         if f.startswith('processed_') and f.endswith('.csv')]
-        if not processed_files:
+        # Use the shared dataset published by the most recent upload
+        if not analysis_service.load_current():
             return jsonify({'error': 'No processed data available'}), 400
         
-        # Get the most recent file
-        latest_file = sorted(processed_files)[-1]
-        if not analysis_service.load_data(latest_file):
-            return jsonify({'error': 'Could not load processed data'}), 500
-        
         # Perform analysis
-        result = analysis_service.analyze_directions(reference_point, directions)
+        result = analysis_service.analyze_directions(
+            reference_point, directions, None if page_size else format,
+            region_id=data.get('region_id'),
+            filters=data.get('filters')
+        )
         
         if result.get('error'):
             return jsonify({'error': result['error']}), 400
         
-        return jsonify(result), 200
+        if page_size:
+            limit = min(int(page_size), current_app.config.get('ANALYSIS_PAGE_SIZE_MAX', 1000))
+            try:
+                page = analysis_service.result_page(result['result_id'], sort, limit=limit)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            result.update(points=page['points'], sort=sort, next_cursor=page['next_cursor'])
+        
+        return json_response(result, 200)
         
     except Exception as e:
         current_app.logger.error(f"Error in analyze_data: {str(e)}")
         return jsonify({'error': 'Analysis failed. Please try again.'}), 500
 
+@bp.route('/analyze/sectors', methods=['POST'])
+def analyze_sectors():
+    """Aggregate contributions by compass sector and distance ring."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        reference_point = data.get('reference_point')
+        if not reference_point or 'lat' not in reference_point or 'lng' not in reference_point:
+            return jsonify({'error': 'Reference point is required'}), 400
+        
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        try:
+            result = analysis_service.sector_matrix(
+                reference_point,
+                sectors=data.get('sectors'),
+                rings=data.get('rings'),
+                threshold=data.get('threshold'),
+                region_id=data.get('region_id')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 400
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in analyze_sectors: {str(e)}")
+        return jsonify({'error': 'Sector analysis failed. Please try again.'}), 500
+
+@bp.route('/analyze/sites', methods=['POST'])
+def analyze_sites():
+    """Compare directional statistics for several candidate reference points."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        sites = data.get('sites')
+        if not sites or not isinstance(sites, list):
+            return jsonify({'error': 'At least one site is required'}), 400
+        
+        max_sites = current_app.config.get('ANALYSIS_MAX_SITES', 50)
+        if len(sites) > max_sites:
+            return jsonify({'error': f'At most {max_sites} sites can be compared at once'}), 400
+        
+        for site in sites:
+            if not isinstance(site, dict) or not all(
+                    isinstance(site.get(key), (int, float)) for key in ('lat', 'lng')):
+                return jsonify({'error': 'Each site needs numeric lat and lng'}), 400
+        
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        result = analysis_service.analyze_sites(
+            sites,
+            directions=data.get('directions'),
+            rings=data.get('rings'),
+            threshold=data.get('threshold')
+        )
+        
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 400
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in analyze_sites: {str(e)}")
+        return jsonify({'error': 'Site comparison failed. Please try again.'}), 500
+
+@bp.route('/analyze/top', methods=['POST'])
+def analyze_top():
+    """The k largest givers (overall or by component) or the k nearest households."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        try:
+            k = int(data.get('k', 50))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'k must be an integer'}), 400
+        if k < 1:
+            return jsonify({'error': 'k must be at least 1'}), 400
+        k = min(k, current_app.config.get('ANALYSIS_PAGE_SIZE_MAX', 1000))
+        
+        reference_point = data.get('reference_point')
+        if reference_point and ('lat' not in reference_point or 'lng' not in reference_point):
+            return jsonify({'error': 'Reference point needs lat and lng'}), 400
+        
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        try:
+            result = analysis_service.top_k(
+                k,
+                by=data.get('by', 'contribution'),
+                reference_point=reference_point,
+                directions=data.get('directions'),
+                threshold=data.get('threshold'),
+                region_id=data.get('region_id'),
+                filters=data.get('filters')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 400
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in analyze_top: {str(e)}")
+        return jsonify({'error': 'Top-k query failed. Please try again.'}), 500
+
+@bp.route('/analyze/filter', methods=['POST'])
+def analyze_filter():
+    """Households matching a declarative filter; page them via /analyze/<result_id>/points."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        filters = data.get('filters')
+        if not filters:
+            return jsonify({'error': 'filters are required'}), 400
+        
+        reference_point = data.get('reference_point')
+        if reference_point and ('lat' not in reference_point or 'lng' not in reference_point):
+            return jsonify({'error': 'Reference point needs lat and lng'}), 400
+        
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        try:
+            result = analysis_service.query(filters, reference_point, explain=bool(data.get('explain')))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 400
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in analyze_filter: {str(e)}")
+        return jsonify({'error': 'Filter query failed. Please try again.'}), 500
+
+@bp.route('/analyze/<result_id>/points', methods=['GET'])
+def analysis_points(result_id):
+    """Page through, or stream as NDJSON, the points of a stored analysis."""
+    try:
+        sort = request.args.get('sort', 'contribution')
+        analysis_service = get_analysis_service()
+        
+        if request.args.get('format') == 'ndjson':
+            batches = analysis_service.iter_result_points(result_id, sort)
+            
+            def generate():
+                for points in batches:
+                    yield b''.join(dumps(point) + b'\n' for point in points)
+            
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        limit = min(request.args.get('limit', 100, type=int) or 100,
+                    current_app.config.get('ANALYSIS_PAGE_SIZE_MAX', 1000))
+        page = analysis_service.result_page(result_id, sort, request.args.get('cursor'), limit,
+                                            details=request.args.get('details') in ('1', 'true'))
+        return json_response(page, 200)
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error in analysis_points: {str(e)}")
+        return jsonify({'error': 'Could not load analysis points. Please try again.'}), 500
+
+@bp.route('/cube', methods=['POST'])
+def cube_rollup():
+    """Roll up or drill down contribution totals by postal code, city, band and direction."""
+    try:
+        data = request.get_json() or {}
+        
+        by = data.get('by', [])
+        if isinstance(by, str):
+            by = [by]
+        filters = data.get('filters') or {}
+        if not isinstance(filters, dict):
+            return jsonify({'error': 'Filters must map dimensions to labels'}), 400
+        
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        try:
+            result = analysis_service.rollup(by, filters, data.get('reference_point'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 400
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in cube_rollup: {str(e)}")
+        return jsonify({'error': 'Roll-up failed. Please try again.'}), 500
+
+@bp.route('/snapshots', methods=['GET'])
+def list_snapshots():
+    """List processed uploads that can be compared."""
+    try:
+        return jsonify({'snapshots': get_analysis_service().snapshots.list()}), 200
+    except Exception as e:
+        current_app.logger.error(f"Error in list_snapshots: {str(e)}")
+        return jsonify({'error': 'Could not list snapshots. Please try again.'}), 500
+
+@bp.route('/snapshots/compare', methods=['POST'])
+def compare_snapshots():
+    """Compare giving between two processed uploads, household by household."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        before_id, after_id = data.get('before'), data.get('after')
+        if not before_id or not after_id:
+            return jsonify({'error': 'Both before and after snapshot IDs are required'}), 400
+        
+        status = data.get('status')
+        if status not in (None, 'retained', 'new', 'lapsed'):
+            return jsonify({'error': f'Unsupported household status: {status}'}), 400
+        
+        reference_point = data.get('reference_point')
+        if reference_point and ('lat' not in reference_point or 'lng' not in reference_point):
+            return jsonify({'error': 'Reference point needs lat and lng'}), 400
+        
+        limit = min(int(data.get('limit', 50)), current_app.config.get('ANALYSIS_PAGE_SIZE_MAX', 1000))
+        result = get_analysis_service().compare_snapshots(before_id, after_id, reference_point, limit, status)
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 404
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in compare_snapshots: {str(e)}")
+        return jsonify({'error': 'Snapshot comparison failed. Please try again.'}), 500
+
+@bp.route('/regions', methods=['GET'])
+def list_regions():
+    """List the boundary regions stored for the current dataset."""
+    try:
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        return jsonify({'regions': analysis_service.list_regions()}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in list_regions: {str(e)}")
+        return jsonify({'error': 'Could not load regions. Please try again.'}), 500
+
+@bp.route('/regions', methods=['POST'])
+def create_region():
+    """Store a GeoJSON boundary (parish, neighborhood, zone) for the current dataset."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        geojson = data.get('geojson')
+        if not geojson:
+            return jsonify({'error': 'GeoJSON polygon is required'}), 400
+        
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        try:
+            result = analysis_service.add_region(data.get('name'), geojson)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 400
+        
+        return json_response(result, 201)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in create_region: {str(e)}")
+        return jsonify({'error': 'Could not store region. Please try again.'}), 500
+
+@bp.route('/regions/<region_id>', methods=['GET'])
+def region_summary(region_id):
+    """Households and contribution statistics inside a stored region."""
+    try:
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        result = analysis_service.region_summary(region_id)
+        if result.get('error'):
+            return jsonify({'error': result['error']}), 404
+        
+        return json_response(result, 200)
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in region_summary: {str(e)}")
+        return jsonify({'error': 'Could not summarize region. Please try again.'}), 500
+
+@bp.route('/regions/<region_id>', methods=['DELETE'])
+def delete_region(region_id):
+    """Remove a stored region."""
+    try:
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        if not analysis_service.remove_region(region_id):
+            return jsonify({'error': f'Unknown region: {region_id}'}), 404
+        
+        return jsonify({'deleted': region_id}), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in delete_region: {str(e)}")
+        return jsonify({'error': 'Could not delete region. Please try again.'}), 500
+
+@bp.route('/export/<analysis_id>', methods=['GET'])
+def export_analysis(analysis_id):
+    """Stream analysis results as CSV, NDJSON, Parquet or Excel."""
+    try:
+        format = request.args.get('format', 'csv')
+        chunks, mimetype, filename = get_analysis_service().export_stream(analysis_id, format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error in export_analysis: {str(e)}")
+        return jsonify({'error': 'Export failed. Please try again.'}), 500
+    
+    # No Content-Length: the body is sent with chunked transfer encoding
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/visualization/map', methods=['POST'])
 def get_map():
     """Generate map visualization."""
@@ -189,6 +695,38 @@ def get_map():
     
     return jsonify({'map_file': os.path.basename(map_file)}), 200
 
+@bp.route('/visualization/choropleth', methods=['POST'])
+def get_choropleth():
+    """Render giving density per ZIP code or grid cell as a choropleth map."""
+    try:
+        data = request.get_json() or {}
+        analysis_id = data.get('analysis_id')
+        
+        # Make sure the latest upload is published before mapping the current dataset
+        if not analysis_id and not get_analysis_service().load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        
+        visualization_service = get_visualization_service()
+        try:
+            result = visualization_service.create_choropleth(
+                level=data.get('level', 'zip'),
+                metric=data.get('metric', 'sum'),
+                analysis_id=analysis_id,
+                cell_degrees=data.get('cell_degrees')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if result is None:
+            return jsonify({'error': 'Processed data not found'}), 404
+        
+        result['map_file'] = os.path.basename(result['map_file'])
+        return jsonify(result), 200
+        
+    except Exception as e:
+        current_app.logger.error(f"Error in get_choropleth: {str(e)}")
+        return jsonify({'error': 'Could not generate choropleth map'}), 500
+
 @bp.route('/visualization/chart', methods=['POST'])
 def get_chart_data():
     """Get data for charts."""
@@ -196,6 +734,17 @@ def get_chart_data():
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
+    # Charts by a cube dimension are answered from the pre-aggregated cube
+    if data.get('by'):
+        analysis_service = get_analysis_service()
+        if not analysis_service.load_current():
+            return jsonify({'error': 'No processed data available'}), 400
+        try:
+            data = {'rollup': analysis_service.rollup([data['by']], data.get('filters'),
+                                                      data.get('reference_point'))}
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
     visualization_service = get_visualization_service()
     chart_data = visualization_service.create_chart_data(data)
     
@@ -225,4 +774,28 @@ def generate_report():
     if report_file is None:
         return jsonify({'error': f'Could not generate {format.upper()} report'}), 500
     
-    return jsonify({'report_file': os.path.basename(report_file)}), 200 
\ No newline at end of file
+    return jsonify({'report_file': os.path.basename(report_file)}), 200
+
+@bp.route('/reports/letters', methods=['POST'])
+def generate_letters():
+    """Render a mail-merge letter for every household of a stored analysis, as one PDF."""
+    try:
+        data = request.get_json()
+        if not data or not data.get('result_id'):
+            return jsonify({'error': 'result_id is required'}), 400
+        
+        results = get_analysis_service().get_analysis_results(data['result_id'])
+        if not results:
+            return jsonify({'error': 'Analysis results not found'}), 404
+        
+        try:
+            result = get_reporting_service().generate_letters(data['result_id'], results, data.get('template'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(result), 200
+        
+    except FileNotFoundError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        current_app.logger.error(f"Error in generate_letters: {str(e)}")
+        return jsonify({'error': 'Letter generation failed. Please try again.'}), 500
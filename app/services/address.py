@@ -0,0 +1,214 @@
+from typing import Dict, Iterable, List
+import re
+
+# USPS Publication 28 street suffix abbreviations (common and variant spellings)
+STREET_SUFFIXES = {
+    'ALLEY': 'ALY', 'ALLEE': 'ALY', 'ALLY': 'ALY', 'ALY': 'ALY',
+    'ANNEX': 'ANX', 'ANX': 'ANX',
+    'ARCADE': 'ARC', 'ARC': 'ARC',
+    'AVENUE': 'AVE', 'AVENU': 'AVE', 'AVEN': 'AVE', 'AVN': 'AVE', 'AV': 'AVE', 'AVE': 'AVE',
+    'BAYOU': 'BYU', 'BAYOO': 'BYU', 'BYU': 'BYU',
+    'BEACH': 'BCH', 'BCH': 'BCH',
+    'BEND': 'BND', 'BND': 'BND',
+    'BLUFF': 'BLF', 'BLF': 'BLF',
+    'BOULEVARD': 'BLVD', 'BOULV': 'BLVD', 'BOUL': 'BLVD', 'BLVD': 'BLVD',
+    'BRANCH': 'BR', 'BR': 'BR',
+    'BRIDGE': 'BRG', 'BRG': 'BRG',
+    'BROOK': 'BRK', 'BRK': 'BRK',
+    'BYPASS': 'BYP', 'BYP': 'BYP',
+    'CANYON': 'CYN', 'CYN': 'CYN',
+    'CAPE': 'CPE', 'CPE': 'CPE',
+    'CAUSEWAY': 'CSWY', 'CSWY': 'CSWY',
+    'CENTER': 'CTR', 'CENTRE': 'CTR', 'CTR': 'CTR',
+    'CIRCLE': 'CIR', 'CIRCL': 'CIR', 'CRCLE': 'CIR', 'CIR': 'CIR',
+    'CLIFF': 'CLF', 'CLF': 'CLF',
+    'CLUB': 'CLB', 'CLB': 'CLB',
+    'COMMON': 'CMN', 'CMN': 'CMN',
+    'CORNER': 'COR', 'COR': 'COR',
+    'COURSE': 'CRSE', 'CRSE': 'CRSE',
+    'COURT': 'CT', 'CRT': 'CT', 'CT': 'CT',
+    'COVE': 'CV', 'CV': 'CV',
+    'CREEK': 'CRK', 'CRK': 'CRK',
+    'CRESCENT': 'CRES', 'CRES': 'CRES',
+    'CROSSING': 'XING', 'XING': 'XING',
+    'DRIVE': 'DR', 'DRIV': 'DR', 'DRV': 'DR', 'DR': 'DR',
+    'ESTATE': 'EST', 'EST': 'EST', 'ESTATES': 'ESTS', 'ESTS': 'ESTS',
+    'EXPRESSWAY': 'EXPY', 'EXPY': 'EXPY',
+    'EXTENSION': 'EXT', 'EXT': 'EXT',
+    'FALLS': 'FLS', 'FLS': 'FLS',
+    'FERRY': 'FRY', 'FRY': 'FRY',
+    'FIELD': 'FLD', 'FLD': 'FLD',
+    'FOREST': 'FRST', 'FRST': 'FRST',
+    'FREEWAY': 'FWY', 'FWY': 'FWY',
+    'GARDEN': 'GDN', 'GDN': 'GDN', 'GARDENS': 'GDNS', 'GDNS': 'GDNS',
+    'GATEWAY': 'GTWY', 'GTWY': 'GTWY',
+    'GLEN': 'GLN', 'GLN': 'GLN',
+    'GREEN': 'GRN', 'GRN': 'GRN',
+    'GROVE': 'GRV', 'GRV': 'GRV',
+    'HARBOR': 'HBR', 'HARBOUR': 'HBR', 'HBR': 'HBR',
+    'HAVEN': 'HVN', 'HVN': 'HVN',
+    'HEIGHTS': 'HTS', 'HTS': 'HTS',
+    'HIGHWAY': 'HWY', 'HIGHWY': 'HWY', 'HIWAY': 'HWY', 'HWY': 'HWY',
+    'HILL': 'HL', 'HL': 'HL', 'HILLS': 'HLS', 'HLS': 'HLS',
+    'HOLLOW': 'HOLW', 'HOLW': 'HOLW',
+    'ISLAND': 'IS', 'IS': 'IS',
+    'JUNCTION': 'JCT', 'JCT': 'JCT',
+    'KEY': 'KY', 'KY': 'KY',
+    'LAKE': 'LK', 'LK': 'LK', 'LAKES': 'LKS', 'LKS': 'LKS',
+    'LANDING': 'LNDG', 'LNDNG': 'LNDG', 'LNDG': 'LNDG',
+    'LANE': 'LN', 'LN': 'LN',
+    'LOOP': 'LOOP', 'LOOPS': 'LOOP',
+    'MALL': 'MALL',
+    'MANOR': 'MNR', 'MNR': 'MNR',
+    'MEADOW': 'MDW', 'MDW': 'MDW', 'MEADOWS': 'MDWS', 'MDWS': 'MDWS',
+    'MILL': 'ML', 'ML': 'ML',
+    'MOUNT': 'MT', 'MT': 'MT',
+    'MOUNTAIN': 'MTN', 'MTN': 'MTN',
+    'ORCHARD': 'ORCH', 'ORCH': 'ORCH',
+    'OVAL': 'OVAL',
+    'PARK': 'PARK', 'PARKS': 'PARK',
+    'PARKWAY': 'PKWY', 'PARKWY': 'PKWY', 'PKWAY': 'PKWY', 'PKY': 'PKWY', 'PKWY': 'PKWY',
+    'PASS': 'PASS',
+    'PATH': 'PATH',
+    'PIKE': 'PIKE',
+    'PINE': 'PNE', 'PNE': 'PNE', 'PINES': 'PNES', 'PNES': 'PNES',
+    'PLACE': 'PL', 'PL': 'PL',
+    'PLAINS': 'PLNS', 'PLNS': 'PLNS',
+    'PLAZA': 'PLZ', 'PLZ': 'PLZ',
+    'POINT': 'PT', 'PT': 'PT', 'POINTE': 'PT',
+    'PORT': 'PRT', 'PRT': 'PRT',
+    'RANCH': 'RNCH', 'RNCH': 'RNCH',
+    'RIDGE': 'RDG', 'RDG': 'RDG',
+    'RIVER': 'RIV', 'RIV': 'RIV',
+    'ROAD': 'RD', 'RD': 'RD',
+    'ROUTE': 'RTE', 'RTE': 'RTE',
+    'ROW': 'ROW',
+    'RUN': 'RUN',
+    'SHORE': 'SHR', 'SHR': 'SHR', 'SHORES': 'SHRS', 'SHRS': 'SHRS',
+    'SPRING': 'SPG', 'SPG': 'SPG', 'SPRINGS': 'SPGS', 'SPGS': 'SPGS',
+    'SQUARE': 'SQ', 'SQR': 'SQ', 'SQ': 'SQ',
+    'STATION': 'STA', 'STA': 'STA',
+    'STREET': 'ST', 'STRT': 'ST', 'STR': 'ST', 'ST': 'ST',
+    'SUMMIT': 'SMT', 'SMT': 'SMT',
+    'TERRACE': 'TER', 'TERR': 'TER', 'TER': 'TER',
+    'TRACE': 'TRCE', 'TRCE': 'TRCE',
+    'TRAIL': 'TRL', 'TRAILS': 'TRL', 'TRL': 'TRL',
+    'TURNPIKE': 'TPKE', 'TPKE': 'TPKE',
+    'VALLEY': 'VLY', 'VLY': 'VLY',
+    'VIEW': 'VW', 'VW': 'VW',
+    'VILLAGE': 'VLG', 'VLG': 'VLG',
+    'VISTA': 'VIS', 'VIS': 'VIS',
+    'WALK': 'WALK',
+    'WAY': 'WAY', 'WY': 'WAY',
+}
+
+DIRECTIONALS = {
+    'NORTH': 'N', 'SOUTH': 'S', 'EAST': 'E', 'WEST': 'W',
+    'NORTHEAST': 'NE', 'NORTHWEST': 'NW', 'SOUTHEAST': 'SE', 'SOUTHWEST': 'SW',
+    'N': 'N', 'S': 'S', 'E': 'E', 'W': 'W',
+    'NE': 'NE', 'NW': 'NW', 'SE': 'SE', 'SW': 'SW',
+}
+
+# USPS secondary unit designators
+UNIT_DESIGNATORS = {
+    'APARTMENT': 'APT', 'APT': 'APT',
+    'BUILDING': 'BLDG', 'BLDG': 'BLDG',
+    'DEPARTMENT': 'DEPT', 'DEPT': 'DEPT',
+    'FLOOR': 'FL', 'FL': 'FL',
+    'LOT': 'LOT',
+    'OFFICE': 'OFC', 'OFC': 'OFC',
+    'ROOM': 'RM', 'RM': 'RM',
+    'SPACE': 'SPC', 'SPC': 'SPC',
+    'SUITE': 'STE', 'STE': 'STE',
+    'TRAILER': 'TRLR', 'TRLR': 'TRLR',
+    'UNIT': 'UNIT',
+    '#': '#',
+}
+
+_ZIP4_PATTERN = re.compile(r'\b(\d{5})-\d{4}\b')
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s#,-]")
+_WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def _normalize_unit(tokens: List[str]) -> List[str]:
+    """Normalize a secondary unit such as 'Apartment # 4' to 'APT 4'."""
+    split = []
+    for token in tokens:
+        # '#4' -> '#', '4'
+        if token.startswith('#') and token != '#':
+            split.extend(['#', token[1:]])
+        else:
+            split.append(token)
+
+    normalized = []
+    for token in split:
+        # 'APT # 4' carries a redundant '#'
+        if token == '#' and normalized and normalized[-1] in UNIT_DESIGNATORS.values():
+            continue
+        normalized.append(UNIT_DESIGNATORS.get(token, token))
+    return normalized
+
+
+def _normalize_street(tokens: List[str]) -> List[str]:
+    """Apply USPS directional, suffix and unit standardization to a street line."""
+    # Split off the secondary unit, if any
+    unit_at = next((i for i, t in enumerate(tokens)
+                    if i > 1 and (t in UNIT_DESIGNATORS or t.startswith('#'))), len(tokens))
+    street, unit = list(tokens[:unit_at]), _normalize_unit(tokens[unit_at:])
+
+    name_start = 1 if street and street[0][0].isdigit() else 0
+    # Pre-directional: directly after the house number
+    if len(street) > name_start + 1 and street[name_start] in DIRECTIONALS:
+        street[name_start] = DIRECTIONALS[street[name_start]]
+        name_start += 1
+    # Post-directional: trailing direction after the street name
+    suffix_at = len(street) - 1
+    if suffix_at > name_start + 1 and street[suffix_at] in DIRECTIONALS:
+        street[suffix_at] = DIRECTIONALS[street[suffix_at]]
+        suffix_at -= 1
+    # Suffix: the last name token, as long as a name remains in front of it
+    if suffix_at > name_start and street[suffix_at] in STREET_SUFFIXES:
+        street[suffix_at] = STREET_SUFFIXES[street[suffix_at]]
+    return street + unit
+
+
+def canonicalize_address(address: str) -> str:
+    """Return the canonical cache key for a free-form US address.
+
+    Folds case, punctuation and whitespace, standardizes USPS street
+    suffixes, directionals and unit designators on the street line, and
+    truncates ZIP+4 codes to five digits. The street line (including any
+    unit on the next segment) is separated from the locality by one comma.
+    """
+    if not address:
+        return ''
+    text = _ZIP4_PATTERN.sub(r'\1', str(address).upper())
+    text = _PUNCTUATION_PATTERN.sub(' ', text)
+    segments = [_WHITESPACE_PATTERN.sub(' ', s).strip(' -') for s in text.split(',')]
+    segments = [s for s in segments if s]
+    if not segments:
+        return ''
+
+    street_tokens = segments[0].split(' ')
+    rest = segments[1:]
+    # A leading secondary-unit segment ('Apt 4', '#4') belongs to the street line
+    while rest and (rest[0].split(' ')[0] in UNIT_DESIGNATORS or rest[0].startswith('#')):
+        street_tokens += rest.pop(0).split(' ')
+
+    street = ' '.join(_normalize_street(street_tokens))
+    locality = ' '.join(rest)
+    return f'{street}, {locality}' if locality else street
+
+
+def dedup_report(addresses: Iterable[str]) -> Dict:
+    """Report how many distinct cache keys canonicalization saves."""
+    raw = [a for a in addresses if isinstance(a, str) and a.strip()]
+    stripped = {a.strip() for a in raw}
+    canonical = {canonicalize_address(a) for a in raw}
+    return {
+        'addresses': len(raw),
+        'unique_stripped': len(stripped),
+        'unique_canonical': len(canonical),
+        'keys_saved': len(stripped) - len(canonical),
+        'dedup_ratio': (1 - len(canonical) / len(stripped)) if stripped else 0.0
+    }
@@ -0,0 +1,143 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+# Bins per group for approximate quantiles
+APPROXIMATE_BINS = 256
+
+
+def grouped_stats(groups: np.ndarray, values: np.ndarray, group_count: int,
+                  quantiles: Sequence[float] = (0.5,),
+                  components: Optional[Dict[str, np.ndarray]] = None,
+                  value_order: Optional[np.ndarray] = None,
+                  approximate: bool = False) -> Dict:
+    """Compute every contribution statistic for every group in one grouped pass.
+
+    ``groups`` holds a group index per row (negative rows are ignored). The
+    result holds arrays of length ``group_count``: ``count`` (rows),
+    ``valued`` (rows with a non-NaN value), ``sum``, ``mean``, ``var``
+    (sample variance), ``min``, ``max``, one array per requested quantile
+    under ``quantiles`` and one per component under ``components``.
+
+    Exact quantiles, min and max come from a single (group, value) sort;
+    pass ``value_order`` (``np.argsort(values)``) when aggregating the same
+    values several times so that only a stable sort by group is needed.
+    With ``approximate=True`` quantiles are read from per-group histograms
+    instead, which avoids sorting altogether.
+    """
+    groups = np.asarray(groups)
+    values = np.asarray(values, dtype=np.float64)
+    in_group = groups >= 0
+    count = np.bincount(groups[in_group], minlength=group_count)
+
+    has_value = in_group & ~np.isnan(values)
+    valued_groups, valued_values = groups[has_value], values[has_value]
+    valued = np.bincount(valued_groups, minlength=group_count)
+    total = np.bincount(valued_groups, weights=valued_values, minlength=group_count)
+
+    present = valued > 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(present, total / valued, 0.0)
+        deviations = np.bincount(valued_groups, weights=(valued_values - mean[valued_groups]) ** 2,
+                                 minlength=group_count)
+        var = np.where(valued > 1, deviations / (valued - 1), 0.0)
+
+    minimum = np.zeros(group_count)
+    maximum = np.zeros(group_count)
+    if approximate:
+        if present.any():
+            minimum[present] = np.inf
+            maximum[present] = -np.inf
+            np.minimum.at(minimum, valued_groups, valued_values)
+            np.maximum.at(maximum, valued_groups, valued_values)
+        quantile_values = _histogram_quantiles(valued_groups, valued_values, group_count,
+                                               valued, minimum, maximum, quantiles)
+    else:
+        # Values ordered by (group, value): each group is one sorted run
+        if value_order is None:
+            ordered = valued_values[np.lexsort((valued_values, valued_groups))]
+        else:
+            by_value = value_order[has_value[value_order]]
+            ordered = values[by_value][np.argsort(groups[by_value], kind='stable')]
+        starts = np.cumsum(valued) - valued
+        if present.any():
+            minimum[present] = ordered[starts[present]]
+            maximum[present] = ordered[starts[present] + valued[present] - 1]
+        quantile_values = {q: _run_quantile(ordered, starts, valued, q) for q in quantiles}
+
+    result = {
+        'count': count,
+        'valued': valued,
+        'sum': total,
+        'mean': mean,
+        'var': var,
+        'min': minimum,
+        'max': maximum,
+        'quantiles': quantile_values,
+        'components': {}
+    }
+    for name, component in (components or {}).items():
+        component = np.nan_to_num(np.asarray(component, dtype=np.float64))
+        result['components'][name] = np.bincount(groups[in_group], weights=component[in_group],
+                                                  minlength=group_count)
+    return result
+
+
+def _run_quantile(ordered: np.ndarray, starts: np.ndarray, lengths: np.ndarray, q: float) -> np.ndarray:
+    """Linearly interpolated quantile of each sorted run (as numpy's default)."""
+    result = np.zeros(len(lengths))
+    present = lengths > 0
+    position = q * (lengths[present] - 1)
+    low = np.floor(position).astype(np.int64)
+    high = np.ceil(position).astype(np.int64)
+    base = starts[present]
+    fraction = position - low
+    result[present] = ordered[base + low] * (1 - fraction) + ordered[base + high] * fraction
+    return result
+
+
+def _histogram_quantiles(groups: np.ndarray, values: np.ndarray, group_count: int,
+                         lengths: np.ndarray, minimum: np.ndarray, maximum: np.ndarray,
+                         quantiles: Sequence[float]) -> Dict[float, np.ndarray]:
+    """Approximate quantiles from one histogram per group, without sorting."""
+    result = {q: np.zeros(group_count) for q in quantiles}
+    present = lengths > 0
+    if not present.any():
+        return result
+
+    # Each group's histogram spans its own [min, max]
+    width = np.where(maximum > minimum, (maximum - minimum) / APPROXIMATE_BINS, 1.0)
+    bins = np.clip(((values - minimum[groups]) / width[groups]).astype(np.int64), 0, APPROXIMATE_BINS - 1)
+    histogram = np.bincount(groups * APPROXIMATE_BINS + bins,
+                            minlength=group_count * APPROXIMATE_BINS).reshape(group_count, APPROXIMATE_BINS)
+    cumulative = np.cumsum(histogram, axis=1)
+
+    for q in quantiles:
+        target = q * (lengths - 1) + 1  # 1-based rank of the quantile
+        # First bin whose cumulative count reaches the target rank
+        bin_index = np.minimum((cumulative < target[:, np.newaxis]).sum(axis=1), APPROXIMATE_BINS - 1)
+        rows = np.arange(group_count)
+        before = np.where(bin_index > 0, cumulative[rows, np.maximum(bin_index - 1, 0)], 0)
+        in_bin = np.maximum(histogram[rows, bin_index], 1)
+        estimate = minimum + (bin_index + (target - before) / in_bin) * width
+        result[q] = np.where(present, np.clip(estimate, minimum, maximum), 0.0)
+    return result
+
+
+def stats_by_label(stats: Dict, labels: List[str]) -> Dict[str, Dict]:
+    """Convert grouped_stats arrays into ``{label: {statistic: value}}`` with native types."""
+    records = {}
+    for i, label in enumerate(labels):
+        record = {
+            'count': int(stats['count'][i]),
+            'sum': float(stats['sum'][i]),
+            'mean': float(stats['mean'][i]),
+            'var': float(stats['var'][i]),
+            'min': float(stats['min'][i]),
+            'max': float(stats['max'][i]),
+        }
+        for q, values in stats['quantiles'].items():
+            record['median' if q == 0.5 else f'p{round(q * 100):g}'] = float(values[i])
+        if stats['components']:
+            record['components'] = {name: float(values[i]) for name, values in stats['components'].items()}
+        records[label] = record
+    return records
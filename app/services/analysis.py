@@ -1,16 +1,85 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
+from collections import OrderedDict
 from datetime import datetime
+import hashlib
 import json
+import math
 import os
+import time
 from flask import current_app
+from app.services.aggregation import grouped_stats, stats_by_label
+from app.services.cube import ContributionCube
+from app.services.dataset import COMPONENT_COLUMNS, TEXT_COLUMNS, DatasetStore
+from app.services.export import EXPORT_FORMATS, StreamingExporter, normalize_format
+from app.services.filters import FilterContext, MaskCache, compile_filters
+from app.services.ingest import ingest_csv
+from app.services.validation import DEFAULT_REJECT
+from app.services.polygons import RegionStore
+from app.services.snapshots import SnapshotCatalog, SnapshotComparison
+from app.services.pagination import (SORT_CONTRIBUTION, SORT_DISTANCE, SORT_ORDERS,
+                                     decode_cursor, encode_cursor, stable_order, top_k_rows)
+from app.services.sectors import (CARDINAL_SECTORS, CELL_STATISTICS, PolarCache, SectorScheme,
+                                  aggregate_cells, classify, ring_labels, sector_matrix,
+                                  sector_scheme, site_sectors)
+from app.services.local_geocoding import PRECISION_STREET
+
+# Top-k rankings: name -> (column, largest first); distance is computed per reference point
+RANKINGS = {'contribution': ('contribution_amount', True), 'distance': (None, False),
+            **{name: (name, True) for name in COMPONENT_COLUMNS}}
+RANKING_ALIASES = {'taxable': 'taxable_donations'}
+
+# Columns written by exports, in order
+EXPORT_COLUMNS = ['address', 'display_name', 'latitude', 'longitude',
+                  'geo_precision', 'contribution_amount', 'direction']
+
+
+def points_as_rows(lat: List[float], lng: List[float], direction: List[str],
+                   contribution: List[float], display_name: List[str]) -> List[Dict]:
+    """Build the default points payload: one object per household."""
+    return [
+        {'lat': la, 'lng': ln, 'direction': d, 'contribution': c, 'display_name': n}
+        for la, ln, d, c, n in zip(lat, lng, direction, contribution, display_name)
+    ]
+
+
+def points_as_columns(lat: List[float], lng: List[float], direction: List[str],
+                      contribution: List[float], display_name: List[str]) -> Dict:
+    """Build the columnar points payload.
+
+    Each field is one array, index-aligned across fields, so key names are
+    sent once. Directions are dictionary-encoded: ``direction`` holds
+    indexes into ``directions``.
+    """
+    directions = sorted(set(direction))
+    codes = {name: code for code, name in enumerate(directions)}
+    return {
+        'format': 'columnar',
+        'count': len(lat),
+        'lat': lat,
+        'lng': lng,
+        'directions': directions,
+        'direction': [codes[d] for d in direction],
+        'contribution': contribution,
+        'display_name': display_name
+    }
+
 
 class AnalysisService:
     def __init__(self):
         self._upload_folder = None
-        self._df = None
+        self._dataset = None
+        self.datasets = DatasetStore()
+        self.regions = RegionStore()
+        self.snapshots = SnapshotCatalog(self.datasets)
         self.analysis_results = {}
+        self._sector_scheme = None
+        self._polar_cache = None
+        self._filter_cache = None
+        self._direction_cubes = OrderedDict()
+        self._contribution_order_version = None
+        self._contribution_order_cache = None
     
     @property
     def upload_folder(self):
@@ -20,87 +89,404 @@ class AnalysisService:
         return self._upload_folder
     
     def load_data(self, filename: str) -> bool:
-        """Load data from CSV file."""
+        """Load data from a processed CSV file via the shared dataset store."""
         try:
-            file_path = os.path.join(self.upload_folder, filename)
-            self._df = pd.read_csv(file_path)
-            return True
+            self._dataset = self.datasets.open_file(filename)
+            return self._dataset is not None
         except Exception as e:
             current_app.logger.error(f"Error loading data: {str(e)}")
             return False
     
-    def analyze_directions(self, reference_point: Dict[str, float], directions: List[str]) -> Dict:
-        """Analyze data based on cardinal directions from reference point."""
-        if self._df is None:
+    def load_current(self) -> bool:
+        """Load the current shared dataset, publishing the latest upload if none is set."""
+        try:
+            self._dataset = self.datasets.current()
+            if self._dataset is None:
+                latest_file = self.datasets.latest_processed_file()
+                if latest_file is None:
+                    return False
+                self._dataset = self.datasets.publish(latest_file)
+            return True
+        except Exception as e:
+            current_app.logger.error(f"Error loading current dataset: {str(e)}")
+            return False
+    
+    def _contribution_order(self, dataset) -> np.ndarray:
+        """argsort of contribution_amount, computed once per dataset version."""
+        if self._contribution_order_version != dataset.version:
+            self._contribution_order_cache = np.argsort(dataset['contribution_amount'], kind='stable')
+            self._contribution_order_version = dataset.version
+        return self._contribution_order_cache
+    
+    def _contribution_stats(self, dataset, groups: np.ndarray, group_count: int) -> Dict:
+        """Grouped contribution statistics, with component sums, for a dataset."""
+        return grouped_stats(
+            groups, dataset['contribution_amount'], group_count,
+            components={name: dataset[name] for name in COMPONENT_COLUMNS if name in dataset},
+            value_order=self._contribution_order(dataset)
+        )
+    
+    @property
+    def sector_scheme(self) -> SectorScheme:
+        """Direction sectors from DIRECTION_ANGLES, else DIRECTION_SECTORS (default 4)."""
+        if self._sector_scheme is None:
+            with current_app.app_context():
+                self._sector_scheme = sector_scheme(
+                    current_app.config.get('DIRECTION_ANGLES') or current_app.config.get('DIRECTION_SECTORS', 4)
+                )
+        return self._sector_scheme
+    
+    @property
+    def polar_cache(self) -> PolarCache:
+        """Bearings and distances per (dataset, reference point), bounded by POLAR_CACHE_SIZE."""
+        if self._polar_cache is None:
+            with current_app.app_context():
+                self._polar_cache = PolarCache(current_app.config.get('POLAR_CACHE_SIZE', 16))
+        return self._polar_cache
+    
+    @property
+    def filter_cache(self) -> MaskCache:
+        """Filter sub-masks per dataset version, bounded by FILTER_CACHE_SIZE."""
+        if self._filter_cache is None:
+            with current_app.app_context():
+                self._filter_cache = MaskCache(current_app.config.get('FILTER_CACHE_SIZE', 64))
+        return self._filter_cache
+    
+    def filter_mask(self, filters, reference_point: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, List[Dict]]:
+        """Evaluate a declarative filter (see compile_filters) over the loaded dataset.
+
+        Returns the mask and the plan steps, each marked as computed or
+        reused from the filter cache.
+        """
+        context = FilterContext(self._dataset, self.filter_cache, reference_point, self.sector_scheme,
+                                self.polar_cache, self.regions)
+        mask = compile_filters(filters).evaluate(context)
+        return mask, context.steps
+    
+    def region_mask(self, region_id: Optional[str]) -> Optional[np.ndarray]:
+        """Cached membership mask of a stored region over the loaded dataset."""
+        if region_id is None:
+            return None
+        return self.regions.mask(self._dataset, region_id)
+    
+    def analyze_directions(self, reference_point: Dict[str, float], directions: List[str],
+                           format: str = 'rows', region_id: Optional[str] = None, filters=None) -> Dict:
+        """Analyze data based on compass sectors around the reference point.
+
+        ``format='columnar'`` returns points as parallel arrays (see
+        points_as_columns) instead of one object per household, and
+        ``format=None`` leaves them out. Either way the matching rows are
+        stored under the returned ``result_id`` for paging (result_page).
+        With ``region_id`` only households inside that region are analyzed,
+        and with ``filters`` (see compile_filters) only those matching them.
+        """
+        if self._dataset is None:
             return {'error': 'No data loaded'}
         
+        scheme = self.sector_scheme
+        invalid = [d for d in directions if d not in scheme.names]
+        if invalid:
+            return {'error': f"Invalid directions: {', '.join(map(str, invalid))}"}
+        
         try:
-            # Initialize results
-            points = []
-            direction_counts = {
-                'north': 0,
-                'south': 0,
-                'east': 0,
-                'west': 0
-            }
+            dataset = self._dataset
+            inside = self.region_mask(region_id)
+            if filters:
+                matched, _ = self.filter_mask(filters, reference_point)
+                inside = matched if inside is None else inside & matched
             
-            # Process each record
-            for _, row in self._df.iterrows():
-                # Get direction based on reference point
-                direction = self.determine_direction(
-                    reference_point['lat'],
-                    reference_point['lng'],
-                    float(row['latitude']),
-                    float(row['longitude'])
-                )
-                
-                if direction in directions:
-                    # Add point to results
-                    points.append({
-                        'lat': float(row['latitude']),
-                        'lng': float(row['longitude']),
-                        'direction': direction,
-                        'contribution': float(row['contribution_amount']),
-                        'display_name': row['display_name']
-                    })
-                    direction_counts[direction] += 1
+            # Classify every household in one pass; those without coordinates get sector -1
+            placed = classify(dataset['latitude'], dataset['longitude'], reference_point, scheme,
+                              polar=self.polar_cache.get(dataset, reference_point))
+            wanted = [scheme.index(d) for d in directions]
+            groups = np.where(np.isin(placed['sector'], wanted), placed['sector'], -1)
+            if inside is not None:
+                groups = np.where(inside, groups, -1)
+            selected_rows = np.flatnonzero(groups >= 0)
+            direction_names = np.array(scheme.names)[groups[selected_rows]]
             
-            # Calculate contribution statistics
-            contributions = [p['contribution'] for p in points]
-            contribution_stats = {
-                'mean': float(np.mean(contributions)) if contributions else 0,
-                'median': float(np.median(contributions)) if contributions else 0,
-                'min': float(min(contributions)) if contributions else 0,
-                'max': float(max(contributions)) if contributions else 0,
-                'sum': float(sum(contributions)) if contributions else 0
-            }
+            # Per-direction and overall contribution statistics, one grouped pass each
+            by_direction = self._contribution_stats(dataset, groups, len(scheme))
+            overall = self._contribution_stats(dataset, np.where(groups >= 0, 0, -1), 1)
+            contribution_stats = stats_by_label(overall, ['all'])['all']
+            del contribution_stats['count']
+            
+            contributions = np.asarray(dataset['contribution_amount'][selected_rows])
             
             # Prepare statistics
             stats = {
-                'total_records': len(self._df),
-                'records_analyzed': len(points),
-                'income_filtered': len([p for p in points if p['contribution'] >= reference_point.get('threshold', 0)]),
-                'direction_filtered': direction_counts,
+                'total_records': len(dataset),
+                'region_records': int(np.count_nonzero(inside)) if inside is not None else None,
+                'records_analyzed': len(selected_rows),
+                'income_filtered': int(np.count_nonzero(contributions >= (reference_point.get('threshold') or 0))),
+                'direction_filtered': dict(zip(scheme.names, by_direction['count'].tolist())),
+                'direction_stats': {
+                    name: record for name, record in stats_by_label(by_direction, scheme.names).items()
+                    if name in directions
+                },
                 'contribution_stats': contribution_stats
             }
             
-            return {
+            result_id = self.result_id_for(dataset.version, reference_point, directions, region_id, filters)
+            self._store_result(result_id, {
+                'stats': stats,
+                'version': dataset.version,
+                'rows': selected_rows.astype(np.int64),
+                'directions': direction_names,
+                'reference_point': reference_point,
+                'timestamp': datetime.now().isoformat()
+            })
+            
+            result = {
+                'result_id': result_id,
                 'reference_point': reference_point,
-                'points': points,
+                'region_id': region_id,
+                'filters': filters,
                 'stats': stats
             }
+            if format is not None:
+                selected = {
+                    'lat': dataset['latitude'][selected_rows].tolist(),
+                    'lng': dataset['longitude'][selected_rows].tolist(),
+                    'direction': direction_names.tolist(),
+                    'contribution': contributions.tolist(),
+                    'display_name': dataset['display_name'][selected_rows].tolist()
+                }
+                if format == 'columnar':
+                    result['points'] = points_as_columns(**selected)
+                else:
+                    result['points'] = points_as_rows(**selected)
+            return result
             
         except Exception as e:
             current_app.logger.error(f"Error analyzing directions: {str(e)}")
             return {'error': str(e)}
     
+    def sector_matrix(self, reference_point: Dict[str, float], sectors=None,
+                      rings: Optional[List[float]] = None, threshold: Optional[float] = None,
+                      region_id: Optional[str] = None) -> Dict:
+        """Aggregate contributions over a sector x distance-ring matrix.
+
+        ``sectors`` is 4, 8, 16 or a ``{name: (start, end)}`` map and
+        defaults to the configured scheme; ``rings`` are ring edges in km
+        and default to DISTANCE_RINGS_KM. ``region_id`` restricts the
+        matrix to households inside a stored region.
+        """
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        
+        scheme = self.sector_scheme if sectors is None else sector_scheme(sectors)
+        if rings is None:
+            with current_app.app_context():
+                rings = current_app.config.get('DISTANCE_RINGS_KM', [])
+        rings = sorted(float(edge) for edge in rings)
+        
+        dataset = self._dataset
+        contributions = dataset['contribution_amount']
+        mask = np.asarray(contributions) >= threshold if threshold is not None else None
+        inside = self.region_mask(region_id)
+        if inside is not None:
+            mask = inside if mask is None else mask & inside
+        
+        matrix = sector_matrix(dataset['latitude'], dataset['longitude'], contributions,
+                               reference_point, scheme, rings, mask,
+                               polar=self.polar_cache.get(dataset, reference_point))
+        matrix['reference_point'] = reference_point
+        return matrix
+    
+    def analyze_sites(self, sites: List[Dict], directions: Optional[List[str]] = None,
+                      rings: Optional[List[float]] = None, threshold: Optional[float] = None) -> Dict:
+        """Directional statistics for many candidate reference points in one pass.
+
+        Each site gets count, sum, mean and median per direction (and per
+        distance ring when ``rings`` are given), plus its catchment: the
+        households for which it is the nearest site.
+        """
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        
+        scheme = self.sector_scheme
+        directions = directions or scheme.names
+        invalid = [d for d in directions if d not in scheme.names]
+        if invalid:
+            return {'error': f"Invalid directions: {', '.join(map(str, invalid))}"}
+        
+        with current_app.app_context():
+            chunk_size = current_app.config.get('ANALYSIS_SITE_CHUNK_ROWS', 65536)
+        rings = sorted(float(edge) for edge in rings or [])
+        ring_count = len(rings) + 1
+        wanted = [scheme.index(d) for d in directions]
+        
+        dataset = self._dataset
+        contributions = np.asarray(dataset['contribution_amount'])
+        included = contributions >= threshold if threshold is not None else np.ones(len(dataset), dtype=bool)
+        placed = site_sectors(dataset['latitude'], dataset['longitude'], sites, scheme, rings, chunk_size)
+        
+        # Catchments: each household counts once, towards its nearest site
+        has_site = included & (placed['nearest'] >= 0)
+        nearest = placed['nearest'][has_site]
+        catchment_count = np.bincount(nearest, minlength=len(sites))
+        catchment_sum = np.bincount(nearest, weights=np.nan_to_num(contributions[has_site]), minlength=len(sites))
+        
+        # Contributions are sorted once per dataset; per-site medians then only group by cell
+        value_order = self._contribution_order(dataset)
+        
+        results = []
+        for i, site in enumerate(sites):
+            sector = np.where(included, placed['sector'][i], -1)
+            by_direction = aggregate_cells(sector, contributions, len(scheme), value_order)
+            site_result = {
+                'site': site,
+                'records_analyzed': int(by_direction['count'][wanted].sum()),
+                'contribution_sum': float(by_direction['sum'][wanted].sum()),
+                'direction_stats': {
+                    scheme.names[s]: {name: by_direction[name][s].item() for name in CELL_STATISTICS}
+                    for s in wanted
+                },
+                'catchment': {'count': int(catchment_count[i]), 'sum': float(catchment_sum[i])}
+            }
+            if rings:
+                cells = np.where(sector >= 0, sector * ring_count + placed['ring'][i], -1)
+                by_cell = aggregate_cells(cells, contributions, len(scheme) * ring_count, value_order)
+                site_result['rings'] = {
+                    name: by_cell[name].reshape(len(scheme), ring_count)[wanted].tolist()
+                    for name in CELL_STATISTICS
+                }
+            results.append(site_result)
+        
+        return {
+            'sectors': list(directions),
+            'rings': ring_labels(rings) if rings else None,
+            'total_records': len(dataset),
+            'sites': results
+        }
+    
+    def top_k(self, k: int, by: str = 'contribution', reference_point: Optional[Dict[str, float]] = None,
+              directions: Optional[List[str]] = None, threshold: Optional[float] = None,
+              region_id: Optional[str] = None, filters=None) -> Dict:
+        """The k highest-ranked households, e.g. the 50 largest givers to the north.
+
+        ``by`` is contribution, a component (taxable_donations or taxable,
+        csa, offertory) or distance (nearest first, needs a reference
+        point). Direction, threshold, region and declarative ``filters`` are
+        masks over the columnar arrays and the ranking is a partial selection, so only k
+        rows are ever sorted or returned.
+        """
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        
+        by = RANKING_ALIASES.get(by, by)
+        if by not in RANKINGS:
+            return {'error': f"Unsupported ranking: {by} (use {', '.join(RANKINGS)})"}
+        column, largest = RANKINGS[by]
+        dataset = self._dataset
+        if column is not None and column not in dataset:
+            return {'error': f"Column not available in this dataset: {column}"}
+        if (by == 'distance' or directions) and not reference_point:
+            return {'error': 'Reference point is required for distance ranking and direction filters'}
+        
+        scheme = self.sector_scheme
+        invalid = [d for d in directions or [] if d not in scheme.names]
+        if invalid:
+            return {'error': f"Invalid directions: {', '.join(map(str, invalid))}"}
+        
+        mask = np.ones(len(dataset), dtype=bool)
+        if threshold is not None:
+            mask &= np.asarray(dataset['contribution_amount']) >= threshold
+        inside = self.region_mask(region_id)
+        if inside is not None:
+            mask &= inside
+        if filters:
+            mask &= self.filter_mask(filters, reference_point)[0]
+        
+        placed = None
+        if reference_point:
+            placed = classify(dataset['latitude'], dataset['longitude'], reference_point, scheme,
+                              polar=self.polar_cache.get(dataset, reference_point))
+            if directions:
+                mask &= np.isin(placed['sector'], [scheme.index(d) for d in directions])
+        
+        values = placed['distance_km'] if column is None else dataset[column]
+        rows = top_k_rows(values, mask, k, largest)
+        
+        points = []
+        for row in rows.tolist():
+            point = {
+                'lat': float(dataset['latitude'][row]),
+                'lng': float(dataset['longitude'][row]),
+                'contribution': float(dataset['contribution_amount'][row]),
+                'display_name': str(dataset['display_name'][row])
+            }
+            if placed is not None:
+                point['direction'] = scheme.names[placed['sector'][row]] if placed['sector'][row] >= 0 else None
+                point['distance_km'] = float(placed['distance_km'][row])
+            if column not in (None, 'contribution_amount'):
+                point[column] = float(dataset[column][row])
+            points.append(point)
+        
+        return {
+            'by': by,
+            'k': k,
+            'candidates': int(np.count_nonzero(mask & ~np.isnan(np.asarray(values, dtype=np.float64)))),
+            'points': points
+        }
+    
+    def query(self, filters, reference_point: Optional[Dict[str, float]] = None,
+              explain: bool = False) -> Dict:
+        """Households matching a declarative filter, stored for paging.
+
+        Returns the match count, contribution statistics and a
+        ``result_id`` for result_page and exports; with a reference point
+        every match is also labelled with its direction. ``explain`` adds
+        the evaluated plan steps, showing which sub-masks came from cache.
+        """
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        
+        dataset = self._dataset
+        mask, steps = self.filter_mask(filters, reference_point)
+        rows = np.flatnonzero(mask)
+        
+        if reference_point:
+            scheme = self.sector_scheme
+            placed = classify(dataset['latitude'], dataset['longitude'], reference_point, scheme,
+                              polar=self.polar_cache.get(dataset, reference_point))
+            names = np.array(list(scheme.names) + [''])
+            sectors = placed['sector'][rows]
+            directions = names[np.where(sectors >= 0, sectors, len(scheme))]
+        else:
+            directions = np.full(len(rows), '', dtype=str)
+        
+        stats = stats_by_label(self._contribution_stats(dataset, np.where(mask, 0, -1), 1), ['all'])['all']
+        result_id = self.result_id_for(dataset.version, reference_point or {}, [], filters=filters)
+        self._store_result(result_id, {
+            'stats': stats,
+            'version': dataset.version,
+            'rows': rows.astype(np.int64),
+            'directions': directions,
+            'reference_point': reference_point,
+            'timestamp': datetime.now().isoformat()
+        })
+        
+        result = {
+            'result_id': result_id,
+            'filters': filters,
+            'total_records': len(dataset),
+            'matched': len(rows),
+            'contribution_stats': stats
+        }
+        if explain:
+            result['plan'] = steps
+        return result
+    
     def filter_by_threshold(self, threshold: float) -> List[Dict]:
         """Filter data by contribution threshold."""
-        if self._df is None:
+        if self._dataset is None:
             return []
         
         try:
-            filtered_df = self._df[self._df['contribution'] >= threshold]
+            df = self._dataset.to_frame()
+            filtered_df = df[df['contribution_amount'] >= threshold]
             return filtered_df.to_dict('records')
         except Exception as e:
             current_app.logger.error(f"Error filtering by threshold: {str(e)}")
@@ -108,167 +494,266 @@ class AnalysisService:
     
     def get_summary_statistics(self) -> Dict:
         """Get summary statistics for the loaded data."""
-        if self._df is None:
+        if self._dataset is None:
             return {}
         
         try:
+            # Totals come from the cube; order statistics from the per-version sort (NaN last)
+            dataset = self._dataset
+            total = dataset.cube.rollup()['total']
+            valued = total['valued']
+            ordered = dataset['contribution_amount'][self._contribution_order(dataset)[:valued]]
+            middle = (valued - 1) / 2
             stats = {
-                'total_records': len(self._df),
-                'total_contribution': self._df['contribution'].sum(),
-                'average_contribution': self._df['contribution'].mean(),
-                'median_contribution': self._df['contribution'].median(),
-                'min_contribution': self._df['contribution'].min(),
-                'max_contribution': self._df['contribution'].max()
+                'total_records': len(dataset),
+                'total_contribution': total['sum'],
+                'average_contribution': total['mean'],
+                'std_contribution': total['std'],
+                'median_contribution': float((ordered[math.floor(middle)] + ordered[math.ceil(middle)]) / 2) if valued else 0.0,
+                'min_contribution': float(ordered[0]) if valued else 0.0,
+                'max_contribution': float(ordered[-1]) if valued else 0.0,
+                'component_totals': total.get('components', {})
             }
             return stats
         except Exception as e:
             current_app.logger.error(f"Error calculating summary statistics: {str(e)}")
             return {}
     
+    def cube(self, reference_point: Optional[Dict[str, float]] = None) -> ContributionCube:
+        """The loaded dataset's contribution cube, split by direction when a reference point is given.
+
+        Direction cubes are derived from the published cube's household to
+        cell mapping and kept per (dataset, reference point, sectors),
+        bounded like the polar cache.
+        """
+        base = self._dataset.cube
+        if not reference_point:
+            return base
+        
+        dataset, scheme = self._dataset, self.sector_scheme
+        key = (PolarCache.key_for(dataset, reference_point), scheme.key)
+        cube = self._direction_cubes.get(key)
+        if cube is None:
+            placed = classify(dataset['latitude'], dataset['longitude'], reference_point, scheme,
+                              polar=self.polar_cache.get(dataset, reference_point))
+            # Households without coordinates get their own 'unlocated' direction
+            codes = np.where(placed['sector'] >= 0, placed['sector'], len(scheme))
+            cube = base.refine('direction', codes, scheme.names + ['unlocated'], dataset['contribution_amount'],
+                               {name: dataset[name] for name in COMPONENT_COLUMNS if name in dataset})
+            self._direction_cubes[key] = cube
+            while len(self._direction_cubes) > self.polar_cache.max_entries:
+                self._direction_cubes.popitem(last=False)
+        self._direction_cubes.move_to_end(key)
+        return cube
+    
+    def rollup(self, by: Optional[List[str]] = None, filters: Optional[Dict[str, List[str]]] = None,
+               reference_point: Optional[Dict[str, float]] = None) -> Dict:
+        """Roll up (or drill down into) the contribution cube; see ContributionCube.rollup."""
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        result = self.cube(reference_point).rollup(by or [], filters)
+        result['total_records'] = len(self._dataset)
+        return result
+    
+    def compare_snapshots(self, before_id: str, after_id: str,
+                          reference_point: Optional[Dict[str, float]] = None, limit: int = 50,
+                          status: Optional[str] = None) -> Dict:
+        """Year-over-year comparison of two processed uploads, joined on record ID.
+
+        Returns aggregate changes (new, lapsed and retained giving, giving
+        per ZIP, moves between ZIPs and, with a reference point, between
+        directions) and the ``limit`` households whose giving changed most.
+        """
+        before = self.snapshots.open(before_id)
+        after = self.snapshots.open(after_id)
+        missing = [sid for sid, dataset in ((before_id, before), (after_id, after)) if dataset is None]
+        if missing:
+            return {'error': f"Snapshot not found: {', '.join(map(str, missing))}"}
+        
+        sectors = {}
+        if reference_point:
+            scheme = self.sector_scheme
+            for name, dataset in (('before', before), ('after', after)):
+                sectors[name] = classify(dataset['latitude'], dataset['longitude'], reference_point, scheme,
+                                         polar=self.polar_cache.get(dataset, reference_point))['sector']
+        
+        comparison = SnapshotComparison(before, after, sectors.get('before'), sectors.get('after'),
+                                        self.sector_scheme.names if sectors else None)
+        return {
+            'before_id': before_id,
+            'after_id': after_id,
+            'reference_point': reference_point,
+            'summary': comparison.summary(),
+            'households': comparison.households(limit, status)
+        }
+    
+    def list_regions(self) -> List[Dict]:
+        """Regions stored for the loaded dataset."""
+        if self._dataset is None:
+            return []
+        return [region.to_dict() for region in self.regions.list(self._dataset.version)]
+    
+    def add_region(self, name: Optional[str], geojson: Dict) -> Dict:
+        """Store a GeoJSON region for the loaded dataset and summarize it.
+
+        Raises ValueError for GeoJSON without valid polygons.
+        """
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        region = self.regions.add(self._dataset.version, name, geojson)
+        return self.region_summary(region.region_id)
+    
+    def remove_region(self, region_id: str) -> bool:
+        if self._dataset is None:
+            return False
+        return self.regions.remove(self._dataset.version, region_id)
+    
+    def region_summary(self, region_id: str) -> Dict:
+        """Household count and contribution statistics inside a stored region."""
+        if self._dataset is None:
+            return {'error': 'No data loaded'}
+        
+        region = self.regions.get(self._dataset.version, region_id)
+        if region is None:
+            return {'error': f"Unknown region: {region_id}"}
+        
+        inside = self.region_mask(region_id)
+        stats = stats_by_label(self._contribution_stats(self._dataset, np.where(inside, 0, -1), 1), ['all'])['all']
+        return {
+            **region.to_dict(),
+            'total_records': len(self._dataset),
+            'households': stats.pop('count'),
+            'contribution_stats': stats
+        }
+    
     def process_csv(self, filepath: str) -> Dict:
-        """Process uploaded CSV file and prepare for analysis."""
+        """Process uploaded CSV file and prepare for analysis.
+
+        Uploads of at least INGEST_PARALLEL_MIN_BYTES are split into
+        row-aligned chunks of INGEST_CHUNK_BYTES and ingested by a pool of
+        INGEST_WORKERS processes (default: one per CPU); smaller uploads are
+        ingested in this process. The processed file is the same either way.
+        
+        Every row is validated during ingestion. Rows with an issue listed in
+        VALIDATION_REJECT are left out, and all issues are written to
+        issues_<analysis_id>.csv; the summary is under ``validation``.
+        """
         try:
-            # Read CSV file with string type for all columns initially
-            df = pd.read_csv(filepath, dtype=str, na_values=[''], keep_default_na=True)
-            
-            # Validate required columns
-            required_columns = [
-                'dp_RecordID', 'HOH_Titles', 'Family_Name', 'Address_Line_1', 'City', 
-                'State/Region', 'Postal_Code', 'Taxable_Donations_Last_52',
-                'CSA_Last_Year', 'Offertory_Rolling_52'
-            ]
-            missing_columns = [col for col in required_columns if col not in df.columns]
-            if missing_columns:
-                raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
-            
-            # Clean and prepare data
-            # Fill NaN values with appropriate defaults
-            df['Address_Line_2'] = df['Address_Line_2'].fillna('')
-            
-            # Function to clean currency strings and convert to float
-            def clean_currency(x):
-                if pd.isna(x) or x == '':
-                    return 0.0
-                try:
-                    # Remove currency symbols, spaces, and commas, then convert to float
-                    return float(str(x).replace('$', '').replace(',', '').strip())
-                except:
-                    return 0.0
-            
-            # Clean and convert contribution columns
-            contribution_columns = ['Taxable_Donations_Last_52', 'CSA_Last_Year', 'Offertory_Rolling_52']
-            for col in contribution_columns:
-                df[col] = df[col].apply(clean_currency)
-            
-            # Ensure address components are strings and clean them
-            address_columns = ['Address_Line_1', 'Address_Line_2', 'City', 'State/Region', 'Postal_Code']
-            for col in address_columns:
-                df[col] = df[col].astype(str).replace('nan', '').str.strip()
-            
-            # Combine address components into a single address field
-            df['address'] = df.apply(
-                lambda row: ', '.join(filter(None, [
-                    str(row['Address_Line_1']).strip(),
-                    str(row['Address_Line_2']).strip() if row['Address_Line_2'] else '',
-                    str(row['City']).strip(),
-                    str(row['State/Region']).strip(),
-                    str(row['Postal_Code']).split('-')[0].strip()  # Use base ZIP without +4
-                ])),
-                axis=1
-            )
-            
-            # Calculate total contribution
-            df['contribution_amount'] = df[contribution_columns].sum(axis=1)
-            
-            # Create display name using HOH_Titles + Family_Name
-            df['HOH_Titles'] = df['HOH_Titles'].fillna('').astype(str)
-            df['Family_Name'] = df['Family_Name'].fillna('').astype(str)
-            df['display_name'] = df.apply(
-                lambda row: f"{row['HOH_Titles']} {row['Family_Name']}".strip(),
-                axis=1
-            )
-            
-            # Function to convert numpy types to Python native types
-            def convert_to_native(value):
-                if isinstance(value, (np.int64, np.int32, np.int16, np.int8)):
-                    return int(value)
-                elif isinstance(value, (np.float64, np.float32)):
-                    return float(value)
-                return value
-            
-            # Add family information
-            df['family_info'] = df.apply(
-                lambda row: {
-                    'record_id': str(row['dp_RecordID']),
-                    'display_name': row['display_name'],
-                    'family_name': str(row['Family_Name']),
-                    'head_1_name': str(row['Head_1_Name']) if pd.notna(row['Head_1_Name']) else '',
-                    'head_2_name': str(row['Head_2_Name']) if pd.notna(row['Head_2_Name']) else '',
-                    'salutation': str(row['Salutation']) if pd.notna(row['Salutation']) else '',
-                    'formal_addressee': str(row['Formal_Addressee']) if pd.notna(row['Formal_Addressee']) else '',
-                    'contributions': {
-                        'taxable_donations': convert_to_native(row['Taxable_Donations_Last_52']),
-                        'csa': convert_to_native(row['CSA_Last_Year']),
-                        'offertory': convert_to_native(row['Offertory_Rolling_52'])
-                    }
-                },
-                axis=1
-            )
+            with current_app.app_context():
+                zip_centroids_file = current_app.config.get('ZIP_CENTROIDS_FILE')
+                reject = current_app.config.get('VALIDATION_REJECT', DEFAULT_REJECT)
+                workers = current_app.config.get('INGEST_WORKERS') or os.cpu_count() or 1
+                chunk_bytes = current_app.config.get('INGEST_CHUNK_BYTES', 64 * 1024 * 1024)
+                min_parallel_bytes = current_app.config.get('INGEST_PARALLEL_MIN_BYTES', 32 * 1024 * 1024)
+            if os.path.getsize(filepath) < min_parallel_bytes:
+                workers = 1
             
             # Generate analysis ID
             analysis_id = datetime.now().strftime('%Y%m%d_%H%M%S')
             
-            # Save processed data
+            # Clean the upload into the processed file
             processed_file = os.path.join(self.upload_folder, f'processed_{analysis_id}.csv')
+            issues_file = os.path.join(self.upload_folder, f'issues_{analysis_id}.csv')
+            summary = ingest_csv(filepath, processed_file, zip_centroids_file, workers, chunk_bytes,
+                                 issues_file, reject)
+            summary['validation']['issues_file'] = os.path.basename(issues_file)
+            if summary['total_records'] == 0 and summary['validation']['rows_rejected']:
+                os.remove(processed_file)
+                return {'error': 'No valid rows: every row was rejected by validation',
+                        'validation': summary['validation']}
             
-            # Convert contribution_amount to native Python float
-            df['contribution_amount'] = df['contribution_amount'].apply(convert_to_native)
-            
-            # Select and save relevant columns
-            processed_df = pd.DataFrame({
-                'address': df['address'],
-                'contribution_amount': df['contribution_amount'],
-                'display_name': df['display_name'],
-                'family_info': df['family_info'].apply(json.dumps)
-            })
-            processed_df.to_csv(processed_file, index=False)
+            # Publish the new upload to every worker
+            self.datasets.publish(processed_file, analysis_id)
             
-            # Convert numeric values to native Python types for the return dictionary
-            return {
-                'analysis_id': analysis_id,
-                'total_records': int(len(df)),
-                'valid_addresses': int(df['address'].notna().sum()),
-                'valid_contributions': int(df['contribution_amount'].notna().sum()),
-                'total_contribution': float(df['contribution_amount'].sum()),
-                'contribution_summary': {
-                    'taxable_donations': float(df['Taxable_Donations_Last_52'].sum()),
-                    'csa': float(df['CSA_Last_Year'].sum()),
-                    'offertory': float(df['Offertory_Rolling_52'].sum())
-                }
-            }
+            return {'analysis_id': analysis_id, **summary, 'workers': workers}
             
         except Exception as e:
             current_app.logger.error(f"Error in process_csv: {str(e)}")
             raise Exception(f"Error processing CSV: {str(e)}")
     
+    def activate(self, analysis_id: str) -> Dict:
+        """Make an earlier upload's newest revision the current dataset again."""
+        processed_file = os.path.join(self.upload_folder, f'processed_{analysis_id}.csv')
+        if not os.path.exists(processed_file):
+            return {'error': 'Processed data not found'}
+        version = self.datasets.latest_revision(analysis_id) or analysis_id
+        self._dataset = self.datasets.publish(processed_file, version)
+        return {'analysis_id': analysis_id, 'version': version, 'total_records': len(self._dataset)}
+    
+    def issues_file(self, analysis_id: str) -> str:
+        """Path of an upload's validation issue table (one row per issue)."""
+        issues_file = os.path.join(self.upload_folder, f'issues_{os.path.basename(analysis_id)}.csv')
+        if not os.path.exists(issues_file):
+            raise FileNotFoundError("Validation issues not found")
+        return issues_file
+    
+    def refine_geocodes(self, analysis_id: str, geocoding_service) -> Dict:
+        """Replace centroid coordinates with street-level geocodes.
+        
+        Progress is published as a new revision at most every
+        GEOCODING_REFINE_PUBLISH_SECONDS, and once at the end, so maps pick
+        up refined points during a long refinement without the artifact
+        being rewritten and republished every few addresses.
+        """
+        processed_file = os.path.join(self.upload_folder, f'processed_{analysis_id}.csv')
+        # Text columns stay text, so record IDs are not written back as floats
+        df = pd.read_csv(processed_file, dtype={name: str for name in TEXT_COLUMNS})
+        with current_app.app_context():
+            publish_seconds = current_app.config.get('GEOCODING_REFINE_PUBLISH_SECONDS', 60)
+        
+        # Group the rows still at centroid precision by canonical address
+        key_column = 'address_key' if 'address_key' in df.columns else 'address'
+        pending = df[(df['geo_precision'] != PRECISION_STREET) & df[key_column].notna()]
+        rows_by_address = pending.groupby(key_column).groups
+        
+        refined = unpublished = 0
+        published_at = time.monotonic()
+        for address, rows in rows_by_address.items():
+            result = geocoding_service.geocode_address(address)
+            if not result or result.get('precision', PRECISION_STREET) != PRECISION_STREET:
+                continue
+            df.loc[rows, 'latitude'] = result['lat']
+            df.loc[rows, 'longitude'] = result['lng']
+            df.loc[rows, 'geo_precision'] = PRECISION_STREET
+            unpublished += len(rows)
+            if time.monotonic() - published_at >= publish_seconds:
+                self._publish_refinement(analysis_id, processed_file, df)
+                refined, unpublished = refined + unpublished, 0
+                published_at = time.monotonic()
+        
+        if unpublished:
+            self._publish_refinement(analysis_id, processed_file, df)
+            refined += unpublished
+        
+        return {
+            'analysis_id': analysis_id,
+            'refined': refined,
+            'remaining': int((df['geo_precision'] != PRECISION_STREET).sum())
+        }
+    
+    def _publish_refinement(self, analysis_id: str, processed_file: str, df: pd.DataFrame):
+        """Rewrite the artifact atomically and publish it as the next revision of its upload."""
+        tmp_file = f'{processed_file}.{os.getpid()}.tmp'
+        df.to_csv(tmp_file, index=False)
+        os.replace(tmp_file, processed_file)
+        current = (self.datasets.current_version() or '').split('.')[0]
+        self.datasets.publish(
+            processed_file,
+            self.datasets.next_revision(analysis_id),
+            make_current=current == analysis_id
+        )
+    
     def determine_direction(self, ref_lat: float, ref_lng: float, 
                           point_lat: float, point_lng: float) -> str:
         """Determine cardinal direction between two points."""
-        lat_diff = point_lat - ref_lat
-        lng_diff = point_lng - ref_lng
-        
-        # Calculate angle for more precise direction
-        angle = np.degrees(np.arctan2(lng_diff, lat_diff))
-        
-        # Map angle to cardinal direction
-        if -45 <= angle <= 45:
-            return 'north'
-        elif 45 < angle <= 135:
-            return 'east'
-        elif -135 <= angle < -45:
-            return 'west'
-        else:
-            return 'south'
+        # Scalar form of sectors.initial_bearing; cones are 90 degrees centred on north
+        lat1, lat2 = math.radians(ref_lat), math.radians(point_lat)
+        dlng = math.radians(point_lng - ref_lng)
+        bearing = math.degrees(math.atan2(
+            math.sin(dlng) * math.cos(lat2),
+            math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlng)
+        )) % 360
+        return CARDINAL_SECTORS.names[int((bearing + 45) % 360 // 90)]
     
     def analyze(self, reference_point: Dict, directions: List[str], 
                 threshold: float = 500) -> Dict:
@@ -279,82 +764,208 @@ class AnalysisService:
             if not analysis_id:
                 raise ValueError("Analysis ID required")
             
-            processed_file = os.path.join(self.upload_folder, f'processed_{analysis_id}.csv')
-            if not os.path.exists(processed_file):
+            dataset = self.datasets.open_file(f'processed_{analysis_id}.csv')
+            if dataset is None:
                 raise FileNotFoundError("Processed data not found")
             
-            df = pd.read_csv(processed_file)
-            
             # Filter by contribution threshold
-            df_filtered = df[df['contribution_amount'] >= threshold].copy()
-            
-            # Calculate directions for each point
-            ref_lat = reference_point['lat']
-            ref_lng = reference_point['lng']
+            income_filtered = np.asarray(dataset['contribution_amount']) >= threshold
             
-            df_filtered['direction'] = df_filtered.apply(
-                lambda row: self.determine_direction(
-                    ref_lat, ref_lng,
-                    row['lat'], row['lng']
-                ),
-                axis=1
-            )
+            # Calculate directions for each point from the cached bearings
+            scheme = self.sector_scheme
+            placed = classify(dataset['latitude'], dataset['longitude'], reference_point, scheme,
+                              polar=self.polar_cache.get(dataset, reference_point))
             
             # Filter by requested directions
-            df_filtered = df_filtered[df_filtered['direction'].isin(directions)]
+            wanted = [scheme.index(d) for d in directions]
+            groups = np.where(income_filtered & np.isin(placed['sector'], wanted), placed['sector'], -1)
+            rows = np.flatnonzero(groups >= 0)
             
-            # Calculate statistics
+            # Calculate statistics in one grouped pass per grouping
+            by_direction = self._contribution_stats(dataset, groups, len(scheme))
+            overall = self._contribution_stats(dataset, np.where(groups >= 0, 0, -1), 1)
             stats = {
-                'total_records': len(df),
-                'records_analyzed': len(df_filtered),
-                'income_filtered': len(df[df['contribution_amount'] >= threshold]),
+                'total_records': len(dataset),
+                'records_analyzed': len(rows),
+                'income_filtered': int(np.count_nonzero(income_filtered)),
                 'direction_filtered': {
-                    direction: len(df_filtered[df_filtered['direction'] == direction])
+                    direction: int(by_direction['count'][scheme.index(direction)])
                     for direction in directions
                 },
                 'contribution_stats': {
-                    'mean': df_filtered['contribution_amount'].mean(),
-                    'median': df_filtered['contribution_amount'].median(),
-                    'min': df_filtered['contribution_amount'].min(),
-                    'max': df_filtered['contribution_amount'].max()
+                    'mean': float(overall['mean'][0]),
+                    'median': float(overall['quantiles'][0.5][0]),
+                    'min': float(overall['min'][0]),
+                    'max': float(overall['max'][0])
                 }
             }
             
-            # Save analysis results
-            self.analysis_results[analysis_id] = {
+            # Save analysis results as row positions into the dataset rather
+            # than copies of the rows; exports read the rows back in batches
+            self._store_result(analysis_id, {
                 'stats': stats,
-                'data': df_filtered.to_dict('records'),
+                'version': dataset.version,
+                'rows': rows.astype(np.int64),
+                'directions': np.array(scheme.names)[groups[rows]],
                 'reference_point': reference_point,
                 'timestamp': datetime.now().isoformat()
-            }
+            })
             
             return {
                 'analysis_id': analysis_id,
                 'stats': stats,
-                'record_count': len(df_filtered)
+                'record_count': len(rows)
             }
             
         except Exception as e:
             raise Exception(f"Analysis error: {str(e)}")
     
     def get_analysis_results(self, analysis_id: str) -> Optional[Dict]:
-        """Retrieve analysis results by ID."""
-        return self.analysis_results.get(analysis_id)
+        """Retrieve analysis results by ID, from this worker's cache or the shared store."""
+        result = self.analysis_results.get(analysis_id)
+        if result is None:
+            result = self.datasets.load_result(analysis_id)
+            if result is not None:
+                self._cache_result(analysis_id, result)
+        return result
     
-    def export_data(self, analysis_id: str, format: str = 'csv') -> str:
-        """Export analysis results in specified format."""
+    @staticmethod
+    def result_id_for(version: str, reference_point: Dict, directions: List[str],
+                      region_id: Optional[str] = None, filters=None) -> str:
+        """Derive a result set ID, so that repeating a query reuses its entry."""
+        key = [version, reference_point.get('lat'), reference_point.get('lng'),
+               sorted(directions), reference_point.get('threshold')]
+        if region_id is not None:
+            key.append(region_id)
+        if filters:
+            key.append(json.dumps(filters, sort_keys=True))
+        key = json.dumps(key)
+        return f"{version}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:12]}"
+    
+    def _store_result(self, result_id: str, result: Dict):
+        """Store a result set where every worker can read it, and cache it here."""
+        self.datasets.save_result(result['version'], result_id, result)
+        self._cache_result(result_id, result)
+    
+    def _cache_result(self, result_id: str, result: Dict):
+        """Cache a result set in this worker, evicting the oldest beyond ANALYSIS_RESULTS_KEPT."""
+        self.analysis_results.pop(result_id, None)
+        self.analysis_results[result_id] = result
+        with current_app.app_context():
+            kept = max(1, current_app.config.get('ANALYSIS_RESULTS_KEPT', 32))
+        while len(self.analysis_results) > kept:
+            del self.analysis_results[next(iter(self.analysis_results))]
+    
+    def _sorted_result(self, result_id: str, sort: str):
+        """Return (dataset, rows, directions) of a result set in sort order."""
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unsupported sort order: {sort}")
+        result = self.get_analysis_results(result_id)
+        if not result:
+            raise ValueError("Analysis results not found")
+        dataset = self.datasets.open_revision(result['version'])
+        if dataset is None:
+            raise FileNotFoundError("Processed data not found")
+        
+        # Sort once per result set and order; pages then just slice
+        orders = result.setdefault('orders', {})
+        if sort not in orders:
+            rows = result['rows']
+            if sort == SORT_CONTRIBUTION:
+                primary = -np.asarray(dataset['contribution_amount'][rows])
+            elif sort == SORT_DISTANCE:
+                if not result.get('reference_point'):
+                    raise ValueError("Distance sort needs a result with a reference point")
+                polar = self.polar_cache.get(dataset, result['reference_point'])
+                primary = polar['distance_km'][rows]
+            else:
+                primary = np.char.lower(np.asarray(dataset['display_name'][rows]))
+            orders[sort] = stable_order(primary, rows)
+        
+        order = orders[sort]
+        return dataset, result['rows'][order], result['directions'][order]
+    
+    @staticmethod
+    def _points_for(dataset, rows: np.ndarray, directions: np.ndarray, details: bool = False) -> List[Dict]:
+        """Build point objects for a slice of a result set, with household details if asked."""
+        points = points_as_rows(
+            lat=dataset['latitude'][rows].tolist(),
+            lng=dataset['longitude'][rows].tolist(),
+            direction=directions.tolist(),
+            contribution=dataset['contribution_amount'][rows].tolist(),
+            display_name=dataset['display_name'][rows].tolist()
+        )
+        if details:
+            for point, family_info in zip(points, dataset.family_info(rows)):
+                point['family_info'] = family_info
+        return points
+    
+    def result_page(self, result_id: str, sort: str = SORT_CONTRIBUTION,
+                    cursor: Optional[str] = None, limit: int = 100, details: bool = False) -> Dict:
+        """Return one page of a stored result set and the cursor for the next.
+
+        With ``details`` every point carries its household's ``family_info``,
+        built from the typed columns for this page's rows only.
+        """
+        offset = 0
+        if cursor:
+            cursor_result, cursor_sort, offset = decode_cursor(cursor)
+            if cursor_result != result_id or cursor_sort != sort:
+                raise ValueError("Cursor does not belong to this result set and sort order")
+        
+        dataset, rows, directions = self._sorted_result(result_id, sort)
+        stop = min(offset + max(1, limit), len(rows))
+        points = self._points_for(dataset, rows[offset:stop], directions[offset:stop], details)
+        
+        return {
+            'result_id': result_id,
+            'sort': sort,
+            'total': len(rows),
+            'points': points,
+            'next_cursor': encode_cursor(result_id, sort, stop) if stop < len(rows) else None
+        }
+    
+    def iter_result_points(self, result_id: str, sort: str = SORT_CONTRIBUTION,
+                           batch_size: int = 1000) -> Iterator[List[Dict]]:
+        """Yield a stored result set in sort order, one batch of points at a time."""
+        # Resolve eagerly so unknown results fail before streaming starts
+        dataset, rows, directions = self._sorted_result(result_id, sort)
+        
+        def batches():
+            for start in range(0, len(rows), batch_size):
+                stop = start + batch_size
+                yield self._points_for(dataset, rows[start:stop], directions[start:stop])
+        
+        return batches()
+    
+    def exporter(self, analysis_id: str) -> StreamingExporter:
+        """Return a batch exporter over the rows selected by an analysis."""
         results = self.get_analysis_results(analysis_id)
         if not results:
             raise ValueError("Analysis results not found")
         
-        df = pd.DataFrame(results['data'])
-        export_file = os.path.join(self.upload_folder, f'export_{analysis_id}.{format}')
-        
-        if format == 'csv':
-            df.to_csv(export_file, index=False)
-        elif format == 'excel':
-            df.to_excel(export_file, index=False)
-        else:
-            raise ValueError(f"Unsupported export format: {format}")
+        dataset = self.datasets.open_revision(results['version']) or \
+            self.datasets.open_file(f'processed_{analysis_id}.csv')
+        if dataset is None:
+            raise FileNotFoundError("Processed data not found")
         
-        return export_file 
\ No newline at end of file
+        return StreamingExporter(
+            dataset,
+            columns=EXPORT_COLUMNS,
+            rows=results['rows'],
+            extra_columns={'direction': results['directions']}
+        )
+    
+    def export_stream(self, analysis_id: str, format: str = 'csv') -> Tuple:
+        """Return (chunks, mimetype, filename) for streaming an export."""
+        format = normalize_format(format)
+        mimetype, extension = EXPORT_FORMATS[format]
+        chunks = self.exporter(analysis_id).stream(format)
+        return chunks, mimetype, f'export_{analysis_id}.{extension}'
+    
+    def export_data(self, analysis_id: str, format: str = 'csv') -> str:
+        """Export analysis results in specified format."""
+        format = normalize_format(format)
+        extension = EXPORT_FORMATS[format][1]
+        export_file = os.path.join(self.upload_folder, f'export_{analysis_id}.{extension}')
+        return self.exporter(analysis_id).write(export_file, format)
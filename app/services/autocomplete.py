@@ -0,0 +1,172 @@
+from flask import current_app
+from app.services.address import canonicalize_address
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+import bisect
+import re
+import threading
+import time
+
+_FOLD_PATTERN = re.compile(r'[^\w\s#-]')
+_SPACE_PATTERN = re.compile(r'\s+')
+
+
+def search_key(text: str) -> str:
+    """Fold text to the form stored in the prefix index (no commas)."""
+    return _SPACE_PATTERN.sub(' ', _FOLD_PATTERN.sub(' ', text.upper())).strip()
+
+
+class AddressPrefixIndex:
+    """Sorted-array prefix index over canonical addresses.
+
+    Every address is indexed under its canonical key and again without its
+    house number, so both '12 Eagle Ha' and 'Eagle Ha' find
+    '12 EAGLE HAVEN DR'. A lookup is two binary searches over the sorted
+    keys plus a slice.
+    """
+
+    def __init__(self, entries: Iterable[Dict] = ()):
+        self._keys: List[str] = []
+        self._entries: List[Dict] = []
+        self.build(entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def build(self, entries: Iterable[Dict]):
+        """Index entries with 'key', 'address', 'lat', 'lng', 'precision' and 'source'."""
+        pairs: Dict[str, Dict] = {}
+        for entry in entries:
+            key = search_key(entry['key'])
+            if not key:
+                continue
+            # Prefer street-level coordinates over centroids for the same address
+            existing = pairs.get(key)
+            if existing is None or (existing['precision'] != 'street' and entry['precision'] == 'street'):
+                pairs[key] = entry
+
+        indexed: List[Tuple[str, int, Dict]] = []
+        for key, entry in pairs.items():
+            indexed.append((key, 0, entry))
+            number, _, rest = key.partition(' ')
+            if rest and number[:1].isdigit():
+                indexed.append((rest, 1, entry))
+        indexed.sort(key=lambda item: (item[0], item[1]))
+
+        self._keys = [key for key, _, _ in indexed]
+        self._entries = [entry for _, _, entry in indexed]
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        """Return up to limit entries whose key starts with the query."""
+        seen = set()
+        suggestions = []
+        for prefix in self._query_prefixes(query):
+            lo = bisect.bisect_left(self._keys, prefix)
+            hi = bisect.bisect_left(self._keys, prefix + '\uffff', lo)
+            for entry in self._entries[lo:hi]:
+                if id(entry) in seen:
+                    continue
+                seen.add(id(entry))
+                suggestions.append(entry)
+                if len(suggestions) >= limit:
+                    return suggestions
+        return suggestions
+
+    @staticmethod
+    def _query_prefixes(query: str) -> List[str]:
+        """Canonical and merely folded forms of a partial query."""
+        prefixes = []
+        for prefix in (search_key(canonicalize_address(query)), search_key(query)):
+            if prefix and prefix not in prefixes:
+                prefixes.append(prefix)
+        return prefixes
+
+
+class AddressAutocomplete:
+    """Keeps an AddressPrefixIndex in sync with the geocoding cache and current dataset.
+
+    The first index is built by the request that needs it. After that,
+    rebuilds run in a background thread, one at a time, and requests keep
+    using the previous index until the new one is swapped in. A new
+    dataset version triggers a rebuild straight away; a growing geocoding
+    cache (e.g. during background refinement) at most every
+    AUTOCOMPLETE_REFRESH_SECONDS. Dataset entries are built once per
+    dataset version.
+    """
+
+    def __init__(self):
+        self._index = AddressPrefixIndex()
+        self._stamp: Optional[Tuple] = None
+        self._built_at: Optional[float] = None
+        self._building = False
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._dataset_version = None
+        self._dataset_entries: List[Dict] = []
+
+    def refresh(self, geocoding_service, dataset=None) -> AddressPrefixIndex:
+        """Return the current index, starting a rebuild when the dataset version or cache changed."""
+        stamp = (dataset.version if dataset is not None else None, geocoding_service.cache_size())
+        refresh_seconds = current_app.config.get('AUTOCOMPLETE_REFRESH_SECONDS', 30)
+        with self._lock:
+            if stamp == self._stamp or self._building:
+                return self._index
+            first = self._built_at is None
+            if not first and stamp[0] == self._stamp[0] and time.monotonic() - self._built_at < refresh_seconds:
+                return self._index
+            self._building = True
+            index = self._index
+
+        if first:
+            self._rebuild(geocoding_service, dataset, stamp)
+            return self._index
+        self._thread = threading.Thread(
+            target=self._rebuild_in_context,
+            args=(current_app._get_current_object(), geocoding_service, dataset, stamp),
+            daemon=True
+        )
+        self._thread.start()
+        return index
+
+    def _rebuild_in_context(self, app, geocoding_service, dataset, stamp):
+        with app.app_context():
+            try:
+                self._rebuild(geocoding_service, dataset, stamp)
+            except Exception as e:
+                app.logger.error(f"Error rebuilding autocomplete index: {str(e)}")
+
+    def _rebuild(self, geocoding_service, dataset, stamp):
+        try:
+            entries = list(geocoding_service.cached_addresses())
+            entries.extend(self._entries_for(dataset))
+            index = AddressPrefixIndex(entries)
+            with self._lock:
+                self._index = index
+                self._stamp = stamp
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._building = False
+
+    def _entries_for(self, dataset) -> List[Dict]:
+        """Household addresses that have coordinates, built once per dataset version."""
+        if dataset is None:
+            return []
+        if dataset.version != self._dataset_version:
+            keys = np.asarray(dataset['address_key'])
+            lat = np.asarray(dataset['latitude'], dtype=np.float64)
+            lng = np.asarray(dataset['longitude'], dtype=np.float64)
+            rows = np.flatnonzero((keys != '') & ~np.isnan(lat) & ~np.isnan(lng))
+            self._dataset_entries = [
+                {'key': key, 'address': address, 'lat': row_lat, 'lng': row_lng,
+                 'precision': precision, 'source': 'dataset'}
+                for key, address, row_lat, row_lng, precision in zip(
+                    keys[rows].tolist(), np.asarray(dataset['address'])[rows].tolist(),
+                    lat[rows].tolist(), lng[rows].tolist(), np.asarray(dataset['geo_precision'])[rows].tolist()
+                )
+            ]
+            self._dataset_version = dataset.version
+        return self._dataset_entries
+
+    def suggest(self, query: str, limit: int = 10) -> List[Dict]:
+        return self._index.suggest(query, limit)
@@ -0,0 +1,218 @@
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Upper edges of the contribution bands, e.g. '<100', '100-500', ..., '5000+'
+DEFAULT_BAND_EDGES = [100, 500, 1000, 5000]
+
+# Dimensions built at publish time; 'direction' is added per reference point
+BASE_DIMENSIONS = ['postal_code', 'city', 'band']
+
+UNKNOWN = 'unknown'
+
+CUBE_FILE = 'cube.npz'
+
+
+def band_labels(edges: Sequence[float]) -> List[str]:
+    """Label contribution bands, e.g. [100, 500] -> ['<100', '100-500', '500+']."""
+    edges = [float(e) for e in edges]
+    labels = [f'<{edges[0]:g}'] + [f'{lo:g}-{hi:g}' for lo, hi in zip(edges[:-1], edges[1:])]
+    return labels + [f'{edges[-1]:g}+']
+
+
+def text_codes(values: np.ndarray) -> Tuple[np.ndarray, List[str]]:
+    """Dictionary-encode a text column; empty values become 'unknown'."""
+    labels, codes = np.unique(np.asarray(values, dtype=str), return_inverse=True)
+    labels = [label if label else UNKNOWN for label in labels.tolist()]
+    return codes.astype(np.int64), labels
+
+
+def band_codes(values: np.ndarray, edges: Sequence[float]) -> Tuple[np.ndarray, List[str]]:
+    """Contribution band of each value; missing amounts get the last code, 'unknown'."""
+    values = np.asarray(values, dtype=np.float64)
+    codes = np.digitize(np.nan_to_num(values), np.asarray(edges, dtype=np.float64))
+    codes = np.where(np.isnan(values), len(edges) + 1, codes)
+    return codes.astype(np.int64), band_labels(edges) + [UNKNOWN]
+
+
+class ContributionCube:
+    """Pre-aggregated contribution measures over a few categorical dimensions.
+
+    Only non-empty cells are stored: ``coords`` holds one row of label codes
+    per cell and ``measures`` one array per measure (``count`` households,
+    ``valued`` households with an amount, ``sum`` and ``sumsq`` of the
+    amounts, plus one sum per contribution component). Roll-ups and
+    drill-downs regroup cells, never households, so they cost the same
+    whatever the household count.
+
+    ``row_cells`` maps every household to its cell, so a dimension that
+    depends on the request (direction from a reference point) can be added
+    with refine() in one pass, without re-encoding the base dimensions.
+    """
+
+    def __init__(self, dimensions: List[str], labels: Dict[str, List[str]], coords: np.ndarray,
+                 measures: Dict[str, np.ndarray], row_cells: Optional[np.ndarray] = None):
+        self.dimensions = list(dimensions)
+        self.labels = labels
+        self.coords = coords
+        self.measures = measures
+        self.row_cells = row_cells
+
+    def __len__(self) -> int:
+        return len(self.coords)
+
+    @staticmethod
+    def _measures(row_cells: np.ndarray, cell_count: int, values: np.ndarray,
+                  components: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        values = np.asarray(values, dtype=np.float64)
+        valued = ~np.isnan(values)
+        amounts = np.where(valued, values, 0.0)
+        measures = {
+            'count': np.bincount(row_cells, minlength=cell_count),
+            'valued': np.bincount(row_cells, weights=valued, minlength=cell_count).astype(np.int64),
+            'sum': np.bincount(row_cells, weights=amounts, minlength=cell_count),
+            'sumsq': np.bincount(row_cells, weights=amounts * amounts, minlength=cell_count),
+        }
+        for name, component in components.items():
+            component = np.nan_to_num(np.asarray(component, dtype=np.float64))
+            measures[f'component:{name}'] = np.bincount(row_cells, weights=component, minlength=cell_count)
+        return measures
+
+    @classmethod
+    def build(cls, codes: Dict[str, Tuple[np.ndarray, List[str]]], values: np.ndarray,
+              components: Optional[Dict[str, np.ndarray]] = None) -> 'ContributionCube':
+        """Aggregate households given ``{dimension: (codes, labels)}`` in one grouped pass."""
+        dimensions = list(codes)
+        shape = tuple(max(1, len(codes[name][1])) for name in dimensions)
+        keys = np.ravel_multi_index(tuple(codes[name][0] for name in dimensions), shape)
+        cell_keys, row_cells = np.unique(keys, return_inverse=True)
+        coords = np.stack(np.unravel_index(cell_keys, shape), axis=1).astype(np.int32)
+        return cls(dimensions, {name: codes[name][1] for name in dimensions}, coords,
+                   cls._measures(row_cells, len(cell_keys), values, components or {}),
+                   row_cells.astype(np.int32))
+
+    def refine(self, dimension: str, codes: np.ndarray, labels: List[str], values: np.ndarray,
+               components: Optional[Dict[str, np.ndarray]] = None) -> 'ContributionCube':
+        """Split every cell by one more dimension (e.g. direction from a reference point)."""
+        if self.row_cells is None:
+            raise ValueError("This cube has no household mapping to refine")
+        keys = self.row_cells.astype(np.int64) * len(labels) + np.asarray(codes, dtype=np.int64)
+        cell_keys, row_cells = np.unique(keys, return_inverse=True)
+        parents, child = np.divmod(cell_keys, len(labels))
+        coords = np.column_stack([self.coords[parents], child]).astype(np.int32)
+        return ContributionCube(self.dimensions + [dimension], {**self.labels, dimension: labels}, coords,
+                                self._measures(row_cells, len(cell_keys), values, components or {}),
+                                row_cells.astype(np.int32))
+
+    def rollup(self, by: Sequence[str] = (), filters: Optional[Dict[str, Sequence[str]]] = None) -> Dict:
+        """Aggregate the cells grouped by ``by``, keeping cells matching ``filters``.
+
+        ``filters`` maps a dimension to the labels to keep, so drilling down
+        is a roll-up by a finer dimension filtered on the coarser one.
+        Returns one record per group (largest sum first) and the total.
+        """
+        by = list(by)
+        unknown = [name for name in by + list(filters or {}) if name not in self.dimensions]
+        if unknown:
+            raise ValueError(f"Unknown cube dimensions: {', '.join(unknown)} "
+                             f"(use {', '.join(self.dimensions)})")
+
+        keep = np.ones(len(self), dtype=bool)
+        for name, wanted in (filters or {}).items():
+            labels = self.labels[name]
+            wanted_codes = [labels.index(label) for label in wanted if label in labels]
+            keep &= np.isin(self.coords[:, self.dimensions.index(name)], wanted_codes)
+
+        coords = self.coords[keep]
+        measures = {name: values[keep] for name, values in self.measures.items()}
+        if by:
+            axes = [self.dimensions.index(name) for name in by]
+            shape = tuple(max(1, len(self.labels[name])) for name in by)
+            keys = np.ravel_multi_index(tuple(coords[:, axis] for axis in axes), shape)
+            group_keys, groups = np.unique(keys, return_inverse=True)
+            group_coords = np.stack(np.unravel_index(group_keys, shape), axis=1)
+        else:
+            groups = np.zeros(len(coords), dtype=np.int64)
+            group_coords = np.zeros((1, 0), dtype=np.int64)
+
+        grouped = {name: np.bincount(groups, weights=values, minlength=len(group_coords))
+                   for name, values in measures.items()}
+        records = [self._record(grouped, i, {name: self.labels[name][code] for name, code in zip(by, row)})
+                   for i, row in enumerate(group_coords.tolist())]
+        records.sort(key=lambda record: -record['sum'])
+        totals = {name: np.array([values.sum()]) for name, values in measures.items()}
+        return {'dimensions': by, 'filters': dict(filters or {}), 'cells': records,
+                'total': self._record(totals, 0, {})}
+
+    @staticmethod
+    def _record(measures: Dict[str, np.ndarray], i: int, labels: Dict[str, str]) -> Dict:
+        """Turn cell measures into count, sum, mean and standard deviation."""
+        count, valued = int(measures['count'][i]), int(measures['valued'][i])
+        total, sumsq = float(measures['sum'][i]), float(measures['sumsq'][i])
+        mean = total / valued if valued else 0.0
+        variance = max(sumsq - valued * mean * mean, 0.0) / (valued - 1) if valued > 1 else 0.0
+        record = {**labels, 'count': count, 'valued': valued, 'sum': total, 'mean': mean,
+                  'std': float(np.sqrt(variance))}
+        components = {name.split(':', 1)[1]: float(values[i])
+                      for name, values in measures.items() if name.startswith('component:')}
+        if components:
+            record['components'] = components
+        return record
+
+    def save(self, path: str):
+        arrays = {'coords': self.coords, 'dimensions': np.array(self.dimensions, dtype=str)}
+        arrays.update({f'labels:{name}': np.array(self.labels[name] or [''], dtype=str)
+                       for name in self.dimensions})
+        arrays.update({f'measure:{name}': values for name, values in self.measures.items()})
+        if self.row_cells is not None:
+            arrays['row_cells'] = self.row_cells
+        with open(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str) -> 'ContributionCube':
+        with np.load(path) as stored:
+            dimensions = stored['dimensions'].tolist()
+            labels = {name: stored[f'labels:{name}'].tolist() for name in dimensions}
+            measures = {key.split(':', 1)[1]: stored[key] for key in stored.files if key.startswith('measure:')}
+            row_cells = stored['row_cells'] if 'row_cells' in stored.files else None
+            return cls(dimensions, labels, stored['coords'], measures, row_cells)
+
+
+def build_cube(columns, band_edges: Sequence[float] = DEFAULT_BAND_EDGES,
+               components: Sequence[str] = ()) -> ContributionCube:
+    """Build the base cube (postal code, city, contribution band) of a dataset's columns."""
+    rows = len(columns['contribution_amount'])
+    codes = {}
+    for name in ('postal_code', 'city'):
+        codes[name] = text_codes(columns[name]) if name in columns else (np.zeros(rows, dtype=np.int64), [UNKNOWN])
+    codes['band'] = band_codes(columns['contribution_amount'], band_edges)
+    return ContributionCube.build(codes, columns['contribution_amount'],
+                                  {name: columns[name] for name in components if name in columns})
+
+
+def grid_cells(lat: np.ndarray, lng: np.ndarray, values: np.ndarray, cell_degrees: float) -> Dict[str, np.ndarray]:
+    """Aggregate households into square lat/lng grid cells in one grouped pass.
+
+    Returns the south-west corner of every non-empty cell with its
+    household count, valued count and contribution sum. Households without
+    coordinates are left out.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    located = ~(np.isnan(lat) | np.isnan(lng))
+    rows = np.floor(lat[located] / cell_degrees).astype(np.int64)
+    cols = np.floor(lng[located] / cell_degrees).astype(np.int64)
+
+    # Pack (row, col) into one key; longitudes span fewer than 2**20 cells
+    keys = rows * (1 << 20) + (cols - cols.min() if len(cols) else cols)
+    cell_keys, cells = np.unique(keys, return_inverse=True)
+    amounts = values[located]
+    valued = ~np.isnan(amounts)
+    return {
+        'south': np.floor_divide(cell_keys, 1 << 20) * cell_degrees,
+        'west': (np.mod(cell_keys, 1 << 20) + (cols.min() if len(cols) else 0)) * cell_degrees,
+        'count': np.bincount(cells, minlength=len(cell_keys)),
+        'valued': np.bincount(cells, weights=valued, minlength=len(cell_keys)).astype(np.int64),
+        'sum': np.bincount(cells, weights=np.where(valued, amounts, 0.0), minlength=len(cell_keys))
+    }
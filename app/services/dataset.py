@@ -0,0 +1,464 @@
+import numpy as np
+import pandas as pd
+from flask import current_app
+from app.services.address import canonicalize_address
+from app.services.cube import CUBE_FILE, DEFAULT_BAND_EDGES, ContributionCube, build_cube
+from typing import Dict, List, Optional
+import json
+import os
+import re
+import shutil
+
+# Columns exposed to the analysis code. Numeric columns are stored as
+# float64 arrays, text columns as fixed-width unicode arrays so that both
+# can be memory-mapped straight from disk.
+COMPONENT_COLUMNS = ['taxable_donations', 'csa', 'offertory']
+NUMERIC_COLUMNS = ['latitude', 'longitude', 'contribution_amount'] + COMPONENT_COLUMNS
+HOUSEHOLD_COLUMNS = ['family_name', 'head_1_name', 'head_2_name', 'salutation', 'formal_addressee']
+TEXT_COLUMNS = ['address', 'address_key', 'display_name', 'geo_precision', 'postal_code', 'city', 'record_id',
+                'statement_type'] + HOUSEHOLD_COLUMNS
+
+POINTER_FILE = 'CURRENT'
+KEY_INDEX_FILE = 'key_index.npz'
+RESULTS_FOLDER = 'results'
+
+_RESULT_ID = re.compile(r'^[\w.\-]+$')
+
+
+def _json_default(value):
+    """Encode numpy scalars in stored result metadata."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class KeyIndex:
+    """Sorted household keys of a dataset, for joining snapshots with searchsorted.
+
+    Households are keyed by record ID, or by canonical address for uploads
+    without record IDs. Empty keys are left out; if a key repeats, its first
+    row wins.
+    """
+
+    def __init__(self, key_column: str, keys: np.ndarray, rows: np.ndarray):
+        self.key_column = key_column
+        self.keys = keys
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, columns, key_column: Optional[str] = None) -> 'KeyIndex':
+        if key_column is None:
+            has_ids = 'record_id' in columns and (np.asarray(columns['record_id'], dtype=str) != '').any()
+            key_column = 'record_id' if has_ids else 'address_key'
+        values = np.asarray(columns[key_column], dtype=str)
+        rows = np.flatnonzero(values != '')
+        keys, first = np.unique(values[rows], return_index=True)
+        return cls(key_column, keys, rows[first].astype(np.int64))
+
+    def lookup(self, keys: np.ndarray) -> np.ndarray:
+        """Row of each key in this dataset, or -1 where it is absent."""
+        keys = np.asarray(keys, dtype=str)
+        if len(self.keys) == 0:
+            return np.full(len(keys), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = (self.keys[positions] == keys) & (keys != '')
+        return np.where(found, self.rows[positions], -1)
+
+    def save(self, path: str):
+        with open(path, 'wb') as f:
+            np.savez(f, key_column=np.array(self.key_column), keys=self.keys, rows=self.rows)
+
+    @classmethod
+    def load(cls, path: str) -> 'KeyIndex':
+        with np.load(path) as stored:
+            return cls(str(stored['key_column']), stored['keys'], stored['rows'])
+
+
+class Dataset:
+    """Read-only columnar view over one published processed upload."""
+
+    def __init__(self, version: str, path: str, columns: Dict[str, np.ndarray], meta: Dict):
+        self.version = version
+        self.path = path
+        self.meta = meta
+        self._columns = columns
+        self._cube = None
+        self._key_index = None
+
+    def __len__(self) -> int:
+        return int(self.meta.get('rows', 0))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._columns
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self._columns.keys())
+
+    @classmethod
+    def open(cls, path: str) -> 'Dataset':
+        """Memory-map a published dataset directory."""
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+        columns = {
+            name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+            for name in meta['columns']
+        }
+        return cls(meta['version'], path, columns, meta)
+
+    @property
+    def cube(self) -> ContributionCube:
+        """The contribution cube saved at publish time (built on first use for older versions)."""
+        if self._cube is None:
+            cube_file = os.path.join(self.path, CUBE_FILE) if self.path else None
+            if cube_file and os.path.exists(cube_file):
+                self._cube = ContributionCube.load(cube_file)
+            else:
+                self._cube = build_cube(self, self.meta.get('band_edges', DEFAULT_BAND_EDGES), COMPONENT_COLUMNS)
+        return self._cube
+
+    @property
+    def key_index(self) -> KeyIndex:
+        """Household key index saved at publish time (built on first use for older versions)."""
+        if self._key_index is None:
+            index_file = os.path.join(self.path, KEY_INDEX_FILE) if self.path else None
+            if index_file and os.path.exists(index_file):
+                self._key_index = KeyIndex.load(index_file)
+            else:
+                self._key_index = KeyIndex.build(self)
+        return self._key_index
+
+    def family_info(self, rows) -> List[Dict]:
+        """Household details (names, salutation, contribution components) of the given rows only."""
+        rows = np.asarray(rows, dtype=np.int64)
+        text = {name: np.asarray(self._columns[name][rows]).tolist() if name in self._columns else [''] * len(rows)
+                for name in ['record_id', 'display_name'] + HOUSEHOLD_COLUMNS}
+        amounts = {}
+        for name in COMPONENT_COLUMNS:
+            if name in self._columns:
+                values = np.asarray(self._columns[name][rows], dtype=np.float64)
+                amounts[name] = np.where(np.isnan(values), None, values).tolist()
+        return [
+            {**{name: values[i] for name, values in text.items()},
+             'contributions': {name: values[i] for name, values in amounts.items()}}
+            for i in range(len(rows))
+        ]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Copy the dataset into a private DataFrame."""
+        return pd.DataFrame({name: np.asarray(column) for name, column in self._columns.items()})
+
+    def warm(self):
+        """Touch every page so the mapping is resident before workers fork."""
+        for column in self._columns.values():
+            column.view(np.uint8).sum()
+
+
+class DatasetStore:
+    """Versioned, memory-mapped store of processed uploads.
+
+    Each processed upload is published once into ``<DATASET_FOLDER>/<version>``
+    as one ``.npy`` file per column. A ``CURRENT`` pointer file names the
+    active version and is replaced atomically, so every gunicorn worker maps
+    the same files (sharing the page cache) and picks up a new upload on its
+    next request.
+    """
+
+    def __init__(self):
+        self._upload_folder = None
+        self._dataset_folder = None
+        self._versions_kept = None
+        self._results_stored = None
+        self._band_edges = None
+        self._opened = {}
+        self._pointer_stamp = None
+        self._current_version = None
+
+    @property
+    def upload_folder(self):
+        if self._upload_folder is None:
+            with current_app.app_context():
+                self._upload_folder = current_app.config['UPLOAD_FOLDER']
+        return self._upload_folder
+
+    @property
+    def dataset_folder(self):
+        if self._dataset_folder is None:
+            with current_app.app_context():
+                self._dataset_folder = current_app.config.get('DATASET_FOLDER') or \
+                    os.path.join(self.upload_folder, 'datasets')
+                self._versions_kept = max(1, current_app.config.get('DATASET_VERSIONS_KEPT', 3))
+                self._results_stored = max(1, current_app.config.get('ANALYSIS_RESULTS_STORED', 256))
+                self._band_edges = sorted(current_app.config.get('CUBE_CONTRIBUTION_BANDS', DEFAULT_BAND_EDGES))
+        return self._dataset_folder
+
+    @property
+    def pointer_file(self):
+        return os.path.join(self.dataset_folder, POINTER_FILE)
+
+    @staticmethod
+    def version_for(processed_file: str) -> str:
+        """Derive the dataset version from a processed file name."""
+        name = os.path.splitext(os.path.basename(processed_file))[0]
+        return name[len('processed_'):] if name.startswith('processed_') else name
+
+    def _build_columns(self, processed_file: str) -> Dict[str, np.ndarray]:
+        """Read a processed CSV into contiguous column arrays."""
+        df = pd.read_csv(processed_file, dtype={name: str for name in TEXT_COLUMNS})
+        # Older artifacts used lat/lng instead of latitude/longitude
+        df = df.rename(columns={'lat': 'latitude', 'lng': 'longitude'})
+        household_fields = ['record_id'] + HOUSEHOLD_COLUMNS
+        if 'family_info' in df.columns and not set(COMPONENT_COLUMNS + household_fields) <= set(df.columns):
+            # Artifacts written before the components and household fields had their own columns
+            family_info = df['family_info'].map(lambda info: json.loads(info) if isinstance(info, str) else {})
+            contributions = family_info.map(lambda info: info.get('contributions', {}))
+            for name in COMPONENT_COLUMNS:
+                if name not in df.columns:
+                    df[name] = contributions.map(lambda c, key=name: c.get(key))
+            for name in household_fields:
+                if name not in df.columns:
+                    df[name] = family_info.map(lambda info, key=name: info.get(key))
+        columns = {}
+        for name in NUMERIC_COLUMNS:
+            if name in df.columns:
+                values = pd.to_numeric(df[name], errors='coerce')
+            else:
+                values = pd.Series(np.nan, index=df.index)
+            columns[name] = np.ascontiguousarray(values.to_numpy(dtype=np.float64))
+        if 'address_key' not in df.columns and 'address' in df.columns:
+            # Artifacts written before address canonicalization
+            df['address_key'] = df['address'].fillna('').map(canonicalize_address)
+        for name in TEXT_COLUMNS:
+            values = df[name].fillna('').astype(str) if name in df.columns else pd.Series('', index=df.index)
+            columns[name] = np.array(values.tolist() or [''], dtype=str)[:len(df)]
+        return columns
+
+    def publish(self, processed_file: str, version: Optional[str] = None,
+                make_current: bool = True) -> Dataset:
+        """Publish a processed CSV as a memory-mapped dataset version."""
+        version = version or self.version_for(processed_file)
+        target = os.path.join(self.dataset_folder, version)
+
+        if not os.path.exists(os.path.join(target, 'meta.json')):
+            os.makedirs(self.dataset_folder, exist_ok=True)
+            staging = os.path.join(self.dataset_folder, f'.staging-{version}-{os.getpid()}')
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+
+            columns = self._build_columns(processed_file)
+            for name, values in columns.items():
+                np.save(os.path.join(staging, f'{name}.npy'), values)
+            # Pre-aggregate once per version; charts and summaries read the cube
+            build_cube(columns, self._band_edges, COMPONENT_COLUMNS).save(os.path.join(staging, CUBE_FILE))
+            # Sorted household keys, for comparing snapshots
+            KeyIndex.build(columns).save(os.path.join(staging, KEY_INDEX_FILE))
+
+            rows = len(columns[NUMERIC_COLUMNS[0]])
+            with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                json.dump({
+                    'version': version,
+                    'source': os.path.basename(processed_file),
+                    'rows': rows,
+                    'columns': list(columns.keys()),
+                    'band_edges': self._band_edges
+                }, f)
+
+            try:
+                os.replace(staging, target)
+            except OSError:
+                # Another worker published the same version first
+                shutil.rmtree(staging, ignore_errors=True)
+
+        if make_current:
+            self._swap_pointer(version)
+            self.prune()
+        return self.open(version)
+
+    def _swap_pointer(self, version: str):
+        """Atomically point CURRENT at a published version."""
+        tmp_pointer = f'{self.pointer_file}.{os.getpid()}.tmp'
+        with open(tmp_pointer, 'w') as f:
+            f.write(version)
+        os.replace(tmp_pointer, self.pointer_file)
+
+    def open(self, version: str) -> Optional[Dataset]:
+        """Open a published version, reusing an existing mapping."""
+        if version in self._opened:
+            return self._opened[version]
+        path = os.path.join(self.dataset_folder, version)
+        if not os.path.exists(os.path.join(path, 'meta.json')):
+            return None
+        dataset = Dataset.open(path)
+        self._opened[version] = dataset
+        return dataset
+
+    def published_versions(self) -> List[str]:
+        """List published versions, oldest first."""
+        if not os.path.isdir(self.dataset_folder):
+            return []
+        return sorted(
+            name for name in os.listdir(self.dataset_folder)
+            if not name.startswith('.') and name not in (POINTER_FILE, RESULTS_FOLDER)
+            and os.path.isdir(os.path.join(self.dataset_folder, name))
+        )
+
+    def latest_revision(self, version: str) -> Optional[str]:
+        """Return the newest published revision of a version.
+
+        Refinements of an upload (e.g. street-level geocoding) are published
+        as ``<version>.<NNN>`` so that published versions stay immutable.
+        """
+        revisions = [v for v in self.published_versions()
+                     if v == version or v.startswith(f'{version}.')]
+        return revisions[-1] if revisions else None
+
+    @staticmethod
+    def base_version(version: str) -> str:
+        """The upload a version belongs to, e.g. '20240101_000000.002' -> '20240101_000000'."""
+        return version.split('.')[0]
+
+    def open_revision(self, version: str) -> Optional[Dataset]:
+        """Open a published version, or the newest revision of its upload if it was pruned.
+
+        Refinements only update coordinates and keep every row in place, so
+        row positions stored against one revision hold in the others.
+        """
+        dataset = self.open(version)
+        if dataset is None:
+            latest = self.latest_revision(self.base_version(version))
+            dataset = self.open(latest) if latest else None
+        return dataset
+
+    def next_revision(self, version: str) -> str:
+        """Return the version name for the next refinement of a version."""
+        latest = self.latest_revision(version)
+        if latest is None or latest == version:
+            return f'{version}.001'
+        return f'{version}.{int(latest.rsplit(".", 1)[1]) + 1:03d}'
+
+    def open_file(self, filename: str) -> Optional[Dataset]:
+        """Open the dataset for a processed file, publishing it if needed."""
+        version = self.version_for(filename)
+        latest = self.latest_revision(version)
+        dataset = self.open(latest) if latest else None
+        if dataset is None:
+            processed_file = os.path.join(self.upload_folder, filename)
+            if not os.path.exists(processed_file):
+                return None
+            dataset = self.publish(processed_file, version, make_current=False)
+        return dataset
+
+    def current_version(self) -> Optional[str]:
+        """Return the version named by the CURRENT pointer."""
+        try:
+            stat = os.stat(self.pointer_file)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self._pointer_stamp:
+            with open(self.pointer_file, 'r') as f:
+                self._current_version = f.read().strip() or None
+            self._pointer_stamp = stamp
+        return self._current_version
+
+    def current(self) -> Optional[Dataset]:
+        """Return the active dataset, following any swap made by another worker."""
+        version = self.current_version()
+        if version is None:
+            return None
+        dataset = self.open(version)
+        # Drop mappings of superseded versions held by this process
+        for stale in [v for v in self._opened if v != version]:
+            del self._opened[stale]
+        return dataset
+
+    def latest_processed_file(self) -> Optional[str]:
+        """Return the newest processed CSV in the upload folder."""
+        if not os.path.isdir(self.upload_folder):
+            return None
+        processed_files = [f for f in os.listdir(self.upload_folder)
+                           if f.startswith('processed_') and f.endswith('.csv')]
+        if not processed_files:
+            return None
+        return os.path.join(self.upload_folder, sorted(processed_files)[-1])
+
+    def preload(self) -> Optional[Dataset]:
+        """Map the current dataset (publishing the latest upload if needed)."""
+        dataset = self.current()
+        if dataset is None:
+            latest = self.latest_processed_file()
+            if latest is None:
+                return None
+            dataset = self.publish(latest)
+        dataset.warm()
+        return dataset
+
+    def save_result(self, version: str, result_id: str, result: Dict):
+        """Store an analysis result set under its upload, for every worker.
+
+        The row positions and directions are saved with the rest of the
+        result (stats, reference point) in one ``.npz`` file that is
+        replaced atomically, so a worker never reads a partial file. Results
+        live in ``results/<upload>``, outside the revision folders, so they
+        outlive pruned refinements and are removed with the last revision of
+        their upload; beyond ANALYSIS_RESULTS_STORED per upload, the least
+        recently written are removed first.
+        """
+        if not _RESULT_ID.match(result_id):
+            raise ValueError(f"Invalid result ID: {result_id}")
+        folder = os.path.join(self.dataset_folder, RESULTS_FOLDER, self.base_version(version))
+        os.makedirs(folder, exist_ok=True)
+        meta = {key: value for key, value in result.items() if key not in ('rows', 'directions', 'orders')}
+        tmp_file = os.path.join(folder, f'.{result_id}.{os.getpid()}.tmp')
+        with open(tmp_file, 'wb') as f:
+            np.savez(f, rows=np.asarray(result['rows'], dtype=np.int64),
+                     directions=np.asarray(result['directions'], dtype=str),
+                     meta=np.array(json.dumps(meta, default=_json_default)))
+        os.replace(tmp_file, os.path.join(folder, f'{result_id}.npz'))
+
+        stored = [os.path.join(folder, name) for name in os.listdir(folder) if name.endswith('.npz')]
+        if len(stored) > self._results_stored:
+            stored.sort(key=lambda path: os.stat(path).st_mtime_ns)
+            for path in stored[:len(stored) - self._results_stored]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def load_result(self, result_id: str) -> Optional[Dict]:
+        """Read a stored result set, searching the newest uploads first."""
+        results_folder = os.path.join(self.dataset_folder, RESULTS_FOLDER)
+        if not _RESULT_ID.match(result_id) or not os.path.isdir(results_folder):
+            return None
+        for upload in sorted(os.listdir(results_folder), reverse=True):
+            path = os.path.join(results_folder, upload, f'{result_id}.npz')
+            try:
+                with np.load(path) as stored:
+                    result = json.loads(str(stored['meta']))
+                    result['rows'] = stored['rows']
+                    result['directions'] = stored['directions']
+                return result
+            except FileNotFoundError:
+                continue
+        return None
+
+    def prune(self):
+        """Remove old versions beyond DATASET_VERSIONS_KEPT, and results of uploads left with none."""
+        current = self.current_version()
+        versions = self.published_versions()
+        keep = set(versions[-self._versions_kept:]) | {current}
+        for version in [v for v in versions if v not in keep]:
+            # Workers still mapping a removed version keep their pages until they remap
+            shutil.rmtree(os.path.join(self.dataset_folder, version), ignore_errors=True)
+            self._opened.pop(version, None)
+        results_folder = os.path.join(self.dataset_folder, RESULTS_FOLDER)
+        if os.path.isdir(results_folder):
+            uploads = {self.base_version(v) for v in keep if v}
+            for upload in [u for u in os.listdir(results_folder) if u not in uploads]:
+                shutil.rmtree(os.path.join(results_folder, upload), ignore_errors=True)
@@ -0,0 +1,188 @@
+import numpy as np
+from typing import Dict, Iterator, List, Optional
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+
+# format -> (mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+FORMAT_ALIASES = {'excel': 'xlsx', 'json': 'ndjson', 'jsonl': 'ndjson'}
+
+# Optional packages needed by some formats
+FORMAT_DEPENDENCIES = {'parquet': 'pyarrow', 'xlsx': 'xlsxwriter'}
+
+DEFAULT_BATCH_SIZE = 5000
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def normalize_format(format: str) -> str:
+    """Map a requested export format to one of EXPORT_FORMATS."""
+    name = FORMAT_ALIASES.get((format or 'csv').lower(), (format or 'csv').lower())
+    if name not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {format}")
+    dependency = FORMAT_DEPENDENCIES.get(name)
+    if dependency and importlib.util.find_spec(dependency) is None:
+        raise ValueError(f"{name} export requires the {dependency} package")
+    return name
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object whose contents are drained after every batch."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class StreamingExporter:
+    """Export rows of a columnar dataset in batches.
+
+    Rows are read straight from the dataset's column arrays ``batch_size``
+    at a time and encoded into byte chunks, so an export never holds more
+    than one batch of Python objects and can be fed directly into a
+    chunked HTTP response.
+    """
+
+    def __init__(self, dataset, columns: List[str], rows: Optional[np.ndarray] = None,
+                 extra_columns: Optional[Dict[str, np.ndarray]] = None,
+                 batch_size: int = DEFAULT_BATCH_SIZE):
+        self.dataset = dataset
+        self.rows = rows
+        self.extra_columns = extra_columns or {}
+        self.columns = [name for name in columns if name in dataset or name in self.extra_columns]
+        self.batch_size = max(1, batch_size)
+
+    def __len__(self) -> int:
+        return len(self.dataset) if self.rows is None else len(self.rows)
+
+    def batches(self) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield column arrays for consecutive batches of rows."""
+        for start in range(0, len(self), self.batch_size):
+            stop = min(start + self.batch_size, len(self))
+            selector = slice(start, stop) if self.rows is None else self.rows[start:stop]
+            batch = {}
+            for name in self.columns:
+                if name in self.extra_columns:
+                    # Extra columns are aligned with the exported rows, not the dataset
+                    batch[name] = np.asarray(self.extra_columns[name][start:stop])
+                else:
+                    batch[name] = np.asarray(self.dataset[name][selector])
+            yield batch
+
+    def _records(self, batch: Dict[str, np.ndarray]) -> Iterator[tuple]:
+        """Yield batch rows as tuples of native values, with NaN as None."""
+        values = []
+        for name in self.columns:
+            column = batch[name]
+            if column.dtype.kind == 'f':
+                column = np.where(np.isnan(column), None, column.astype(object))
+            values.append(column.tolist())
+        return zip(*values)
+
+    def stream(self, format: str) -> Iterator[bytes]:
+        """Return an iterator of encoded chunks in the given format.
+
+        The format is validated here, before the first chunk is produced, so
+        callers can still answer with an error status.
+        """
+        format = normalize_format(format)
+        return getattr(self, f'_stream_{format}')()
+
+    def write(self, path: str, format: str) -> str:
+        """Write the export to a file chunk by chunk."""
+        with open(path, 'wb') as f:
+            for chunk in self.stream(format):
+                f.write(chunk)
+        return path
+
+    def _stream_csv(self) -> Iterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.columns)
+        for batch in self.batches():
+            writer.writerows(self._records(batch))
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def _stream_ndjson(self) -> Iterator[bytes]:
+        for batch in self.batches():
+            lines = [json.dumps(dict(zip(self.columns, record))) for record in self._records(batch)]
+            yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+    def _stream_parquet(self) -> Iterator[bytes]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sink = _ChunkSink()
+        writer = None
+        for batch in self.batches():
+            table = pa.table({
+                name: pa.array(column if column.dtype.kind in 'fiub' else column.tolist())
+                for name, column in batch.items()
+            })
+            if writer is None:
+                writer = pq.ParquetWriter(sink, table.schema)
+            # Each batch becomes a row group and is flushed to the client
+            writer.write_table(table)
+            yield sink.drain()
+        if writer is not None:
+            writer.close()
+        yield sink.drain()
+
+    def _stream_xlsx(self) -> Iterator[bytes]:
+        import xlsxwriter
+
+        # An XLSX file is a zip archive that is only complete once closed, so
+        # rows are written in constant-memory mode to a temporary file and the
+        # finished file is then streamed out in chunks.
+        fd, path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        try:
+            workbook = xlsxwriter.Workbook(path, {'constant_memory': True, 'nan_inf_to_errors': True})
+            worksheet = workbook.add_worksheet()
+            worksheet.write_row(0, 0, self.columns)
+            row_number = 1
+            for batch in self.batches():
+                for record in self._records(batch):
+                    worksheet.write_row(row_number, 0, record)
+                    row_number += 1
+            workbook.close()
+
+            with open(path, 'rb') as f:
+                while True:
+                    chunk = f.read(FILE_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    yield chunk
+        finally:
+            os.remove(path)
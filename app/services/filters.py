@@ -0,0 +1,313 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from app.services.dataset import COMPONENT_COLUMNS
+from app.services.geometry import haversine_km
+from app.services.polygons import Region
+from app.services.sectors import PolarCache, classify
+import hashlib
+import json
+import threading
+
+# Range predicates and the numeric column each one reads
+RANGE_COLUMNS = {'contribution': 'contribution_amount', 'taxable': 'taxable_donations',
+                 **{name: name for name in COMPONENT_COLUMNS}}
+
+# Set predicates over text columns, matched case-insensitively
+SET_COLUMNS = {'city': 'city', 'zip': 'postal_code', 'statement_type': 'statement_type'}
+
+
+class MaskCache:
+    """Bounded LRU of boolean masks keyed by (dataset version, predicate).
+
+    Masks are read-only and shared between queries, so two filters that
+    share a predicate (or a whole sub-expression) compute it once per
+    dataset version.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Tuple, compute: Callable[[], np.ndarray]) -> Tuple[np.ndarray, bool]:
+        """Return (mask, cached), computing and storing the mask on a miss."""
+        with self._lock:
+            mask = self._entries.get(key)
+            if mask is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return mask, True
+            self.misses += 1
+
+        mask = np.ascontiguousarray(compute(), dtype=bool)
+        mask.setflags(write=False)
+        with self._lock:
+            self._entries[key] = mask
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return mask, False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FilterContext:
+    """What a filter plan is evaluated against: one dataset and, optionally, a reference point."""
+
+    def __init__(self, dataset, cache: MaskCache, reference_point: Optional[Dict[str, float]] = None,
+                 scheme=None, polar_cache: Optional[PolarCache] = None, regions=None):
+        self.dataset = dataset
+        self.cache = cache
+        self.reference_point = reference_point
+        self.scheme = scheme
+        self.polar_cache = polar_cache
+        self.regions = regions
+        self.steps = []
+        self._placed = None
+
+    @property
+    def reference_key(self) -> Tuple:
+        if not self.reference_point:
+            raise ValueError("This filter needs a reference point")
+        return PolarCache.key_for(self.dataset, self.reference_point)[1:] + (self.scheme.key,)
+
+    @property
+    def placed(self) -> Dict[str, np.ndarray]:
+        """Bearing, distance and sector of every household from the reference point."""
+        if self._placed is None:
+            self.reference_key  # raises without a reference point
+            polar = self.polar_cache.get(self.dataset, self.reference_point) if self.polar_cache else None
+            self._placed = classify(self.dataset['latitude'], self.dataset['longitude'],
+                                    self.reference_point, self.scheme, polar=polar)
+        return self._placed
+
+    def memo(self, key: Tuple, compute: Callable[[], np.ndarray], label: str) -> np.ndarray:
+        mask, cached = self.cache.get((self.dataset.version,) + key, compute)
+        self.steps.append({'step': label, 'cached': cached, 'matches': int(np.count_nonzero(mask))})
+        return mask
+
+
+class Node:
+    """A compiled filter expression."""
+
+    def key(self, context: FilterContext) -> Tuple:
+        raise NotImplementedError
+
+    def evaluate(self, context: FilterContext) -> np.ndarray:
+        raise NotImplementedError
+
+
+class Predicate(Node):
+    """One predicate over the columns, e.g. a contribution range or a ZIP set."""
+
+    def __init__(self, name: str, params, compute: Callable, uses_reference: bool = False):
+        self.name = name
+        self.params = params
+        self.compute = compute
+        self.uses_reference = uses_reference
+        self._params_key = json.dumps(params, sort_keys=True, default=str)
+        if len(self._params_key) > 200:
+            # Inline polygons and long sets: key on a digest instead
+            self._params_key = hashlib.sha1(self._params_key.encode('utf-8')).hexdigest()
+
+    def key(self, context: FilterContext) -> Tuple:
+        key = ('predicate', self.name, self._params_key)
+        return key + context.reference_key if self.uses_reference else key
+
+    def evaluate(self, context: FilterContext) -> np.ndarray:
+        return context.memo(self.key(context), lambda: self.compute(context, self.params), self.name)
+
+
+class Combination(Node):
+    """all / any of several expressions; keyed independently of child order."""
+
+    def __init__(self, operator: str, children: List[Node]):
+        self.operator = operator
+        self.children = children
+
+    def key(self, context: FilterContext) -> Tuple:
+        return (self.operator,) + tuple(sorted((child.key(context) for child in self.children), key=repr))
+
+    def evaluate(self, context: FilterContext) -> np.ndarray:
+        def compute():
+            reduce = np.logical_and if self.operator == 'all' else np.logical_or
+            mask = np.full(len(context.dataset), self.operator == 'all')
+            for child in self.children:
+                mask = reduce(mask, child.evaluate(context))
+            return mask
+        if len(self.children) == 1:
+            return self.children[0].evaluate(context)
+        return context.memo(self.key(context), compute, self.operator)
+
+
+class Negation(Node):
+    def __init__(self, child: Node):
+        self.child = child
+
+    def key(self, context: FilterContext) -> Tuple:
+        return ('not', self.child.key(context))
+
+    def evaluate(self, context: FilterContext) -> np.ndarray:
+        return context.memo(self.key(context), lambda: ~self.child.evaluate(context), 'not')
+
+
+def _range(column: str):
+    def compute(context: FilterContext, bounds: Dict) -> np.ndarray:
+        if column not in context.dataset:
+            raise ValueError(f"Column not available in this dataset: {column}")
+        values = np.asarray(context.dataset[column], dtype=np.float64)
+        mask = ~np.isnan(values)
+        if bounds.get('min') is not None:
+            mask &= values >= bounds['min']
+        if bounds.get('max') is not None:
+            mask &= values <= bounds['max']
+        return mask
+    return compute
+
+
+def _text_set(column: str):
+    def compute(context: FilterContext, values: List[str]) -> np.ndarray:
+        if column not in context.dataset:
+            raise ValueError(f"Column not available in this dataset: {column}")
+        stored = np.asarray(context.dataset[column], dtype=str)
+        if column == 'postal_code':
+            # ZIP+4 matches its base ZIP
+            stored = stored.astype('<U5')
+        else:
+            stored = np.char.lower(stored)
+        return np.isin(stored, values)
+    return compute
+
+
+def _direction(context: FilterContext, names: List[str]) -> np.ndarray:
+    invalid = [name for name in names if name not in context.scheme.names]
+    if invalid:
+        raise ValueError(f"Invalid directions: {', '.join(invalid)}")
+    return np.isin(context.placed['sector'], [context.scheme.index(name) for name in names])
+
+
+def _sector(context: FilterContext, arc: Dict) -> np.ndarray:
+    """Bearing arc clockwise from ``from`` to ``to`` degrees (wrapping through north)."""
+    bearing = context.placed['bearing']
+    start, end = float(arc['from']) % 360, float(arc['to']) % 360
+    with np.errstate(invalid='ignore'):
+        inside = (bearing >= start) & (bearing < end) if start <= end else (bearing >= start) | (bearing < end)
+    return inside & context.placed['located']
+
+
+def _radius(context: FilterContext, params: Dict) -> np.ndarray:
+    if params.get('center'):
+        center = params['center']
+        distance = haversine_km(center['lat'], center['lng'],
+                                np.asarray(context.dataset['latitude'], dtype=np.float64),
+                                np.asarray(context.dataset['longitude'], dtype=np.float64))
+    else:
+        distance = context.placed['distance_km']
+    with np.errstate(invalid='ignore'):
+        return (distance <= params['km']) & (distance >= params.get('min_km', 0))
+
+
+def _region(context: FilterContext, region_id: str) -> np.ndarray:
+    if context.regions is None:
+        raise ValueError("Stored regions are not available")
+    return context.regions.mask(context.dataset, region_id)
+
+
+def _polygon(context: FilterContext, geojson: Dict) -> np.ndarray:
+    return Region('inline', 'inline', geojson).contains(context.dataset['latitude'], context.dataset['longitude'])
+
+
+def _name(context: FilterContext, needle: str) -> np.ndarray:
+    names = np.char.lower(np.asarray(context.dataset['display_name'], dtype=str))
+    return np.char.find(names, needle) >= 0
+
+
+def _as_list(value) -> List:
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def _compile_predicate(name: str, value) -> Node:
+    if name in RANGE_COLUMNS:
+        bounds = value if isinstance(value, dict) else {'min': value}
+        unknown = set(bounds) - {'min', 'max'}
+        if unknown:
+            raise ValueError(f"Range filters take min and max, not {', '.join(sorted(unknown))}")
+        bounds = {key: float(bound) for key, bound in bounds.items() if bound is not None}
+        return Predicate(name, bounds, _range(RANGE_COLUMNS[name]))
+    if name in SET_COLUMNS:
+        # Stored ZIPs are cut to five digits, so ZIP+4 queries match their base ZIP
+        values = sorted({str(v).strip().split('-')[0] if name == 'zip' else str(v).strip().lower()
+                         for v in _as_list(value)})
+        return Predicate(name, values, _text_set(SET_COLUMNS[name]))
+    if name == 'direction':
+        return Predicate(name, sorted(str(v) for v in _as_list(value)), _direction, uses_reference=True)
+    if name == 'sector':
+        if not isinstance(value, dict) or 'from' not in value or 'to' not in value:
+            raise ValueError("Sector filters need from and to bearings")
+        return Predicate(name, {'from': float(value['from']), 'to': float(value['to'])}, _sector,
+                         uses_reference=True)
+    if name == 'radius':
+        params = value if isinstance(value, dict) else {'km': value}
+        if 'km' not in params:
+            raise ValueError("Radius filters need km")
+        center = params.get('center')
+        if center is not None and not all(isinstance(center.get(k), (int, float)) for k in ('lat', 'lng')):
+            raise ValueError("Radius center needs numeric lat and lng")
+        params = {'km': float(params['km']), 'min_km': float(params.get('min_km', 0)),
+                  'center': {'lat': float(center['lat']), 'lng': float(center['lng'])} if center else None}
+        return Predicate(name, params, _radius, uses_reference=center is None)
+    if name == 'region':
+        return Predicate(name, str(value), _region)
+    if name == 'polygon':
+        Region('inline', 'inline', value)  # validate the GeoJSON now
+        return Predicate(name, value, _polygon)
+    if name == 'name':
+        needle = str(value).strip().lower()
+        if not needle:
+            raise ValueError("Name filters need some text")
+        return Predicate(name, needle, _name)
+    raise ValueError(f"Unknown filter: {name}")
+
+
+def compile_filters(spec) -> Node:
+    """Compile a declarative filter into a plan of boolean masks.
+
+    A filter is an object whose keys are predicates (all of which must
+    hold), a list of filters (all must hold), or a combinator:
+    ``{"all": [...]}``, ``{"any": [...]}``, ``{"not": filter}``.
+
+    Predicates:
+      contribution, taxable_donations (taxable), csa, offertory:
+          ``{"min": 100, "max": 5000}`` or a number (minimum)
+      direction: sector names of the configured scheme
+      sector: ``{"from": 30, "to": 80}`` bearing arc in degrees
+      radius: ``{"km": 5, "min_km": 1, "center": {"lat": .., "lng": ..}}``
+          or km; the center defaults to the reference point
+      region: a stored region ID; polygon: inline GeoJSON
+      city, zip, statement_type: a value or list of values
+      name: case-insensitive substring of the display name
+    """
+    if isinstance(spec, list):
+        return Combination('all', [compile_filters(item) for item in spec])
+    if not isinstance(spec, dict) or not spec:
+        raise ValueError("A filter must be a non-empty object or list")
+
+    nodes = []
+    for name, value in spec.items():
+        if name in ('all', 'any'):
+            children = _as_list(value)
+            if not children:
+                raise ValueError(f"'{name}' needs at least one filter")
+            nodes.append(Combination(name, [compile_filters(child) for child in children]))
+        elif name == 'not':
+            nodes.append(Negation(compile_filters(value)))
+        else:
+            nodes.append(_compile_predicate(name, value))
+    return nodes[0] if len(nodes) == 1 else Combination('all', nodes)
@@ -1,16 +1,32 @@
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
 from flask import current_app
+from app.services.address import canonicalize_address
+from app.services.local_geocoding import (
+    get_zip_index, extract_postal_code, PRECISION_STREET
+)
+from app.services.resilience import RetryPolicy, CircuitBreaker, ProviderUnavailableError
+from app.services.spatial import SpatialGridIndex
+from datetime import timedelta
 import time
 import json
 import os
 from typing import List, Dict, Optional
 
+# Provider errors worth retrying; anything else fails the call immediately
+TRANSIENT_ERRORS = (GeocoderTimedOut, GeocoderUnavailable)
+
 class GeocodingService:
     def __init__(self):
         self._provider = None
         self._cache = {}
         self._cache_file = None
+        self._failures = {}
+        self._retry = None
+        self._breaker = None
+        self._negative_ttl = None
+        self._reverse_index = None
+        self._reverse_tolerance = None
         
     @property
     def provider(self):
@@ -21,15 +37,86 @@ class GeocodingService:
                     self._provider = Nominatim(user_agent="housing_income_analysis")
         return self._provider
     
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        if self._retry is None:
+            with current_app.app_context():
+                self._retry = RetryPolicy(
+                    max_attempts=current_app.config.get('GEOCODING_MAX_ATTEMPTS', 3),
+                    base_delay=current_app.config.get('GEOCODING_BACKOFF_BASE', 0.5),
+                    max_delay=current_app.config.get('GEOCODING_BACKOFF_MAX', 8.0)
+                )
+        return self._retry
+    
+    @property
+    def breaker(self) -> CircuitBreaker:
+        if self._breaker is None:
+            with current_app.app_context():
+                self._breaker = CircuitBreaker(
+                    failure_threshold=current_app.config.get('GEOCODING_BREAKER_THRESHOLD', 5),
+                    reset_timeout=current_app.config.get('GEOCODING_BREAKER_RESET', 60)
+                )
+        return self._breaker
+    
+    @property
+    def negative_ttl(self) -> float:
+        if self._negative_ttl is None:
+            with current_app.app_context():
+                ttl = current_app.config.get('GEOCODING_NEGATIVE_CACHE_TTL', timedelta(days=1))
+                self._negative_ttl = ttl.total_seconds() if isinstance(ttl, timedelta) else float(ttl)
+        return self._negative_ttl
+    
+    @property
+    def reverse_tolerance(self) -> float:
+        if self._reverse_tolerance is None:
+            with current_app.app_context():
+                self._reverse_tolerance = current_app.config.get('REVERSE_GEOCODING_TOLERANCE_M', 50)
+        return self._reverse_tolerance
+    
+    @property
+    def reverse_index(self) -> SpatialGridIndex:
+        """Grid index over cached reverse-geocoding results."""
+        if self._reverse_index is None:
+            self._ensure_cache_loaded()
+            with current_app.app_context():
+                index = SpatialGridIndex(current_app.config.get('REVERSE_GEOCODING_CELL_DEGREES', 0.001))
+            for key, value in self._cache.items():
+                # Reverse results carry the provider's raw payload; forward results do not
+                if isinstance(value, dict) and 'raw' in value:
+                    lat_lng = self._parse_coordinate_key(key)
+                    if lat_lng is not None:
+                        index.add(lat_lng[0], lat_lng[1], key)
+            self._reverse_index = index
+        return self._reverse_index
+    
+    @staticmethod
+    def _parse_coordinate_key(key: str):
+        """Parse a 'lat,lng' cache key."""
+        try:
+            lat, lng = (float(part) for part in key.split(','))
+            return lat, lng
+        except ValueError:
+            return None
+    
     @property
     def cache_file(self):
         if self._cache_file is None:
             with current_app.app_context():
                 self._cache_file = os.path.join(current_app.config['UPLOAD_FOLDER'], 'geocoding_cache.json')
-                # Load cache when accessing cache_file for the first time
+                # Load caches when accessing cache_file for the first time
                 self._cache = self._load_cache()
+                self._failures = self._load_failures()
         return self._cache_file
     
+    @property
+    def failures_file(self):
+        return os.path.join(os.path.dirname(self.cache_file), 'geocoding_failures.json')
+    
+    def _ensure_cache_loaded(self):
+        """Load the persistent caches on first use."""
+        if self._cache_file is None:
+            self._cache_file = self.cache_file
+    
     def _load_cache(self) -> Dict:
         """Load geocoding cache from file."""
         if os.path.exists(self.cache_file):
@@ -40,6 +127,46 @@ class GeocodingService:
                 current_app.logger.warning("Invalid cache file, starting with empty cache")
         return {}
     
+    def _load_failures(self) -> Dict:
+        """Load the negative cache, dropping expired entries."""
+        if os.path.exists(self.failures_file):
+            try:
+                with open(self.failures_file, 'r') as f:
+                    now = time.time()
+                    return {key: expires for key, expires in json.load(f).items() if expires > now}
+            except json.JSONDecodeError:
+                current_app.logger.warning("Invalid negative cache file, starting with empty cache")
+        return {}
+    
+    def _save_failures(self):
+        """Save the negative cache to file."""
+        try:
+            with open(self.failures_file, 'w') as f:
+                json.dump(self._failures, f)
+        except Exception as e:
+            current_app.logger.error(f"Error saving geocoding negative cache: {str(e)}")
+    
+    def _is_known_failure(self, key: str) -> bool:
+        """Return whether the provider recently failed to resolve this key."""
+        expires = self._failures.get(key)
+        if expires is None:
+            return False
+        if expires <= time.time():
+            del self._failures[key]
+            return False
+        return True
+    
+    def _remember_failure(self, key: str):
+        """Negatively cache an unresolvable key for GEOCODING_NEGATIVE_CACHE_TTL."""
+        self._failures[key] = time.time() + self.negative_ttl
+        self._save_failures()
+    
+    def _call_provider(self, method, *args, **kwargs):
+        """Call the provider with bounded retries behind the circuit breaker."""
+        return self.retry_policy.call(
+            method, *args, retry_on=TRANSIENT_ERRORS, breaker=self.breaker, **kwargs
+        )
+    
     def _save_cache(self):
         """Save geocoding cache to file."""
         try:
@@ -50,9 +177,13 @@ class GeocodingService:
             current_app.logger.error(f"Error saving geocoding cache: {str(e)}")
     
     def geocode(self, address: str) -> Optional[Dict]:
-        """Geocode an address to get its coordinates."""
+        """Geocode an address to get its coordinates.
+        
+        Returns None when the provider cannot resolve the address and raises
+        ProviderUnavailableError when it could not be reached.
+        """
         try:
-            location = self.provider.geocode(address)
+            location = self._call_provider(self.provider.geocode, address)
             if location:
                 result = {
                     'lat': location.latitude,
@@ -62,48 +193,60 @@ class GeocodingService:
                 }
                 return result
             return None
-        except GeocoderTimedOut:
-            time.sleep(1)  # Wait before retrying
-            return self.geocode(address)  # Retry once
+        except ProviderUnavailableError:
+            raise
         except Exception as e:
             current_app.logger.error(f"Geocoding error for address {address}: {str(e)}")
             return None
     
     def reverse_geocode(self, latitude: float, longitude: float) -> Optional[Dict]:
         """Get address from coordinates."""
-        key = f"{latitude},{longitude}"
-        if key in self._cache:
-            return self._cache[key]
+        # Answer from the nearest cached result within tolerance
+        cached_key = self.reverse_index.nearest(latitude, longitude, self.reverse_tolerance)
+        if cached_key is not None:
+            return self._cache[cached_key]
+        
+        key = f"{latitude:.6f},{longitude:.6f}"
         
         try:
-            location = self.provider.reverse((latitude, longitude))
+            location = self._call_provider(self.provider.reverse, (latitude, longitude))
             if location:
                 result = {
                     'address': location.address,
+                    'lat': latitude,
+                    'lng': longitude,
                     'raw': location.raw
                 }
                 self._cache[key] = result
+                self.reverse_index.add(latitude, longitude, key)
                 self._save_cache()
                 return result
             return None
-        except GeocoderTimedOut:
-            time.sleep(1)  # Wait before retrying
-            return self.reverse_geocode(latitude, longitude)  # Retry once
+        except ProviderUnavailableError as e:
+            current_app.logger.warning(f"Reverse geocoding unavailable for ({latitude}, {longitude}): {str(e)}")
+            return None
         except Exception as e:
             current_app.logger.error(f"Reverse geocoding error for coordinates ({latitude}, {longitude}): {str(e)}")
             return None
     
     def geocode_address(self, address: str) -> Optional[Dict]:
         """Geocode a single address with caching."""
-        # Clean the address
-        clean_address = address.strip()
+        # Key the cache on the canonical form so spelling variants share an entry
+        clean_address = canonicalize_address(address)
         if not clean_address:
             return None
+        self._ensure_cache_loaded()
             
-        # Check cache first
-        if clean_address in self._cache:
-            current_app.logger.info(f"Cache hit for address: {clean_address}")
-            return self._cache[clean_address]
+        # Check cache first (entries written before canonicalization used the stripped address)
+        for key in (clean_address, address.strip()):
+            if key in self._cache:
+                current_app.logger.info(f"Cache hit for address: {clean_address}")
+                return self._cache[key]
+        
+        # Skip addresses the provider recently failed to resolve
+        if self._is_known_failure(clean_address):
+            current_app.logger.info(f"Negative cache hit for address: {clean_address}")
+            return self.locate_by_postal_code(clean_address)
         
         try:
             # Geocode the address
@@ -115,7 +258,8 @@ class GeocodingService:
                     'address': clean_address,
                     'lat': result['lat'],
                     'lng': result['lng'],
-                    'formatted_address': result['formatted_address']
+                    'formatted_address': result['formatted_address'],
+                    'precision': PRECISION_STREET
                 }
                 
                 # Cache the result
@@ -126,11 +270,56 @@ class GeocodingService:
                 return cached_result
             
             current_app.logger.warning(f"Could not geocode address: {clean_address}")
-            return None
+            self._remember_failure(clean_address)
+            return self.locate_by_postal_code(clean_address)
             
+        except ProviderUnavailableError as e:
+            # Transient outage: do not negatively cache, the address may resolve later
+            current_app.logger.warning(f"Geocoding provider unavailable for {clean_address}: {str(e)}")
+            return self.locate_by_postal_code(clean_address)
         except Exception as e:
             current_app.logger.error(f"Error geocoding address {clean_address}: {str(e)}")
+            return self.locate_by_postal_code(clean_address)
+    
+    def locate_by_postal_code(self, address: str) -> Optional[Dict]:
+        """Approximate an address by its ZIP centroid (not cached, so it can be refined later)."""
+        postal_code = extract_postal_code(address)
+        if not postal_code:
             return None
+        
+        centroid = get_zip_index(current_app.config.get('ZIP_CENTROIDS_FILE')).lookup(postal_code)
+        if centroid is None:
+            return None
+        
+        current_app.logger.info(f"Using ZIP centroid for address: {address}")
+        return {
+            'address': address,
+            'lat': centroid['lat'],
+            'lng': centroid['lng'],
+            'formatted_address': f"ZIP {postal_code}",
+            'precision': centroid['precision']
+        }
+    
+    def cache_size(self) -> int:
+        """Number of cached geocoding results."""
+        self._ensure_cache_loaded()
+        return len(self._cache)
+    
+    def cached_addresses(self):
+        """Yield autocomplete entries for cached forward-geocoding results."""
+        self._ensure_cache_loaded()
+        for key, value in list(self._cache.items()):
+            # Reverse results carry 'raw'; forward results carry coordinates only
+            if not isinstance(value, dict) or 'raw' in value or 'lat' not in value:
+                continue
+            yield {
+                'key': key,
+                'address': value.get('formatted_address') or key,
+                'lat': value['lat'],
+                'lng': value['lng'],
+                'precision': value.get('precision', PRECISION_STREET),
+                'source': 'cache'
+            }
     
     def geocode_batch(self, addresses: List[str], batch_size: int = 50) -> Dict:
         """Geocode a batch of addresses with rate limiting."""
@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.services.address import canonicalize_address
+from app.services.local_geocoding import get_zip_index
+from app.services.validation import (DEFAULT_REJECT, duplicate_record_rows, issue_summary,
+                                     merge_issue_summaries, validate_frame)
+import io
+import math
+import multiprocessing
+import os
+import shutil
+
+REQUIRED_COLUMNS = [
+    'dp_RecordID', 'HOH_Titles', 'Family_Name', 'Address_Line_1', 'City',
+    'State/Region', 'Postal_Code', 'Taxable_Donations_Last_52',
+    'CSA_Last_Year', 'Offertory_Rolling_52'
+]
+
+# Upload column -> processed component column
+CONTRIBUTION_COLUMNS = {'Taxable_Donations_Last_52': 'taxable_donations', 'CSA_Last_Year': 'csa',
+                        'Offertory_Rolling_52': 'offertory'}
+
+ADDRESS_COLUMNS = ['Address_Line_1', 'Address_Line_2', 'City', 'State/Region', 'Postal_Code']
+
+SCAN_BLOCK_BYTES = 1 << 20
+
+
+def read_csv_bytes(data: bytes) -> pd.DataFrame:
+    """Parse upload bytes with every column as text."""
+    return pd.read_csv(io.BytesIO(data), dtype=str, na_values=[''], keep_default_na=True)
+
+
+def clean_currency(values: pd.Series) -> pd.Series:
+    """Parse amounts like '$1,200.00'; empty or unparseable amounts become 0.0."""
+    text = values.fillna('').astype(str).str.replace('$', '', regex=False).str.replace(',', '', regex=False)
+    return pd.to_numeric(text.str.strip(), errors='coerce').fillna(0.0).astype(np.float64)
+
+
+def _text(df: pd.DataFrame, col: str) -> pd.Series:
+    """A text column stripped, empty when the export leaves it out."""
+    if col not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[col].fillna('').astype(str).str.strip()
+
+
+def _join_nonempty(parts: List[pd.Series]) -> pd.Series:
+    """Join the non-empty parts of every row with ', '."""
+    joined = parts[0]
+    for part in parts[1:]:
+        separator = np.where((joined != '') & (part != ''), ', ', '')
+        joined = joined + separator + part
+    return joined
+
+
+def process_frame(df: pd.DataFrame, zip_centroids_file: Optional[str] = None) -> pd.DataFrame:
+    """Clean one chunk of an upload and derive the processed columns."""
+    amounts = {col: clean_currency(df[col]) for col in CONTRIBUTION_COLUMNS}
+    address = {col: _text(df, col).replace('nan', '') for col in ADDRESS_COLUMNS}
+
+    # Combine address components into a single address field, with the base ZIP (no +4)
+    postal_code = address['Postal_Code'].str.split('-').str[0].str.strip()
+    combined = _join_nonempty([address['Address_Line_1'], address['Address_Line_2'], address['City'],
+                               address['State/Region'], postal_code])
+
+    # Give every household approximate coordinates from its ZIP (or city)
+    # centroid; street-level geocoding refines these later
+    latitude, longitude, geo_precision = get_zip_index(zip_centroids_file).locate_many(
+        postal_code, address['City'], address['State/Region']
+    )
+
+    family_name = _text(df, 'Family_Name')
+    return pd.DataFrame({
+        'record_id': df['dp_RecordID'].map(
+            lambda v: '' if pd.isna(v) else str(int(v)) if isinstance(v, float) and v.is_integer() else str(v)
+        ),
+        'address': combined,
+        # Canonical address used as the geocoding cache key
+        'address_key': combined.map(canonicalize_address),
+        'postal_code': postal_code,
+        'city': address['City'].str.title(),
+        'statement_type': _text(df, 'Statement_Type'),
+        'latitude': latitude,
+        'longitude': longitude,
+        'geo_precision': geo_precision,
+        'contribution_amount': sum(amounts.values()),
+        **{name: amounts[col] for col, name in CONTRIBUTION_COLUMNS.items()},
+        'display_name': (_text(df, 'HOH_Titles') + ' ' + family_name).str.strip(),
+        # Household fields as typed columns; Dataset.family_info() rebuilds
+        # the per-household dict for the rows a caller actually returns
+        'family_name': family_name,
+        'head_1_name': _text(df, 'Head_1_Name'),
+        'head_2_name': _text(df, 'Head_2_Name'),
+        'salutation': _text(df, 'Salutation'),
+        'formal_addressee': _text(df, 'Formal_Addressee')
+    }, index=df.index)
+
+
+def chunk_summary(processed: pd.DataFrame) -> Dict:
+    """Counts and totals of a processed chunk, mergeable with merge_summaries()."""
+    return {
+        'total_records': len(processed),
+        'address_keys': np.unique(processed.loc[processed['address_key'] != '', 'address_key'].to_numpy(dtype=str)),
+        'valid_contributions': int(processed['contribution_amount'].notna().sum()),
+        'geo_precision': processed['geo_precision'].value_counts().to_dict(),
+        'total_contribution': float(processed['contribution_amount'].sum()),
+        'contribution_summary': {name: float(processed[name].sum()) for name in CONTRIBUTION_COLUMNS.values()}
+    }
+
+
+def merge_summaries(summaries: List[Dict]) -> Dict:
+    """Combine chunk summaries into the upload summary returned by process_csv."""
+    geo_precision = {}
+    for summary in summaries:
+        for level, count in summary['geo_precision'].items():
+            geo_precision[str(level)] = geo_precision.get(str(level), 0) + int(count)
+    keys = [summary['address_keys'] for summary in summaries]
+    total_records = sum(summary['total_records'] for summary in summaries)
+    return {
+        'total_records': total_records,
+        'valid_addresses': total_records,
+        'unique_addresses': len(np.unique(np.concatenate(keys))) if keys else 0,
+        'valid_contributions': sum(summary['valid_contributions'] for summary in summaries),
+        'located_addresses': total_records - geo_precision.get('none', 0),
+        'geo_precision': geo_precision,
+        # Rounded to cents so that totals do not depend on how the upload was chunked
+        'total_contribution': round(math.fsum(summary['total_contribution'] for summary in summaries), 2),
+        'contribution_summary': {
+            name: round(math.fsum(summary['contribution_summary'][name] for summary in summaries), 2)
+            for name in CONTRIBUTION_COLUMNS.values()
+        }
+    }
+
+
+def read_header(path: str) -> Tuple[bytes, List[str]]:
+    """The header line of a CSV (bytes, including the newline) and its column names."""
+    with open(path, 'rb') as f:
+        header = f.readline()
+    return header, read_csv_bytes(header).columns.tolist()
+
+
+def row_aligned_ranges(path: str, start: int, parts: int) -> List[Tuple[int, int]]:
+    """Split ``path`` from byte ``start`` into about ``parts`` ranges that end on row boundaries.
+
+    A boundary is the first newline after each even split point that is not
+    inside a quoted field: quotes are counted from ``start``, and doubled
+    quotes inside fields keep the count even.
+    """
+    size = os.path.getsize(path)
+    bounds = [start]
+    quotes = 0
+    pos = start
+    with open(path, 'rb') as f:
+        f.seek(start)
+        for i in range(1, parts):
+            target = start + (size - start) * i // parts
+            if target <= pos:
+                continue
+            while pos < target:
+                block = f.read(min(SCAN_BLOCK_BYTES, target - pos))
+                if not block:
+                    break
+                quotes += block.count(b'"')
+                pos += len(block)
+
+            found = None
+            while found is None:
+                block = f.read(SCAN_BLOCK_BYTES)
+                if not block:
+                    break
+                offset = 0
+                while found is None:
+                    newline = block.find(b'\n', offset)
+                    if newline < 0:
+                        quotes += block.count(b'"', offset)
+                        break
+                    quotes += block.count(b'"', offset, newline)
+                    if quotes % 2 == 0:
+                        found = pos + newline + 1
+                    offset = newline + 1
+                if found is None:
+                    pos += len(block)
+            if found is None or found >= size:
+                break
+            bounds.append(found)
+            pos = found
+            f.seek(found)
+    bounds.append(size)
+    return [(lo, hi) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def read_record_ids(path: str, header: bytes, ranges: List[Tuple[int, int]]) -> List[np.ndarray]:
+    """The stripped dp_RecordID of every row, per byte range, parsing only that column."""
+    record_ids = []
+    with open(path, 'rb') as f:
+        for start, end in ranges:
+            f.seek(start)
+            ids = pd.read_csv(io.BytesIO(header + f.read(end - start)), dtype=str, usecols=['dp_RecordID'])
+            record_ids.append(ids['dp_RecordID'].fillna('').str.strip().to_numpy(dtype=str))
+    return record_ids
+
+
+def ingest_range(path: str, header: bytes, start: int, end: int, part_path: str,
+                 write_header: bool, zip_centroids_file: Optional[str] = None,
+                 issues_path: Optional[str] = None, first_row: int = 0,
+                 duplicate_rows: Optional[np.ndarray] = None, reject: List[str] = DEFAULT_REJECT) -> Dict:
+    """Ingest the rows in one byte range of an upload into a part of the processed CSV.
+
+    Rows are validated first; rejected rows are left out of the part and
+    every issue is written to ``issues_path`` (see validate_frame).
+    """
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    df = read_csv_bytes(header + data)
+    rejected, issues = validate_frame(df, CONTRIBUTION_COLUMNS, first_row, duplicate_rows, reject)
+    processed = process_frame(df[~rejected], zip_centroids_file)
+    processed.to_csv(part_path, index=False, header=write_header)
+    if issues_path:
+        issues.to_csv(issues_path, index=False, header=write_header)
+    summary = chunk_summary(processed)
+    summary['validation'] = issue_summary(len(df), int(rejected.sum()), issues, reject)
+    return summary
+
+
+def _ingest_range_args(args) -> Dict:
+    return ingest_range(*args)
+
+
+def _concatenate(part_paths: List[str], output_path: str):
+    """Concatenate part files in order without loading them, replacing ``output_path`` atomically."""
+    tmp_path = f'{output_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as out:
+        for part_path in part_paths:
+            with open(part_path, 'rb') as part:
+                shutil.copyfileobj(part, out, SCAN_BLOCK_BYTES)
+    os.replace(tmp_path, output_path)
+
+
+def ingest_csv(path: str, output_path: str, zip_centroids_file: Optional[str] = None,
+               workers: int = 1, chunk_bytes: int = 64 * 1024 * 1024,
+               issues_path: Optional[str] = None, reject: List[str] = DEFAULT_REJECT) -> Dict:
+    """Clean an upload into the processed CSV at ``output_path`` and summarize it.
+
+    The upload is split into row-aligned byte ranges of about
+    ``chunk_bytes``; with ``workers`` > 1 the ranges are ingested by a
+    process pool (started with spawn, so no locks or threads of the
+    calling worker are inherited). Either way each range writes its own
+    part file and the parts are concatenated in order, so the output does
+    not depend on the worker count.
+
+    Every row is validated on the way; rows with an issue in ``reject`` are
+    left out, and the per-row issue table is written to ``issues_path``.
+    With several ranges, the record ID column is read once up front so
+    that a repeated ID is caught even when its first occurrence is in
+    another range. Raises ValueError when required columns are missing.
+    """
+    header, columns = read_header(path)
+    missing_columns = [col for col in REQUIRED_COLUMNS if col not in columns]
+    if missing_columns:
+        raise ValueError(f"Missing required columns: {', '.join(missing_columns)}")
+
+    size = os.path.getsize(path)
+    parts = max(1, math.ceil((size - len(header)) / max(1, chunk_bytes)))
+    if workers > 1:
+        parts = max(parts, workers)
+    ranges = row_aligned_ranges(path, len(header), parts) or [(len(header), len(header))]
+
+    first_rows, duplicates = [0], [None]
+    if len(ranges) > 1:
+        record_ids = read_record_ids(path, header, ranges)
+        first_rows = np.cumsum([0] + [len(ids) for ids in record_ids[:-1]]).tolist()
+        duplicates = duplicate_record_rows(record_ids)
+
+    part_paths = [f'{output_path}.{i:05d}.part' for i in range(len(ranges))]
+    issue_paths = [f'{output_path}.{i:05d}.issues.part' for i in range(len(ranges))]
+    tasks = [(path, header, start, end, part_path, i == 0, zip_centroids_file,
+              issue_paths[i] if issues_path else None, first_rows[i], duplicates[i], list(reject))
+             for i, ((start, end), part_path) in enumerate(zip(ranges, part_paths))]
+    try:
+        if workers > 1 and len(tasks) > 1:
+            context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=context) as pool:
+                summaries = list(pool.map(_ingest_range_args, tasks))
+        else:
+            summaries = [ingest_range(*task) for task in tasks]
+
+        _concatenate(part_paths, output_path)
+        if issues_path:
+            _concatenate(issue_paths, issues_path)
+    finally:
+        for part_path in part_paths + issue_paths:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+
+    summary = merge_summaries(summaries)
+    summary['validation'] = merge_issue_summaries([chunk['validation'] for chunk in summaries])
+    summary['chunks'] = len(tasks)
+    return summary
@@ -0,0 +1,95 @@
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Frame, Paragraph, Spacer
+from typing import Dict, List
+from xml.sax.saxutils import escape
+import string
+
+LETTER_FIELDS = [
+    'salutation', 'formal_addressee', 'display_name', 'family_name', 'head_1_name', 'head_2_name',
+    'record_id', 'address', 'date', 'contribution', 'taxable_donations', 'csa', 'offertory'
+]
+
+DEFAULT_LETTER_TEMPLATE = """Dear {salutation},
+
+Thank you for your generous support of our parish over the past year. Your gifts, totaling {contribution}, help sustain our ministries, our school and our outreach to neighbors in need.
+
+As we begin our annual stewardship season, we invite you to prayerfully consider how you will share your time, talent and treasure in the coming year.
+
+With gratitude,
+
+Pastor"""
+
+
+def template_fields(template: str) -> List[str]:
+    """The placeholders of a letter template; raises ValueError for unknown or malformed ones."""
+    try:
+        fields = [name for _, name, _, _ in string.Formatter().parse(template) if name is not None]
+    except ValueError as e:
+        raise ValueError(f"Invalid letter template: {str(e)}")
+    unknown = sorted({name for name in fields if name not in LETTER_FIELDS})
+    if unknown:
+        raise ValueError(f"Unknown letter fields: {', '.join(unknown)}")
+    return fields
+
+
+def _money(value) -> str:
+    return f"${value or 0.0:,.2f}"
+
+
+def letter_values(household: Dict, address: str, date: str) -> Dict[str, str]:
+    """Template values of one household from Dataset.family_info(), with fallbacks for empty names."""
+    contributions = household.get('contributions', {})
+    name = household.get('display_name') or household.get('family_name') or 'Friend'
+    return {
+        **{field: str(household.get(field) or '') for field in LETTER_FIELDS if field in household},
+        'salutation': household.get('salutation') or name,
+        'formal_addressee': household.get('formal_addressee') or name,
+        'display_name': name,
+        'address': address,
+        'date': date,
+        'contribution': _money(sum(v for v in contributions.values() if v is not None)),
+        **{field: _money(contributions.get(field)) for field in ('taxable_donations', 'csa', 'offertory')}
+    }
+
+
+def address_lines(address: str) -> List[str]:
+    """Split a processed address ('street, [line 2, ]city, state, zip') into mailing lines."""
+    parts = [part for part in address.split(', ') if part]
+    if len(parts) < 4:
+        return [', '.join(parts)] if parts else []
+    return parts[:-3] + [f"{parts[-3]}, {parts[-2]} {parts[-1]}"]
+
+
+def render_letters(households: List[Dict], addresses: List[str], template: str, path: str, date: str) -> Dict:
+    """Render one single-page letter per household into the PDF at ``path``.
+
+    Pages are drawn straight onto the canvas; whatever does not fit on the
+    page is left out and counted as ``truncated``.
+    """
+    styles = getSampleStyleSheet()
+    body_style = ParagraphStyle('LetterBody', parent=styles['Normal'], fontSize=11, leading=15, spaceAfter=10)
+    paragraphs = [escape(block.strip()).replace('\n', '<br/>') for block in template.split('\n\n') if block.strip()]
+    width, height = letter
+    canvas = Canvas(path, pagesize=letter)
+    truncated = 0
+
+    for household, address in zip(households, addresses):
+        values = {name: escape(value) for name, value in letter_values(household, address, date).items()}
+        recipient = [values['formal_addressee']] + [escape(line) for line in address_lines(address)]
+        story = [
+            Paragraph(values['date'], body_style),
+            Spacer(1, 0.25 * inch),
+            Paragraph('<br/>'.join(recipient), body_style),
+            Spacer(1, 0.25 * inch),
+            *[Paragraph(paragraph.format_map(values), body_style) for paragraph in paragraphs]
+        ]
+        frame = Frame(inch, inch, width - 2 * inch, height - 2 * inch, showBoundary=0)
+        frame.addFromList(story, canvas)
+        truncated += bool(story)
+        canvas.showPage()
+
+    canvas.save()
+    return {'pages': len(households), 'truncated': truncated}
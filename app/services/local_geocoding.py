@@ -0,0 +1,103 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Optional, Tuple
+import functools
+import os
+import re
+
+DEFAULT_CENTROIDS_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), 'data', 'us_zip_centroids.csv.gz'
+)
+
+# Coordinate precision levels, from most to least precise
+PRECISION_STREET = 'street'
+PRECISION_ZIP = 'zip'
+PRECISION_CITY = 'city'
+PRECISION_NONE = 'none'
+
+_ZIP_PATTERN = re.compile(r'\b(\d{5})(?:-\d{4})?\s*$')
+
+
+def extract_postal_code(address: str) -> Optional[str]:
+    """Return the five-digit ZIP code at the end of an address, if any."""
+    match = _ZIP_PATTERN.search(address or '')
+    return match.group(1) if match else None
+
+
+class ZipCentroidIndex:
+    """In-memory index of US ZIP code and city centroids.
+
+    ZIP codes are held as a sorted integer array so that a whole column of
+    postal codes is resolved with one ``np.searchsorted`` call. City
+    centroids are the mean of the ZIP centroids sharing a city and state.
+    """
+
+    def __init__(self, path: str = DEFAULT_CENTROIDS_FILE):
+        table = pd.read_csv(path, dtype={'zip_code': str, 'city': str, 'state': str})
+        table = table.sort_values('zip_code')
+        self._zips = table['zip_code'].astype(np.int32).to_numpy()
+        self._lat = table['latitude'].to_numpy(dtype=np.float64)
+        self._lng = table['longitude'].to_numpy(dtype=np.float64)
+
+        cities = table.assign(key=self._city_keys(table['city'], table['state']))
+        cities = cities.groupby('key')[['latitude', 'longitude']].mean()
+        self._city_keys_sorted = cities.index.to_numpy(dtype=str)
+        self._city_lat = cities['latitude'].to_numpy(dtype=np.float64)
+        self._city_lng = cities['longitude'].to_numpy(dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self._zips)
+
+    @staticmethod
+    def _city_keys(cities: pd.Series, states: pd.Series) -> pd.Series:
+        return cities.fillna('').str.upper().str.strip() + '|' + states.fillna('').str.upper().str.strip()
+
+    @staticmethod
+    def _search(keys: np.ndarray, sorted_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Return positions of keys in sorted_keys and a mask of exact matches."""
+        if len(sorted_keys) == 0:
+            return np.zeros(len(keys), dtype=np.intp), np.zeros(len(keys), dtype=bool)
+        positions = np.searchsorted(sorted_keys, keys)
+        positions = np.minimum(positions, len(sorted_keys) - 1)
+        return positions, sorted_keys[positions] == keys
+
+    def lookup(self, postal_code: str) -> Optional[Dict]:
+        """Return the centroid of a single ZIP code."""
+        lat, lng, found = self.lookup_many(pd.Series([postal_code]))
+        if not found[0]:
+            return None
+        return {'lat': float(lat[0]), 'lng': float(lng[0]), 'precision': PRECISION_ZIP}
+
+    def lookup_many(self, postal_codes: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Resolve a column of postal codes (ZIP or ZIP+4) to centroids."""
+        base = postal_codes.fillna('').astype(str).str.strip().str[:5]
+        valid = base.str.fullmatch(r'\d{5}').to_numpy(dtype=bool)
+        keys = np.where(valid, pd.to_numeric(base.where(valid, '0')).to_numpy(), -1).astype(np.int32)
+
+        positions, found = self._search(keys, self._zips)
+        found &= valid
+        lat = np.where(found, self._lat[positions], np.nan)
+        lng = np.where(found, self._lng[positions], np.nan)
+        return lat, lng, found
+
+    def locate_many(self, postal_codes: pd.Series, cities: pd.Series,
+                    states: pd.Series) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Resolve households to ZIP centroids, falling back to city centroids."""
+        lat, lng, found = self.lookup_many(postal_codes)
+        precision = np.where(found, PRECISION_ZIP, PRECISION_NONE).astype(object)
+
+        missing = ~found
+        if missing.any():
+            keys = self._city_keys(cities[missing], states[missing]).to_numpy(dtype=str)
+            positions, city_found = self._search(keys, self._city_keys_sorted)
+            rows = np.flatnonzero(missing)[city_found]
+            lat[rows] = self._city_lat[positions[city_found]]
+            lng[rows] = self._city_lng[positions[city_found]]
+            precision[rows] = PRECISION_CITY
+        return lat, lng, precision
+
+
+@functools.lru_cache(maxsize=4)
+def get_zip_index(path: Optional[str] = None) -> ZipCentroidIndex:
+    """Load the centroid table once per process."""
+    return ZipCentroidIndex(path or DEFAULT_CENTROIDS_FILE)
@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Tuple
+import base64
+import binascii
+import json
+
+# Stable sort orders for paging through a result set
+SORT_CONTRIBUTION = 'contribution'  # largest contribution first
+SORT_DISTANCE = 'distance'          # nearest to the reference point first
+SORT_NAME = 'name'                  # display name, case-insensitive
+SORT_ORDERS = (SORT_CONTRIBUTION, SORT_DISTANCE, SORT_NAME)
+
+
+def stable_order(primary: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Argsort by primary key, breaking ties by dataset row position.
+
+    Because published datasets are immutable, the same result set and sort
+    always produce the same order, so an offset into it is a stable cursor.
+    """
+    return np.lexsort((rows, primary))
+
+
+def top_k_rows(values: np.ndarray, mask: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    """Rows of the k best values among masked rows, best first, in O(n).
+
+    Uses a partial selection (argpartition) instead of a full sort; only the
+    k selected rows are sorted. Rows with NaN values are skipped, and ties
+    are broken by row position as in stable_order, so results are
+    deterministic.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    candidates = np.flatnonzero(np.asarray(mask) & ~np.isnan(values))
+    key = -values[candidates] if largest else values[candidates]
+    if k <= 0:
+        return candidates[:0]
+    if k < len(candidates):
+        kth = key[np.argpartition(key, k - 1)[:k]].max()
+        better = key < kth
+        # Candidates are in row order, so the first ties are the lowest rows
+        ties = np.flatnonzero(key == kth)[:k - np.count_nonzero(better)]
+        chosen = np.concatenate([np.flatnonzero(better), ties])
+        candidates, key = candidates[chosen], key[chosen]
+    return candidates[stable_order(key, candidates)]
+
+
+def encode_cursor(result_id: str, sort: str, offset: int) -> str:
+    """Encode an opaque cursor for the next page of a result set."""
+    payload = json.dumps({'r': result_id, 's': sort, 'o': offset}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, int]:
+    """Decode a cursor into (result_id, sort, offset)."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        offset = int(payload['o'])
+        if offset < 0:
+            raise ValueError
+        return str(payload['r']), str(payload['s']), offset
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
@@ -0,0 +1,169 @@
+from typing import BinaryIO, Dict, List, Tuple
+import os
+import re
+
+_OBJECT_HEADER = re.compile(rb'\s*(\d+)\s+(\d+)\s+obj\b')
+_REFERENCE = re.compile(rb'\b(\d+)\s+(\d+)\s+R\b')
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+_TRAILER_REF = re.compile(rb'/(Root|Info)\s+(\d+)\s+\d+\s+R\b')
+_PAGES_REF = re.compile(rb'/Pages\s+(\d+)\s+\d+\s+R\b')
+_KIDS = re.compile(rb'/Kids\s*\[([^\]]*)\]')
+_PAGES_TYPE = re.compile(rb'/Type\s*/Pages\b')
+
+# Object numbers of the output's own catalog, page tree root and info dictionary
+CATALOG, PAGES, INFO = 1, 2, 3
+
+TAIL_BYTES = 2048
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(' + escaped.encode('latin-1', 'replace') + b')'
+
+
+def _read_xref(f: BinaryIO) -> Tuple[Dict[int, Tuple[int, int]], Dict[bytes, int]]:
+    """Byte span of every in-use object, and the trailer's Root/Info object numbers."""
+    f.seek(0, 2)
+    size = f.tell()
+    f.seek(max(0, size - TAIL_BYTES))
+    found = _STARTXREF.findall(f.read())
+    if not found:
+        raise ValueError('Not a PDF: no startxref')
+    xref_offset = int(found[-1])
+    f.seek(xref_offset)
+    if f.readline().strip() != b'xref':
+        raise ValueError('Only PDFs with a classic xref table can be concatenated')
+
+    offsets = {}
+    line = f.readline()
+    while line and not line.startswith(b'trailer'):
+        first, count = (int(v) for v in line.split())
+        for number in range(first, first + count):
+            entry = f.read(20)
+            if entry[17:18] == b'n':
+                offsets[number] = int(entry[:10])
+        line = f.readline()
+    trailer = f.read(size - f.tell())
+    refs = {name: int(number) for name, number in _TRAILER_REF.findall(trailer)}
+    if b'Root' not in refs:
+        raise ValueError('PDF trailer has no /Root')
+
+    starts = sorted(offsets.items(), key=lambda item: item[1])
+    ends = [offset for _, offset in starts[1:]] + [xref_offset]
+    return {number: (start, end) for (number, start), end in zip(starts, ends)}, refs
+
+
+def _read_object(f: BinaryIO, spans: Dict[int, Tuple[int, int]], number: int) -> bytes:
+    start, end = spans[number]
+    f.seek(start)
+    return f.read(end - start)
+
+
+def _dictionary(body: bytes) -> bytes:
+    """The part of an object before its stream data, if any."""
+    stream = body.find(b'stream')
+    return body if stream < 0 else body[:stream]
+
+
+class PdfConcatenator:
+    """Concatenate whole PDF files into one, streaming an object at a time.
+
+    The objects of each appended file are copied with renumbered
+    references. Its catalog, info dictionary and page tree nodes are not
+    copied: its pages are re-parented under the single page tree written
+    by close(). Stream data is copied byte for byte, and only one object
+    is in memory at a time (plus an offset per output object), so the
+    output can be much larger than memory.
+
+    Supports PDFs with a classic xref table whose page tree nodes carry no
+    inherited attributes, as reportlab writes them; raises ValueError for
+    anything else. An existing file at ``path`` is never overwritten.
+    """
+
+    def __init__(self, path: str, title: str = ''):
+        self.path = path
+        self.title = title
+        self._out = open(path, 'xb')
+        self._offsets: List[int] = [0, 0, 0]  # CATALOG, PAGES, INFO are written last
+        self._kids: List[int] = []
+        self._out.write(b'%PDF-1.4\n%\x93\x8c\x8b\x9e\n')
+
+    @property
+    def pages(self) -> int:
+        return len(self._kids)
+
+    def _write_object(self, number: int, body: bytes):
+        self._offsets[number - 1] = self._out.tell()
+        self._out.write(b'%d 0 obj\n' % number + body + b'\nendobj\n')
+
+    def append(self, path: str) -> int:
+        """Append every page of the PDF at ``path``; returns its page count."""
+        with open(path, 'rb') as f:
+            spans, refs = _read_xref(f)
+            catalog = _read_object(f, spans, refs[b'Root'])
+            pages_ref = _PAGES_REF.search(_dictionary(catalog))
+            if not pages_ref:
+                raise ValueError('PDF catalog has no /Pages')
+
+            # Walk the page tree in document order
+            nodes, pages = set(), []
+            pending = [int(pages_ref.group(1))]
+            while pending:
+                number = pending.pop()
+                body = _dictionary(_read_object(f, spans, number))
+                if _PAGES_TYPE.search(body):
+                    nodes.add(number)
+                    kids = _KIDS.search(body)
+                    children = [int(n) for n, _ in _REFERENCE.findall(kids.group(1))] if kids else []
+                    pending.extend(reversed(children))
+                else:
+                    pages.append(number)
+
+            renumbered = {refs[b'Root']: CATALOG, **{number: PAGES for number in nodes}}
+            if b'Info' in refs:
+                renumbered[refs[b'Info']] = INFO
+            copied = [number for number in sorted(spans, key=lambda n: spans[n][0]) if number not in renumbered]
+            first = len(self._offsets) + 1
+            renumbered.update({number: first + i for i, number in enumerate(copied)})
+
+            def reference(match):
+                if int(match.group(1)) not in renumbered:
+                    raise ValueError(f'PDF references missing object {match.group(1).decode()}')
+                return b'%d 0 R' % renumbered[int(match.group(1))]
+
+            for number in copied:
+                data = _read_object(f, spans, number)
+                header = _OBJECT_HEADER.match(data)
+                body = data[header.end():]
+                dictionary = _dictionary(body)
+                self._offsets.append(self._out.tell())
+                self._out.write(b'%d 0 obj' % renumbered[number])
+                self._out.write(_REFERENCE.sub(reference, dictionary))
+                self._out.write(body[len(dictionary):])
+                if not body.endswith(b'\n'):
+                    self._out.write(b'\n')
+        self._kids.extend(renumbered[number] for number in pages)
+        return len(pages)
+
+    def close(self):
+        """Write the catalog, page tree and cross-reference table."""
+        self._write_object(CATALOG, b'<< /Pages %d 0 R /Type /Catalog >>' % PAGES)
+        self._write_object(INFO, b'<< /Producer (pdfconcat) /Title ' + _pdf_string(self.title) + b' >>')
+        self._offsets[PAGES - 1] = self._out.tell()
+        self._out.write(b'%d 0 obj\n<< /Count %d /Type /Pages /Kids [' % (PAGES, len(self._kids)))
+        for start in range(0, len(self._kids), 1024):
+            self._out.write(b''.join(b' %d 0 R' % kid for kid in self._kids[start:start + 1024]))
+        self._out.write(b' ] >>\nendobj\n')
+
+        xref_offset = self._out.tell()
+        self._out.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(self._offsets) + 1))
+        for start in range(0, len(self._offsets), 1024):
+            self._out.write(b''.join(b'%010d 00000 n \n' % offset for offset in self._offsets[start:start + 1024]))
+        self._out.write(b'trailer\n<< /Info %d 0 R /Root %d 0 R /Size %d >>\nstartxref\n%d\n%%%%EOF\n'
+                        % (INFO, CATALOG, len(self._offsets) + 1, xref_offset))
+        self._out.close()
+
+    def abort(self):
+        """Close and delete a partially written output."""
+        self._out.close()
+        os.remove(self.path)
@@ -0,0 +1,232 @@
+import numpy as np
+from collections import OrderedDict
+from contextlib import contextmanager
+from flask import current_app
+from typing import Dict, List, Optional
+import json
+import os
+import threading
+import uuid
+
+# Cross-process lock on region files (POSIX); without it only threads are serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+REGIONS_FOLDER = 'regions'
+
+
+def _ring(coordinates) -> np.ndarray:
+    """Validate a GeoJSON linear ring and return it as an (n, 2) lng/lat array."""
+    ring = np.asarray(coordinates, dtype=np.float64)
+    if ring.ndim != 2 or ring.shape[1] < 2 or len(ring) < 3:
+        raise ValueError("Polygon rings need at least three [lng, lat] positions")
+    ring = ring[:, :2]
+    if not np.array_equal(ring[0], ring[-1]):
+        ring = np.vstack([ring, ring[:1]])
+    return ring
+
+
+def parse_geojson(geojson: Dict) -> List[List[np.ndarray]]:
+    """Return the polygons of a GeoJSON object as lists of rings (outer ring first).
+
+    Accepts a Polygon or MultiPolygon geometry, a Feature, or a
+    FeatureCollection of those.
+    """
+    if not isinstance(geojson, dict):
+        raise ValueError("GeoJSON must be an object")
+    kind = geojson.get('type')
+    if kind == 'FeatureCollection':
+        polygons = []
+        for feature in geojson.get('features') or []:
+            polygons.extend(parse_geojson(feature))
+        if not polygons:
+            raise ValueError("FeatureCollection contains no polygons")
+        return polygons
+    if kind == 'Feature':
+        return parse_geojson(geojson.get('geometry') or {})
+    try:
+        if kind == 'Polygon':
+            return [[_ring(ring) for ring in geojson['coordinates']]]
+        if kind == 'MultiPolygon':
+            return [[_ring(ring) for ring in polygon] for polygon in geojson['coordinates']]
+    except (KeyError, TypeError):
+        raise ValueError(f"Invalid {kind} coordinates")
+    raise ValueError(f"Unsupported GeoJSON type: {kind}")
+
+
+def points_in_ring(lng: np.ndarray, lat: np.ndarray, ring: np.ndarray) -> np.ndarray:
+    """Even-odd ray casting of many points against one closed ring.
+
+    Loops over the ring's edges and tests all points against each edge at
+    once, so the cost is one vector operation per vertex.
+    """
+    inside = np.zeros(len(lng), dtype=bool)
+    x1, y1 = ring[:-1, 0], ring[:-1, 1]
+    x2, y2 = ring[1:, 0], ring[1:, 1]
+    for ax, ay, bx, by in zip(x1, y1, x2, y2):
+        if ay == by:
+            continue
+        crosses = (ay > lat) != (by > lat)
+        x_at = ax + (lat - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (lng < x_at)
+    return inside
+
+
+class Region:
+    """A named area (parish boundary, neighborhood, zone) made of polygons."""
+
+    def __init__(self, region_id: str, name: str, geojson: Dict):
+        self.region_id = region_id
+        self.name = name
+        self.geojson = geojson
+        self.polygons = parse_geojson(geojson)
+        outer = np.vstack([polygon[0] for polygon in self.polygons])
+        # (min_lng, min_lat, max_lng, max_lat), as in GeoJSON bbox
+        self.bbox = (float(outer[:, 0].min()), float(outer[:, 1].min()),
+                     float(outer[:, 0].max()), float(outer[:, 1].max()))
+
+    def contains(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Membership mask of points; households without coordinates are outside."""
+        lat = np.asarray(lat, dtype=np.float64)
+        lng = np.asarray(lng, dtype=np.float64)
+        mask = np.zeros(len(lat), dtype=bool)
+
+        # Bounding-box prefilter: ray casting only runs on the candidates
+        min_lng, min_lat, max_lng, max_lat = self.bbox
+        with np.errstate(invalid='ignore'):
+            candidates = np.flatnonzero((lng >= min_lng) & (lng <= max_lng) &
+                                        (lat >= min_lat) & (lat <= max_lat))
+        if len(candidates) == 0:
+            return mask
+
+        c_lng, c_lat = lng[candidates], lat[candidates]
+        inside = np.zeros(len(candidates), dtype=bool)
+        for outer, *holes in self.polygons:
+            in_polygon = points_in_ring(c_lng, c_lat, outer)
+            for hole in holes:
+                in_polygon &= ~points_in_ring(c_lng, c_lat, hole)
+            inside |= in_polygon
+        mask[candidates] = inside
+        return mask
+
+    def to_dict(self) -> Dict:
+        return {'region_id': self.region_id, 'name': self.name, 'bbox': list(self.bbox)}
+
+
+class RegionStore:
+    """Regions stored per dataset, with cached membership masks.
+
+    Regions are saved as ``<UPLOAD_FOLDER>/regions/<version>.json`` for the
+    upload's base version, so they apply to every refinement of it and are
+    shared by all workers. Membership masks are kept in a bounded LRU keyed
+    by dataset version and region.
+    """
+
+    def __init__(self):
+        self._regions_folder = None
+        self._masks_kept = None
+        self._regions = {}
+        self._stamps = {}
+        self._masks = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def regions_folder(self):
+        if self._regions_folder is None:
+            with current_app.app_context():
+                self._regions_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], REGIONS_FOLDER)
+                self._masks_kept = max(1, current_app.config.get('REGION_MASKS_KEPT', 32))
+        return self._regions_folder
+
+    @staticmethod
+    def base_version(version: str) -> str:
+        """Strip the refinement suffix from a dataset version."""
+        return version.split('.', 1)[0]
+
+    def _file_for(self, version: str) -> str:
+        return os.path.join(self.regions_folder, f'{self.base_version(version)}.json')
+
+    def _load(self, version: str) -> Dict[str, Region]:
+        """Return the regions of a dataset, re-reading the file when it changed."""
+        base = self.base_version(version)
+        path = self._file_for(version)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._regions[base], self._stamps[base] = {}, None
+            return self._regions[base]
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if self._stamps.get(base) != stamp:
+            with open(path, 'r') as f:
+                stored = json.load(f)
+            self._regions[base] = {
+                region_id: Region(region_id, entry['name'], entry['geojson'])
+                for region_id, entry in stored.items()
+            }
+            self._stamps[base] = stamp
+        return self._regions[base]
+
+    @contextmanager
+    def _locked(self, version: str):
+        """Hold an exclusive lock on a dataset's region file, across threads and workers."""
+        os.makedirs(self.regions_folder, exist_ok=True)
+        with self._lock, open(f'{self._file_for(version)}.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            yield
+
+    def _save(self, version: str, regions: Dict[str, Region]):
+        path = self._file_for(version)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({r.region_id: {'name': r.name, 'geojson': r.geojson} for r in regions.values()}, f)
+        os.replace(tmp_path, path)
+
+    def list(self, version: str) -> List[Region]:
+        return list(self._load(version).values())
+
+    def get(self, version: str, region_id: str) -> Optional[Region]:
+        return self._load(version).get(region_id)
+
+    def add(self, version: str, name: str, geojson: Dict) -> Region:
+        """Validate and store a region for a dataset.
+
+        The read-modify-write of the region file holds its lock, so regions
+        saved at the same time in different workers are all kept.
+        """
+        with self._locked(version):
+            regions = dict(self._load(version))
+            region = Region(uuid.uuid4().hex[:12], name or 'Region', geojson)
+            regions[region.region_id] = region
+            self._save(version, regions)
+        return region
+
+    def remove(self, version: str, region_id: str) -> bool:
+        with self._locked(version):
+            regions = dict(self._load(version))
+            if regions.pop(region_id, None) is None:
+                return False
+            self._save(version, regions)
+        return True
+
+    def mask(self, dataset, region_id: str) -> np.ndarray:
+        """Return the (cached, read-only) membership mask of a region over a dataset."""
+        region = self.get(dataset.version, region_id)
+        if region is None:
+            raise ValueError(f"Unknown region: {region_id}")
+        key = (dataset.version, region_id)
+        with self._lock:
+            mask = self._masks.get(key)
+            if mask is not None:
+                self._masks.move_to_end(key)
+                return mask
+
+        mask = region.contains(dataset['latitude'], dataset['longitude'])
+        mask.setflags(write=False)
+        with self._lock:
+            self._masks[key] = mask
+            while len(self._masks) > self._masks_kept:
+                self._masks.popitem(last=False)
+        return mask
@@ -5,8 +5,19 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from typing import Dict, List, Optional
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from app.services.aggregation import grouped_stats, stats_by_label
+from app.services.dataset import DatasetStore
+from app.services.letters import DEFAULT_LETTER_TEMPLATE, render_letters, template_fields
+from app.services.pdfconcat import PdfConcatenator
+import numpy as np
 import pandas as pd
+import csv
+import multiprocessing
 import os
+import time
+import uuid
 from datetime import datetime
 
 class ReportingService:
@@ -14,6 +25,7 @@ class ReportingService:
         self._report_folder = None
         self._upload_folder = None
         self._df = None
+        self.datasets = DatasetStore()
         self.styles = getSampleStyleSheet()
     
     @property
@@ -112,21 +124,16 @@ class ReportingService:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
             report_file = os.path.join(self.report_folder, f'analysis_report_{timestamp}.csv')
             
-            # Prepare data for CSV
-            rows = []
-            for direction, points in analysis_data['points'].items():
-                for point in points:
-                    rows.append({
-                        'Direction': direction.capitalize(),
-                        'Address': point['address'],
-                        'Latitude': point['latitude'],
-                        'Longitude': point['longitude'],
-                        'Contribution': point['contribution']
-                    })
-            
-            # Create DataFrame and save to CSV
-            df = pd.DataFrame(rows)
-            df.to_csv(report_file, index=False)
+            # Write rows as they are read instead of collecting them first
+            with open(report_file, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['Direction', 'Address', 'Latitude', 'Longitude', 'Contribution'])
+                for direction, points in analysis_data['points'].items():
+                    writer.writerows(
+                        (direction.capitalize(), point['address'], point['latitude'],
+                         point['longitude'], point['contribution'])
+                        for point in points
+                    )
             
             return report_file
             
@@ -135,15 +142,24 @@ class ReportingService:
             return None
     
     def generate_report(self, analysis_id: str, format: str = 'pdf',
-                       include_sections: List[str] = None) -> str:
-        """Generate a PDF report of the analysis results."""
+                       include_sections: List[str] = None, results: Optional[Dict] = None) -> str:
+        """Generate a PDF report of the analysis results.
+
+        ``results`` is the stored analysis (AnalysisService.get_analysis_results)
+        whose rows and directions feed the directional sections; without it
+        those sections cover no households.
+        """
         try:
+            include_sections = include_sections or ['statistics', 'directional_analysis']
+            
             # Load analysis results
-            results_file = os.path.join(self.upload_folder, f'processed_{analysis_id}.csv')
-            if not os.path.exists(results_file):
+            dataset = self.datasets.open_file(f'processed_{analysis_id}.csv')
+            if dataset is None:
                 raise FileNotFoundError("Analysis results not found")
             
-            df = pd.read_csv(results_file)
+            contributions = dataset['contribution_amount']
+            rows = results['rows'] if results else np.array([], dtype=np.int64)
+            row_directions = results['directions'] if results else np.array([], dtype=str)
             
             # Create report filename
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
@@ -181,14 +197,15 @@ class ReportingService:
                 elements.append(Paragraph("Summary Statistics", heading_style))
                 elements.append(Spacer(1, 12))
                 
+                overall = grouped_stats(np.zeros(len(dataset), dtype=np.int64), contributions, 1)
                 stats_data = [
-                    ['Total Records', str(len(df))],
-                    ['Valid Addresses', str(df['address'].notna().sum())],
-                    ['Valid Contributions', str(df['contribution_amount'].notna().sum())],
-                    ['Average Contribution', f"${df['contribution_amount'].mean():.2f}"],
-                    ['Median Contribution', f"${df['contribution_amount'].median():.2f}"],
-                    ['Min Contribution', f"${df['contribution_amount'].min():.2f}"],
-                    ['Max Contribution', f"${df['contribution_amount'].max():.2f}"]
+                    ['Total Records', str(len(dataset))],
+                    ['Valid Addresses', str(int(np.count_nonzero(np.asarray(dataset['address']) != '')))],
+                    ['Valid Contributions', str(int(overall['valued'][0]))],
+                    ['Average Contribution', f"${overall['mean'][0]:.2f}"],
+                    ['Median Contribution', f"${overall['quantiles'][0.5][0]:.2f}"],
+                    ['Min Contribution', f"${overall['min'][0]:.2f}"],
+                    ['Max Contribution', f"${overall['max'][0]:.2f}"]
                 ]
                 
                 stats_table = Table(stats_data, colWidths=[2*inch, 2*inch])
@@ -214,15 +231,11 @@ class ReportingService:
                 elements.append(Paragraph("Directional Analysis", heading_style))
                 elements.append(Spacer(1, 12))
                 
-                direction_stats = df.groupby('direction')['contribution_amount'].agg([
-                    'count',
-                    'mean',
-                    'median',
-                    'sum'
-                ]).round(2)
+                labels, groups = np.unique(row_directions, return_inverse=True)
+                direction_stats = grouped_stats(groups, contributions[rows], len(labels))
                 
                 direction_data = [['Direction', 'Count', 'Average', 'Median', 'Total']]
-                for direction, stats in direction_stats.iterrows():
+                for direction, stats in stats_by_label(direction_stats, labels.tolist()).items():
                     direction_data.append([
                         direction.capitalize(),
                         str(stats['count']),
@@ -256,11 +269,13 @@ class ReportingService:
                 
                 # Prepare data for table
                 table_data = [['Address', 'Direction', 'Contribution']]
-                for _, row in df.iterrows():
+                for address, direction, contribution in zip(
+                    dataset['address'][rows], row_directions, contributions[rows]
+                ):
                     table_data.append([
-                        row['address'],
-                        row['direction'].capitalize(),
-                        f"${row['contribution_amount']:.2f}"
+                        str(address),
+                        str(direction).capitalize(),
+                        f"${contribution:.2f}"
                     ])
                 
                 # Create table with alternating row colors
@@ -289,16 +304,101 @@ class ReportingService:
         except Exception as e:
             raise Exception(f"Report generation error: {str(e)}")
     
-    def generate_summary_report(self, analysis_id: str) -> str:
+    def generate_summary_report(self, analysis_id: str, results: Optional[Dict] = None) -> str:
         """Generate a concise summary report."""
         return self.generate_report(
             analysis_id,
-            include_sections=['statistics', 'directional_analysis']
+            include_sections=['statistics', 'directional_analysis'],
+            results=results
         )
     
-    def generate_detailed_report(self, analysis_id: str) -> str:
+    def generate_detailed_report(self, analysis_id: str, results: Optional[Dict] = None) -> str:
         """Generate a detailed report with all sections."""
         return self.generate_report(
             analysis_id,
-            include_sections=['statistics', 'directional_analysis', 'data_table']
-        ) 
\ No newline at end of file
+            include_sections=['statistics', 'directional_analysis', 'data_table'],
+            results=results
+        )
+    
+    def generate_letters(self, result_id: str, results: Dict, template: Optional[str] = None) -> Dict:
+        """Render a mail-merge letter for every household an analysis selected, as one PDF.
+        
+        Households are split into shards of LETTERS_SHARD_SIZE; each shard is
+        rendered to its own PDF by a pool of LETTERS_WORKERS processes
+        (default: one per CPU) and appended to the output as soon as it and
+        the shards before it are done. At most two shards per worker are in
+        flight, so memory stays bounded whatever the number of letters.
+        Raises ValueError for an empty selection or an invalid template.
+        """
+        template = template or DEFAULT_LETTER_TEMPLATE
+        template_fields(template)
+        
+        dataset = self.datasets.open_revision(results['version'])
+        if dataset is None:
+            raise FileNotFoundError("Processed data not found")
+        rows = np.asarray(results['rows'], dtype=np.int64)
+        if len(rows) == 0:
+            raise ValueError("No households selected")
+        
+        with current_app.app_context():
+            shard_size = max(1, current_app.config.get('LETTERS_SHARD_SIZE', 500))
+            workers = current_app.config.get('LETTERS_WORKERS') or os.cpu_count() or 1
+        shards = [rows[start:start + shard_size] for start in range(0, len(rows), shard_size)]
+        workers = min(workers, len(shards))
+        
+        # The same selection may be requested twice within a second
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_file = os.path.join(self.report_folder, f'letters_{result_id}_{timestamp}_{uuid.uuid4().hex[:8]}.pdf')
+        shard_paths = [f'{report_file}.{i:05d}.part' for i in range(len(shards))]
+        today = datetime.now()
+        date = f"{today:%B} {today.day}, {today.year}"
+        
+        def task(i):
+            # Household details are looked up per shard, just before it is submitted
+            shard = shards[i]
+            return (dataset.family_info(shard), np.asarray(dataset['address'][shard]).tolist(),
+                    template, shard_paths[i], date)
+        
+        start = time.perf_counter()
+        output = PdfConcatenator(report_file, title=f'Letters {result_id}')
+        truncated = 0
+        try:
+            if workers > 1:
+                context = multiprocessing.get_context('spawn')
+                with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                    pending = deque()
+                    for i in range(len(shards)):
+                        pending.append((i, pool.submit(render_letters, *task(i))))
+                        while len(pending) >= 2 * workers or (pending and i == len(shards) - 1):
+                            done, future = pending.popleft()
+                            truncated += future.result()['truncated']
+                            output.append(shard_paths[done])
+                            os.remove(shard_paths[done])
+            else:
+                for i in range(len(shards)):
+                    truncated += render_letters(*task(i))['truncated']
+                    output.append(shard_paths[i])
+                    os.remove(shard_paths[i])
+            output.close()
+        except Exception:
+            output.abort()
+            raise
+        finally:
+            for shard_path in shard_paths:
+                if os.path.exists(shard_path):
+                    os.remove(shard_path)
+        
+        seconds = time.perf_counter() - start
+        pages_per_second = output.pages / seconds if seconds > 0 else 0.0
+        current_app.logger.info(f"Rendered {output.pages} letters in {seconds:.1f}s "
+                                f"({pages_per_second:.0f} pages/s, {len(shards)} shards, {workers} workers)")
+        return {
+            'report_file': f'/reports/{os.path.basename(report_file)}',
+            'letters': len(rows),
+            'pages': output.pages,
+            'truncated': truncated,
+            'shards': len(shards),
+            'workers': workers,
+            'seconds': round(seconds, 3),
+            'pages_per_second': round(pages_per_second, 1)
+        }
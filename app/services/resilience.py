@@ -0,0 +1,127 @@
+from typing import Callable, Iterator, Optional, Tuple, Type
+import random
+import threading
+import time
+
+
+class ProviderUnavailableError(Exception):
+    """Raised when a provider call fails after all retries or the circuit is open."""
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """Raised instead of calling a provider while its circuit breaker is open."""
+
+
+class RetryPolicy:
+    """Bounded retries with jittered exponential backoff.
+
+    The delay before retry ``n`` (starting at 0) is drawn uniformly from
+    ``[0, min(max_delay, base_delay * 2 ** n)]`` ("full jitter"), so that
+    many clients retrying at once do not hammer the provider in lockstep.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8.0,
+                 sleep: Callable[[float], None] = time.sleep,
+                 jitter: Callable[[], float] = random.random):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._jitter = jitter
+
+    def delays(self) -> Iterator[float]:
+        """Yield the wait before each retry."""
+        for attempt in range(self.max_attempts - 1):
+            yield self._jitter() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
+    def call(self, func: Callable, *args, retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+             breaker: Optional['CircuitBreaker'] = None, **kwargs):
+        """Call func, retrying on the given exceptions.
+
+        Raises ProviderUnavailableError once attempts are exhausted, or
+        CircuitOpenError if the breaker is (or becomes) open. Other errors
+        are raised unchanged, without retrying, but still count as a
+        failure for the breaker, so a half-open trial always finishes.
+        """
+        delays = self.delays()
+        while True:
+            if breaker is not None and not breaker.allow_request():
+                raise CircuitOpenError('Circuit open; provider calls are suspended')
+            try:
+                result = func(*args, **kwargs)
+            except retry_on as e:
+                if breaker is not None:
+                    breaker.record_failure()
+                delay = next(delays, None)
+                if delay is None:
+                    raise ProviderUnavailableError(f'Gave up after {self.max_attempts} attempts: {e}') from e
+                self._sleep(delay)
+                continue
+            except BaseException:
+                # Not retried, but it still ends this attempt and any half-open trial
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+
+class CircuitBreaker:
+    """Fail fast while a provider is down.
+
+    After ``failure_threshold`` consecutive failures the circuit opens and
+    calls are refused for ``reset_timeout`` seconds. Then a single trial
+    call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return self.CLOSED
+        if self._clock() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        """Return whether a call may go to the provider now."""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._trial_in_flight = False
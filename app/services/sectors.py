@@ -0,0 +1,272 @@
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+from app.services.aggregation import grouped_stats
+from app.services.geometry import haversine_km
+import threading
+
+# Sector names for uniform schemes, clockwise from north
+COMPASS_POINTS = {
+    4: ['north', 'east', 'south', 'west'],
+    8: ['north', 'northeast', 'east', 'southeast',
+        'south', 'southwest', 'west', 'northwest'],
+    16: ['north', 'north-northeast', 'northeast', 'east-northeast',
+         'east', 'east-southeast', 'southeast', 'south-southeast',
+         'south', 'south-southwest', 'southwest', 'west-southwest',
+         'west', 'west-northwest', 'northwest', 'north-northwest'],
+}
+
+CELL_STATISTICS = ('count', 'sum', 'mean', 'median')
+
+
+def initial_bearing(lat1, lng1, lat2, lng2):
+    """Initial great-circle bearing in degrees [0, 360); broadcasts over numpy arrays."""
+    lat1, lng1, lat2, lng2 = (np.radians(v) for v in (lat1, lng1, lat2, lng2))
+    dlng = lng2 - lng1
+    y = np.sin(dlng) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlng)
+    return np.degrees(np.arctan2(y, x)) % 360
+
+
+class SectorScheme:
+    """A partition of the compass into named sectors.
+
+    Sectors are contiguous and cover the full circle; each is given by the
+    bearing at which it starts (clockwise). Classification is one
+    ``np.digitize`` over the sector start angles.
+    """
+
+    def __init__(self, names: Sequence[str], starts: Sequence[float]):
+        if len(names) != len(starts) or not names:
+            raise ValueError("Each sector needs exactly one start angle")
+        self.names = list(names)
+        starts = np.asarray(starts, dtype=np.float64) % 360
+        # Sector positions in clockwise order of their start angle
+        self._order = np.argsort(starts, kind='stable')
+        self._origin = starts[self._order[0]]
+        # Start angles relative to the first of them, strictly increasing
+        self._edges = starts[self._order] - self._origin
+        if len(np.unique(self._edges)) != len(self._edges):
+            raise ValueError("Sectors must start at distinct angles")
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @classmethod
+    def uniform(cls, count: int) -> 'SectorScheme':
+        """Equal sectors, the first centred on north."""
+        if count not in COMPASS_POINTS:
+            raise ValueError(f"Unsupported sector count: {count} (use 4, 8 or 16)")
+        width = 360.0 / count
+        return cls(COMPASS_POINTS[count], [(i * width - width / 2) % 360 for i in range(count)])
+
+    @classmethod
+    def from_angles(cls, angles: Dict[str, Tuple[float, float]]) -> 'SectorScheme':
+        """Build a scheme from ``{name: (start, end)}`` bearings, e.g. DIRECTION_ANGLES."""
+        names = list(angles)
+        starts = [float(angles[name][0]) % 360 for name in names]
+        ends = sorted(float(angles[name][1]) % 360 for name in names)
+        if sorted(starts) != ends:
+            raise ValueError("Sector angles must cover the compass without gaps or overlaps")
+        return cls(names, starts)
+
+    def classify(self, bearings: np.ndarray) -> np.ndarray:
+        """Return the sector index of each bearing."""
+        relative = (np.asarray(bearings, dtype=np.float64) - self._origin) % 360
+        return self._order[np.digitize(relative, self._edges[1:])]
+
+    def index(self, name: str) -> int:
+        return self.names.index(name)
+
+    @property
+    def key(self) -> Tuple:
+        """Hashable identity of the scheme, for memoizing classifications."""
+        return (tuple(self.names), float(self._origin), tuple(self._edges.tolist()))
+
+
+CARDINAL_SECTORS = SectorScheme.uniform(4)
+
+
+def sector_scheme(spec: Union[int, Dict, None] = None) -> SectorScheme:
+    """Build a scheme from a sector count or a DIRECTION_ANGLES-style map."""
+    if spec is None:
+        return CARDINAL_SECTORS
+    if isinstance(spec, dict):
+        return SectorScheme.from_angles(spec)
+    return SectorScheme.uniform(int(spec))
+
+
+def ring_labels(edges: Sequence[float]) -> List[str]:
+    """Label distance rings, e.g. [1, 5] -> ['0-1 km', '1-5 km', '5+ km']."""
+    bounds = [0] + [float(e) for e in edges]
+    labels = [f'{lo:g}-{hi:g} km' for lo, hi in zip(bounds[:-1], bounds[1:])]
+    return labels + [f'{bounds[-1]:g}+ km']
+
+
+def polar_coordinates(lat: np.ndarray, lng: np.ndarray, reference_point: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Bearing and distance of every household from a reference point."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    return {
+        'bearing': initial_bearing(reference_point['lat'], reference_point['lng'], lat, lng),
+        'distance_km': haversine_km(reference_point['lat'], reference_point['lng'], lat, lng),
+        'located': ~(np.isnan(lat) | np.isnan(lng))
+    }
+
+
+class PolarCache:
+    """Bounded LRU of polar coordinates per (dataset version, reference point).
+
+    Users tend to pick a reference point and then toggle directions, rings
+    and thresholds; with the bearings and distances cached (and classify()
+    memoizing sector and ring indices alongside them), each toggle is only
+    a mask over precomputed arrays. Cached arrays are read-only and shared
+    between requests.
+    """
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max(1, max_entries)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def key_for(dataset, reference_point: Dict[str, float]) -> Tuple:
+        # Rounded to ~1 cm so float noise from clients does not miss the cache
+        return (dataset.version, round(float(reference_point['lat']), 7), round(float(reference_point['lng']), 7))
+
+    def get(self, dataset, reference_point: Dict[str, float]) -> Dict[str, np.ndarray]:
+        """Return cached polar coordinates, computing them on a miss."""
+        key = self.key_for(dataset, reference_point)
+        with self._lock:
+            polar = self._entries.get(key)
+            if polar is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return polar
+            self.misses += 1
+
+        polar = polar_coordinates(dataset['latitude'], dataset['longitude'], reference_point)
+        for values in polar.values():
+            values.setflags(write=False)
+
+        with self._lock:
+            self._entries[key] = polar
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return polar
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def classify(lat: np.ndarray, lng: np.ndarray, reference_point: Dict[str, float],
+             scheme: SectorScheme, ring_edges: Optional[Sequence[float]] = None,
+             polar: Optional[Dict[str, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+    """Compute bearing, distance, sector and ring for every household in one pass.
+
+    Pass ``polar`` (from polar_coordinates or PolarCache) to reuse bearings
+    and distances already computed for this reference point; the sector and
+    ring indices are then memoized in it as well, so re-filtering with the
+    same scheme and rings is only masking. Households without coordinates
+    get sector and ring -1.
+    """
+    if polar is None:
+        polar = polar_coordinates(lat, lng, reference_point)
+    bearing, distance, located = polar['bearing'], polar['distance_km'], polar['located']
+
+    sector_key = ('sector', scheme.key)
+    sector = polar.get(sector_key)
+    if sector is None:
+        sector = np.where(located, scheme.classify(np.nan_to_num(bearing)), -1).astype(np.int16)
+        sector.setflags(write=False)
+        polar[sector_key] = sector
+
+    ring_key = ('ring', tuple(ring_edges or ()))
+    ring = polar.get(ring_key)
+    if ring is None:
+        if ring_edges:
+            ring = np.digitize(np.nan_to_num(distance), np.asarray(ring_edges, dtype=np.float64))
+        else:
+            ring = np.zeros(len(located), dtype=np.int16)
+        ring = np.where(located, ring, -1).astype(np.int16)
+        ring.setflags(write=False)
+        polar[ring_key] = ring
+
+    return {'bearing': bearing, 'distance_km': distance, 'sector': sector, 'ring': ring, 'located': located}
+
+
+def aggregate_cells(cells: np.ndarray, values: np.ndarray, cell_count: int,
+                    value_order: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """Count, sum, mean and median of values per cell index (see grouped_stats).
+
+    Rows with a negative cell are ignored; NaN values are counted as
+    households but left out of the amount statistics.
+    """
+    stats = grouped_stats(cells, values, cell_count, value_order=value_order)
+    return {'count': stats['count'], 'sum': stats['sum'], 'mean': stats['mean'],
+            'median': stats['quantiles'][0.5]}
+
+
+def sector_matrix(lat: np.ndarray, lng: np.ndarray, contributions: np.ndarray,
+                  reference_point: Dict[str, float], scheme: SectorScheme,
+                  ring_edges: Optional[Sequence[float]] = None,
+                  mask: Optional[np.ndarray] = None,
+                  polar: Optional[Dict[str, np.ndarray]] = None) -> Dict:
+    """Aggregate contributions over a sector x ring matrix around a reference point."""
+    placed = classify(lat, lng, reference_point, scheme, ring_edges, polar)
+    ring_count = len(ring_edges) + 1 if ring_edges else 1
+    cells = np.where(placed['sector'] >= 0, placed['sector'] * ring_count + placed['ring'], -1)
+    if mask is not None:
+        cells = np.where(mask, cells, -1)
+
+    stats = aggregate_cells(cells, contributions, len(scheme) * ring_count)
+    matrix = {name: stats[name].reshape(len(scheme), ring_count).tolist() for name in CELL_STATISTICS}
+    return {
+        'sectors': scheme.names,
+        'rings': ring_labels(ring_edges) if ring_edges else ['all'],
+        **matrix
+    }
+
+
+def site_sectors(lat: np.ndarray, lng: np.ndarray, sites: List[Dict[str, float]],
+                 scheme: SectorScheme, ring_edges: Optional[Sequence[float]] = None,
+                 chunk_size: int = 65536) -> Dict[str, np.ndarray]:
+    """Classify every household against many reference points at once.
+
+    The site x household bearing and distance matrices are computed in
+    blocks of ``chunk_size`` households, so float temporaries stay bounded
+    at a few site x chunk arrays; only the compact sector and ring indices
+    (site x household) are kept. Also returns, per household, the index of
+    the nearest site (-1 without coordinates).
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    site_lat = np.array([[float(site['lat'])] for site in sites])
+    site_lng = np.array([[float(site['lng'])] for site in sites])
+    edges = np.asarray(ring_edges or [], dtype=np.float64)
+
+    sector = np.full((len(sites), len(lat)), -1, dtype=np.int16)
+    ring = np.full((len(sites), len(lat)), -1, dtype=np.int16)
+    nearest = np.full(len(lat), -1, dtype=np.int32)
+
+    for start in range(0, len(lat), max(1, chunk_size)):
+        stop = min(start + chunk_size, len(lat))
+        located = ~(np.isnan(lat[start:stop]) | np.isnan(lng[start:stop]))
+        block_lat = np.nan_to_num(lat[start:stop])[np.newaxis, :]
+        block_lng = np.nan_to_num(lng[start:stop])[np.newaxis, :]
+
+        bearing = initial_bearing(site_lat, site_lng, block_lat, block_lng)
+        distance = haversine_km(site_lat, site_lng, block_lat, block_lng)
+        sector[:, start:stop] = np.where(located, scheme.classify(bearing), -1)
+        ring[:, start:stop] = np.where(located, np.digitize(distance, edges), -1)
+        nearest[start:stop] = np.where(located, np.argmin(distance, axis=0), -1)
+
+    return {'sector': sector, 'ring': ring, 'nearest': nearest}
+
@@ -0,0 +1,219 @@
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.services.dataset import Dataset, DatasetStore, KeyIndex
+from app.services.pagination import top_k_rows
+import os
+import re
+
+_SNAPSHOT_ID = re.compile(r'^[\w.-]+$')
+
+# Household status in a comparison
+STATUS_RETAINED = 'retained'
+STATUS_NEW = 'new'
+STATUS_LAPSED = 'lapsed'
+
+
+class SnapshotCatalog:
+    """Catalog of processed uploads (``processed_<id>.csv``), oldest first.
+
+    A snapshot is opened through the dataset store, so comparing two
+    uploads maps their published columns instead of re-reading the CSVs.
+    """
+
+    def __init__(self, datasets: DatasetStore):
+        self.datasets = datasets
+
+    @staticmethod
+    def _created(snapshot_id: str) -> Optional[str]:
+        try:
+            return datetime.strptime(snapshot_id[:15], '%Y%m%d_%H%M%S').isoformat()
+        except ValueError:
+            return None
+
+    def list(self) -> List[Dict]:
+        folder = self.datasets.upload_folder
+        if not os.path.isdir(folder):
+            return []
+        snapshots = []
+        for name in sorted(os.listdir(folder)):
+            if not (name.startswith('processed_') and name.endswith('.csv')):
+                continue
+            snapshot_id = self.datasets.version_for(name)
+            latest = self.datasets.latest_revision(snapshot_id)
+            dataset = self.datasets.open(latest) if latest else None
+            snapshots.append({
+                'snapshot_id': snapshot_id,
+                'created': self._created(snapshot_id),
+                'size_bytes': os.path.getsize(os.path.join(folder, name)),
+                'published_version': latest,
+                'households': len(dataset) if dataset is not None else None
+            })
+        return snapshots
+
+    def open(self, snapshot_id: str) -> Optional[Dataset]:
+        """Open a snapshot's newest published revision, publishing it if needed."""
+        if not snapshot_id or not _SNAPSHOT_ID.match(snapshot_id):
+            return None
+        return self.datasets.open_file(f'processed_{snapshot_id}.csv')
+
+
+def _amounts(dataset: Dataset, rows: np.ndarray) -> np.ndarray:
+    """Contribution amounts at rows, with missing amounts (and rows -1) as zero."""
+    amounts = np.nan_to_num(np.asarray(dataset['contribution_amount'], dtype=np.float64))
+    return np.where(rows >= 0, amounts[np.maximum(rows, 0)], 0.0)
+
+
+def _transitions(before: np.ndarray, after: np.ndarray, top: int) -> Dict:
+    """Count households per (before, after) label pair where the labels differ."""
+    moved = (before != after) & (before != '') & (after != '')
+    labels, codes = np.unique(np.concatenate([before[moved], after[moved]]), return_inverse=True)
+    from_codes, to_codes = np.split(codes.astype(np.int64), 2)
+    pairs, counts = np.unique(from_codes * len(labels) + to_codes, return_counts=True)
+    order = np.argsort(-counts, kind='stable')[:top]
+    return {
+        'households': int(np.count_nonzero(moved)),
+        'top': [{'from': str(labels[pairs[i] // len(labels)]), 'to': str(labels[pairs[i] % len(labels)]),
+                 'households': int(counts[i])} for i in order]
+    }
+
+
+class SnapshotComparison:
+    """Household-level join of two snapshots on their key index.
+
+    Every household of either snapshot appears once, in ``before_rows`` /
+    ``after_rows`` (-1 where the household is absent from that snapshot):
+    retained households first, then new ones, then lapsed ones. All
+    changes are computed on these aligned arrays. Households without a key
+    (no record ID or address) cannot be matched and are left out.
+    """
+
+    def __init__(self, before: Dataset, after: Dataset,
+                 before_sectors: Optional[np.ndarray] = None, after_sectors: Optional[np.ndarray] = None,
+                 sector_names: Optional[List[str]] = None):
+        self.before = before
+        self.after = after
+        before_index, after_index = before.key_index, after.key_index
+        if before_index.key_column != after_index.key_column:
+            # Only one snapshot has record IDs: fall back to canonical addresses for both
+            before_index, after_index = KeyIndex.build(before, 'address_key'), KeyIndex.build(after, 'address_key')
+        self.key_column = after_index.key_column
+
+        # Join after -> before on the key; keys only in before have lapsed
+        matched_before = before_index.lookup(after_index.keys)
+        in_after = after_index.lookup(before_index.keys)
+        retained = matched_before >= 0
+        new_rows = after_index.rows[~retained]
+        lapsed_rows = before_index.rows[in_after < 0]
+
+        self.before_rows = np.concatenate([matched_before[retained], np.full(len(new_rows), -1), lapsed_rows])
+        self.after_rows = np.concatenate([after_index.rows[retained], new_rows, np.full(len(lapsed_rows), -1)])
+        self.status = np.repeat(np.array([STATUS_RETAINED, STATUS_NEW, STATUS_LAPSED]),
+                                [int(np.count_nonzero(retained)), len(new_rows), len(lapsed_rows)])
+
+        self.before_amount = _amounts(before, self.before_rows)
+        self.after_amount = _amounts(after, self.after_rows)
+        self.change = self.after_amount - self.before_amount
+
+        self.before_sectors = before_sectors
+        self.after_sectors = after_sectors
+        self.sector_names = sector_names
+
+    def __len__(self) -> int:
+        return len(self.status)
+
+    def _text(self, dataset: Dataset, name: str, rows: np.ndarray) -> np.ndarray:
+        if name not in dataset:
+            return np.full(len(rows), '', dtype=str)
+        values = np.asarray(dataset[name], dtype=str)
+        return np.where(rows >= 0, values[np.maximum(rows, 0)], '')
+
+    def _directions(self, sectors: Optional[np.ndarray], rows: np.ndarray) -> Optional[np.ndarray]:
+        if sectors is None:
+            return None
+        names = np.array(list(self.sector_names) + [''])
+        placed = np.where(rows >= 0, sectors[np.maximum(rows, 0)], -1)
+        return names[np.where(placed >= 0, placed, len(self.sector_names))]
+
+    def summary(self, top: int = 20) -> Dict:
+        """Aggregate changes: totals, new and lapsed giving, and moves between ZIPs and directions."""
+        retained = self.status == STATUS_RETAINED
+        new = self.status == STATUS_NEW
+        lapsed = self.status == STATUS_LAPSED
+        change = self.change[retained]
+
+        before_zip = self._text(self.before, 'postal_code', self.before_rows)
+        after_zip = self._text(self.after, 'postal_code', self.after_rows)
+
+        # Giving per ZIP: households count towards the ZIP they were in at each snapshot
+        in_before, in_after = self.before_rows >= 0, self.after_rows >= 0
+        zips, codes = np.unique(np.concatenate([before_zip[in_before], after_zip[in_after]]), return_inverse=True)
+        before_codes, after_codes = codes[:np.count_nonzero(in_before)], codes[np.count_nonzero(in_before):]
+        before_by_zip = np.bincount(before_codes, weights=self.before_amount[in_before], minlength=len(zips))
+        after_by_zip = np.bincount(after_codes, weights=self.after_amount[in_after], minlength=len(zips))
+        by_zip = [
+            {'postal_code': zip_code or 'unknown', 'before': float(b), 'after': float(a), 'change': float(a - b)}
+            for zip_code, b, a in zip(zips.tolist(), before_by_zip.tolist(), after_by_zip.tolist())
+        ]
+        by_zip.sort(key=lambda row: row['change'])
+
+        summary = {
+            'key': self.key_column,
+            'before': {'snapshot_id': self.before.version, 'households': len(self.before),
+                       'total': float(self.before_amount.sum())},
+            'after': {'snapshot_id': self.after.version, 'households': len(self.after),
+                      'total': float(self.after_amount.sum())},
+            'total_change': float(self.change.sum()),
+            'retained': {
+                'households': int(np.count_nonzero(retained)),
+                'before_total': float(self.before_amount[retained].sum()),
+                'after_total': float(self.after_amount[retained].sum()),
+                'increased': int(np.count_nonzero(change > 0)),
+                'decreased': int(np.count_nonzero(change < 0)),
+                'unchanged': int(np.count_nonzero(change == 0)),
+                'stopped_giving': int(np.count_nonzero((self.before_amount > 0) & (self.after_amount <= 0) & retained)),
+                'started_giving': int(np.count_nonzero((self.before_amount <= 0) & (self.after_amount > 0) & retained))
+            },
+            'new': {'households': int(np.count_nonzero(new)), 'total': float(self.after_amount[new].sum())},
+            'lapsed': {'households': int(np.count_nonzero(lapsed)), 'total': float(self.before_amount[lapsed].sum())},
+            'zip_moves': _transitions(before_zip[retained], after_zip[retained], top),
+            'by_zip': by_zip,
+            'direction_moves': None
+        }
+        before_direction = self._directions(self.before_sectors, self.before_rows)
+        after_direction = self._directions(self.after_sectors, self.after_rows)
+        if before_direction is not None and after_direction is not None:
+            summary['direction_moves'] = _transitions(before_direction[retained], after_direction[retained], top)
+        return summary
+
+    def households(self, limit: int = 50, status: Optional[str] = None) -> List[Dict]:
+        """Per-household changes, largest absolute change first (optionally one status only)."""
+        mask = np.ones(len(self), dtype=bool) if status is None else self.status == status
+        order = top_k_rows(np.abs(self.change), mask, limit)
+
+        before_key = self._text(self.before, self.key_column, self.before_rows[order])
+        after_key = self._text(self.after, self.key_column, self.after_rows[order])
+        before_name = self._text(self.before, 'display_name', self.before_rows[order])
+        after_name = self._text(self.after, 'display_name', self.after_rows[order])
+        before_zip = self._text(self.before, 'postal_code', self.before_rows[order])
+        after_zip = self._text(self.after, 'postal_code', self.after_rows[order])
+        before_direction = self._directions(self.before_sectors, self.before_rows[order])
+        after_direction = self._directions(self.after_sectors, self.after_rows[order])
+
+        households = []
+        for i, row in enumerate(order.tolist()):
+            household = {
+                'key': after_key[i] or before_key[i],
+                'display_name': after_name[i] or before_name[i],
+                'status': str(self.status[row]),
+                'before': float(self.before_amount[row]),
+                'after': float(self.after_amount[row]),
+                'change': float(self.change[row]),
+                'postal_code_before': before_zip[i] or None,
+                'postal_code_after': after_zip[i] or None
+            }
+            if before_direction is not None:
+                household['direction_before'] = before_direction[i] or None
+                household['direction_after'] = after_direction[i] or None
+            households.append(household)
+        return households
@@ -0,0 +1,46 @@
+from app.services.geometry import haversine_km
+from typing import Dict, Hashable, List, Optional, Tuple
+import math
+
+METERS_PER_DEGREE_LAT = 111320.0
+
+
+class SpatialGridIndex:
+    """Bucket points into a fixed lat/lng grid for nearest-within-tolerance lookups.
+
+    A lookup only inspects the cells that can contain a point within the
+    tolerance, so its cost depends on local density, not on index size.
+    """
+
+    def __init__(self, cell_degrees: float = 0.001):
+        self.cell_degrees = cell_degrees
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, Hashable]]] = {}
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        """Return the grid cell containing a point."""
+        return (math.floor(lat / self.cell_degrees), math.floor(lng / self.cell_degrees))
+
+    def add(self, lat: float, lng: float, key: Hashable):
+        self._cells.setdefault(self.cell(lat, lng), []).append((lat, lng, key))
+        self._size += 1
+
+    def nearest(self, lat: float, lng: float, tolerance_m: float) -> Optional[Hashable]:
+        """Return the key of the nearest point within tolerance_m metres, if any."""
+        lat_span = tolerance_m / METERS_PER_DEGREE_LAT
+        lng_span = lat_span / max(math.cos(math.radians(lat)), 1e-6)
+        row, col = self.cell(lat, lng)
+        rows = math.ceil(lat_span / self.cell_degrees)
+        cols = math.ceil(lng_span / self.cell_degrees)
+
+        best_key, best_m = None, tolerance_m
+        for r in range(row - rows, row + rows + 1):
+            for c in range(col - cols, col + cols + 1):
+                for point_lat, point_lng, key in self._cells.get((r, c), ()):
+                    distance_m = float(haversine_km(lat, lng, point_lat, point_lng)) * 1000
+                    if distance_m <= best_m:
+                        best_key, best_m = key, distance_m
+        return best_key
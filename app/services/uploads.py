@@ -0,0 +1,220 @@
+from flask import current_app
+from typing import BinaryIO, Dict, Iterator, Optional
+import hashlib
+import json
+import os
+import threading
+import uuid
+import zlib
+
+# Optional zstd support for compressed uploads
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Cross-process lock on the upload index (POSIX); without it only threads are serialized
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+# Upload names accepted, with the compressed variants
+UPLOAD_SUFFIXES = ('.csv', '.csv.gz', '.csv.zst')
+
+INDEX_FILE = 'upload_index.json'
+
+# zstd input is fed in slices this small: a block expands to at most
+# 128 KiB from 4 bytes, so one slice yields at most 32 MiB
+ZSTD_INPUT_SLICE = 1024
+
+
+def csv_name(filename: str) -> str:
+    """Name of the decompressed CSV of an upload, e.g. 'giving.csv.gz' -> 'giving.csv'."""
+    for suffix in ('.gz', '.zst'):
+        if filename.endswith(suffix):
+            return filename[:-len(suffix)]
+    return filename
+
+
+class _Inflater:
+    """Incremental decompression of an upload in bounded steps.
+
+    Every step yields at most ``max_output`` bytes for gzip (a few MiB at
+    worst for zstd, see ZSTD_INPUT_SLICE), so a small, highly compressed
+    upload cannot expand in memory before the size limit is checked.
+    Concatenated gzip members (pigz, ``cat a.gz b.gz``) and zstd frames
+    are decompressed one after another.
+    """
+
+    def __init__(self, compression: Optional[str], max_output: int):
+        self.compression = compression
+        self.max_output = max_output
+        self._obj = self._new()
+
+    def _new(self):
+        if self.compression == 'gzip':
+            # wbits=47: gzip or zlib header, auto-detected
+            return zlib.decompressobj(47)
+        if self.compression == 'zstd':
+            return zstandard.ZstdDecompressor().decompressobj()
+        return None
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        if self.compression is None:
+            yield data
+        elif self.compression == 'gzip':
+            yield from self._feed_gzip(data)
+        else:
+            for start in range(0, len(data), ZSTD_INPUT_SLICE):
+                yield from self._feed_zstd(data[start:start + ZSTD_INPUT_SLICE])
+
+    def _feed_gzip(self, data: bytes) -> Iterator[bytes]:
+        while True:
+            if self._obj.eof and data:
+                self._obj = self._new()
+            out = self._obj.decompress(data, self.max_output)
+            if out:
+                yield out
+            data = self._obj.unused_data if self._obj.eof else self._obj.unconsumed_tail
+            # A full step may leave output pending inside zlib even with no input left
+            if not data and len(out) < self.max_output:
+                return
+
+    def _feed_zstd(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            if self._obj.eof:
+                self._obj = self._new()
+            out = self._obj.decompress(data)
+            if out:
+                yield out
+            data = self._obj.unused_data if self._obj.eof else b''
+
+    def finish(self):
+        """Raise ValueError if the last gzip member or zstd frame is incomplete."""
+        if self.compression is not None and not self._obj.eof:
+            raise ValueError(f"Corrupt {self.compression} upload: truncated")
+
+
+def _compression(head: bytes) -> Optional[str]:
+    """Detect the compression of an upload from its first bytes."""
+    if head.startswith(GZIP_MAGIC):
+        return 'gzip'
+    if head.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("zstd uploads need the zstandard package")
+        return 'zstd'
+    return None
+
+
+class UploadStore:
+    """Streams uploads to disk and remembers which content was already processed.
+
+    The body is read in chunks, decompressed on the fly (gzip, or zstd
+    when zstandard is installed) and written to a temporary file while the
+    SHA-256 of the decompressed CSV is computed, so the same export
+    uploaded plain or compressed has one hash. ``upload_index.json`` in
+    the upload folder maps hashes to the analysis IDs they produced.
+    """
+
+    def __init__(self):
+        self._upload_folder = None
+        self._chunk_bytes = None
+        self._max_csv_bytes = None
+        self._lock = threading.Lock()
+
+    @property
+    def upload_folder(self):
+        if self._upload_folder is None:
+            with current_app.app_context():
+                self._upload_folder = current_app.config['UPLOAD_FOLDER']
+                self._chunk_bytes = current_app.config.get('UPLOAD_CHUNK_BYTES', 1024 * 1024)
+                self._max_csv_bytes = current_app.config.get('UPLOAD_MAX_CSV_BYTES')
+        return self._upload_folder
+
+    @property
+    def index_file(self) -> str:
+        return os.path.join(self.upload_folder, INDEX_FILE)
+
+    def save_stream(self, stream: BinaryIO) -> Dict:
+        """Write an upload to a temporary file, hashing its decompressed content.
+
+        Returns the temporary path, the hex digest, the compression used and
+        the bytes received and written. Raises ValueError for empty uploads,
+        corrupt or truncated compressed data and CSVs over
+        UPLOAD_MAX_CSV_BYTES, checked after every bounded decompression step.
+        """
+        folder = self.upload_folder
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f'.upload-{uuid.uuid4().hex}.part')
+        digest = hashlib.sha256()
+        received = written = 0
+        compression, inflater = None, None
+
+        try:
+            with open(path, 'wb') as f:
+                while True:
+                    chunk = stream.read(self._chunk_bytes)
+                    if not chunk:
+                        break
+                    if inflater is None:
+                        compression = _compression(chunk)
+                        inflater = _Inflater(compression, self._chunk_bytes)
+                    received += len(chunk)
+                    steps = inflater.feed(chunk)
+                    while True:
+                        try:
+                            data = next(steps, None)
+                        except Exception as e:
+                            raise ValueError(f"Corrupt {compression} upload: {str(e)}")
+                        if data is None:
+                            break
+                        written += len(data)
+                        if self._max_csv_bytes and written > self._max_csv_bytes:
+                            raise ValueError(f"CSV is larger than {self._max_csv_bytes} bytes")
+                        digest.update(data)
+                        f.write(data)
+                if inflater is not None:
+                    inflater.finish()
+            if written == 0:
+                raise ValueError("Empty file")
+        except Exception:
+            os.remove(path)
+            raise
+
+        return {'path': path, 'sha256': digest.hexdigest(), 'compression': compression,
+                'received_bytes': received, 'csv_bytes': written}
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_file, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def lookup(self, sha256: str) -> Optional[Dict]:
+        """The earlier processing of this content, if its processed file still exists."""
+        entry = self._read_index().get(sha256)
+        if entry and os.path.exists(os.path.join(self.upload_folder, f"processed_{entry['analysis_id']}.csv")):
+            return entry
+        return None
+
+    def record(self, sha256: str, analysis_id: str, filename: str):
+        """Remember that this content produced analysis_id.
+
+        The read-modify-write of the index holds an exclusive lock on
+        ``upload_index.json.lock``, so uploads finishing at the same time in
+        different workers do not drop each other's entries.
+        """
+        with self._lock, open(f'{self.index_file}.lock', 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            index = self._read_index()
+            index[sha256] = {'analysis_id': analysis_id, 'filename': filename}
+            tmp_path = f'{self.index_file}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_file)
@@ -0,0 +1,122 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterable, List, Optional, Tuple
+import re
+
+# Issue codes
+BAD_CURRENCY = 'bad_currency'
+NEGATIVE_AMOUNT = 'negative_amount'
+BAD_ZIP = 'bad_zip'
+EMPTY_ADDRESS = 'empty_address'
+PO_BOX = 'po_box'
+DUPLICATE_RECORD_ID = 'duplicate_record_id'
+
+ISSUE_CODES = [BAD_CURRENCY, NEGATIVE_AMOUNT, BAD_ZIP, EMPTY_ADDRESS, PO_BOX, DUPLICATE_RECORD_ID]
+
+# Issues that keep a row out of the processed data; the others are reported only.
+# Empty addresses and PO boxes still give by ZIP and city, so they are kept.
+DEFAULT_REJECT = [BAD_CURRENCY, NEGATIVE_AMOUNT, DUPLICATE_RECORD_ID]
+
+ISSUE_COLUMNS = ['row', 'code', 'column', 'value']
+
+_CURRENCY_PATTERN = r'^-?\$?\s*-?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?$|^-?\$?\s*-?\.\d+$'
+_ZIP_PATTERN = r'^\d{5}(?:-\d{4})?$'
+# Same patterns as GeocodingService.validate_address, as one regex
+_PO_BOX_PATTERN = re.compile(r'\bP\.?\s*O\.?\s*BOX\b|\bPOST\s+OFFICE\s+BOX\b|\bPOB\b', re.IGNORECASE)
+
+
+def _stripped(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[col].fillna('').astype(str).str.strip()
+
+
+def _issues(mask: np.ndarray, code: str, column: str, values: pd.Series) -> pd.DataFrame:
+    rows = np.flatnonzero(mask)
+    return pd.DataFrame({'row': rows, 'code': code, 'column': column, 'value': values.to_numpy()[rows]},
+                        columns=ISSUE_COLUMNS)
+
+
+def validate_frame(df: pd.DataFrame, amount_columns: Iterable[str], first_row: int = 0,
+                   duplicate_rows: Optional[np.ndarray] = None,
+                   reject: Iterable[str] = DEFAULT_REJECT) -> Tuple[np.ndarray, pd.DataFrame]:
+    """Check every row of an upload chunk at once.
+
+    Covers currency format and negative amounts in ``amount_columns``, ZIP
+    format, empty street addresses, PO boxes and repeated record IDs.
+    ``duplicate_rows`` are chunk-relative rows already known to repeat an
+    earlier record ID (from a pass over the whole upload); without it,
+    repeats are found within the chunk. Returns the mask of rows to reject
+    (any issue in ``reject``) and the issue table, one row per issue, with
+    ``row`` numbered from 1 + ``first_row``.
+    """
+    found = []
+    for col in amount_columns:
+        text = _stripped(df, col)
+        bare = text.str.replace(',', '', regex=False).str.replace('$', '', regex=False).str.strip()
+        amounts = pd.to_numeric(bare, errors='coerce')
+        malformed = (text != '') & (amounts.isna() | ~text.str.match(_CURRENCY_PATTERN)).to_numpy()
+        found.append(_issues(malformed, BAD_CURRENCY, col, text))
+        found.append(_issues((amounts < 0).to_numpy(), NEGATIVE_AMOUNT, col, text))
+
+    postal_code = _stripped(df, 'Postal_Code')
+    found.append(_issues(~postal_code.str.match(_ZIP_PATTERN).to_numpy(), BAD_ZIP, 'Postal_Code', postal_code))
+
+    street = _stripped(df, 'Address_Line_1')
+    found.append(_issues((street == '').to_numpy(), EMPTY_ADDRESS, 'Address_Line_1', street))
+    for col in ('Address_Line_1', 'Address_Line_2'):
+        line = _stripped(df, col)
+        found.append(_issues(line.str.contains(_PO_BOX_PATTERN).to_numpy(), PO_BOX, col, line))
+
+    record_id = _stripped(df, 'dp_RecordID')
+    if duplicate_rows is None:
+        repeated = ((record_id != '') & record_id.duplicated(keep='first')).to_numpy()
+    else:
+        repeated = np.zeros(len(df), dtype=bool)
+        repeated[duplicate_rows] = True
+    found.append(_issues(repeated, DUPLICATE_RECORD_ID, 'dp_RecordID', record_id))
+
+    issues = pd.concat(found, ignore_index=True).sort_values(['row', 'code'], kind='stable', ignore_index=True)
+    rejected = np.zeros(len(df), dtype=bool)
+    rejected[issues.loc[issues['code'].isin(list(reject)), 'row'].to_numpy()] = True
+    issues['row'] += first_row + 1
+    return rejected, issues
+
+
+def duplicate_record_rows(record_ids: List[np.ndarray]) -> List[np.ndarray]:
+    """Rows of each chunk whose record ID already appeared earlier in the upload."""
+    ids = np.concatenate(record_ids) if record_ids else np.array([], dtype=str)
+    _, first = np.unique(ids, return_index=True)
+    repeated = np.ones(len(ids), dtype=bool)
+    repeated[first] = False
+    repeated &= ids != ''
+    bounds = np.cumsum([0] + [len(chunk) for chunk in record_ids])
+    return [np.flatnonzero(repeated[lo:hi]) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def issue_summary(rows_checked: int, rows_rejected: int, issues: pd.DataFrame,
+                  reject: Iterable[str] = DEFAULT_REJECT, sample: int = 20) -> Dict:
+    """Issue counts per code, rejected rows per code and the first few issues of a chunk."""
+    rejecting = issues[issues['code'].isin(list(reject))].drop_duplicates(['row', 'code'])
+    return {
+        'rows_checked': rows_checked,
+        'rows_valid': rows_checked - rows_rejected,
+        'rows_rejected': rows_rejected,
+        'issues': {code: int(n) for code, n in issues['code'].value_counts().items()},
+        'rejected_by': {code: int(n) for code, n in rejecting['code'].value_counts().items()},
+        'sample': issues.head(sample).to_dict('records')
+    }
+
+
+def merge_issue_summaries(summaries: List[Dict], sample: int = 20) -> Dict:
+    """Combine chunk issue summaries, in upload order."""
+    merged = {'rows_checked': 0, 'rows_valid': 0, 'rows_rejected': 0,
+              'issues': {code: 0 for code in ISSUE_CODES}, 'rejected_by': {}, 'sample': []}
+    for summary in summaries:
+        for key in ('rows_checked', 'rows_valid', 'rows_rejected'):
+            merged[key] += summary[key]
+        for key in ('issues', 'rejected_by'):
+            for code, count in summary[key].items():
+                merged[key][code] = merged[key].get(code, 0) + count
+        merged['sample'].extend(summary['sample'][:sample - len(merged['sample'])])
+    return merged
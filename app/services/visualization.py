@@ -1,14 +1,67 @@
 import folium
 from folium import plugins
+from branca.colormap import LinearColormap
 from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
 from flask import current_app
+from app.services.aggregation import grouped_stats
+from app.services.cube import UNKNOWN, ContributionCube, grid_cells
+from app.services.dataset import DatasetStore
+from app.services.local_geocoding import get_zip_index
+import functools
+import json
 import os
+import re
+
+# Cube dimension behind each chart type
+CHART_DIMENSIONS = {
+    'income_distribution': 'direction',
+    'direction_comparison': 'direction',
+    'postal_code': 'postal_code',
+    'city': 'city',
+    'contribution_band': 'band'
+}
+
+# Upload IDs name processed files and map files, so they may not contain path separators
+_ANALYSIS_ID = re.compile(r'^[\w.-]+$')
+
+# Choropleth areas and the aggregate that colors them
+CHOROPLETH_LEVELS = ('zip', 'grid')
+CHOROPLETH_METRICS = ('sum', 'count', 'mean')
+CHOROPLETH_COLORS = ['#ffffcc', '#fd8d3c', '#800026']
+
+# Feature properties holding the ZIP code in common boundary files (e.g. Census ZCTAs)
+ZIP_PROPERTIES = ('postal_code', 'zip', 'ZIP', 'zip_code', 'ZCTA5CE20', 'ZCTA5CE10', 'GEOID20', 'GEOID10', 'GEOID')
+
+
+@functools.lru_cache(maxsize=2)
+def load_zip_boundaries(path: str, stamp: float) -> Dict[str, Dict]:
+    """Index the polygons of a local GeoJSON boundary file by ZIP code.
+
+    ``stamp`` is the file's mtime, so an updated file is read again.
+    """
+    with open(path, 'r') as f:
+        collection = json.load(f)
+    boundaries = {}
+    for feature in collection.get('features', []):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            continue
+        properties = feature.get('properties') or {}
+        zip_code = next((str(properties[key]) for key in ZIP_PROPERTIES if properties.get(key)), None)
+        if zip_code:
+            boundaries[zip_code[:5]] = geometry
+    return boundaries
+
 
 class VisualizationService:
     def __init__(self):
         self._upload_folder = None
+        self._boundaries_file = None
+        self._grid_degrees = None
         self._df = None
+        self.datasets = DatasetStore()
     
     @property
     def upload_folder(self):
@@ -17,6 +70,21 @@ class VisualizationService:
                 self._upload_folder = current_app.config['UPLOAD_FOLDER']
         return self._upload_folder
     
+    @property
+    def boundaries_file(self) -> Optional[str]:
+        """Optional local GeoJSON of ZIP boundaries (CHOROPLETH_BOUNDARIES_FILE)."""
+        if self._boundaries_file is None:
+            with current_app.app_context():
+                self._boundaries_file = current_app.config.get('CHOROPLETH_BOUNDARIES_FILE') or ''
+        return self._boundaries_file
+    
+    @property
+    def grid_degrees(self) -> float:
+        if self._grid_degrees is None:
+            with current_app.app_context():
+                self._grid_degrees = current_app.config.get('CHOROPLETH_GRID_DEGREES', 0.01)
+        return self._grid_degrees
+    
     def load_data(self, filename: str) -> bool:
         """Load data from CSV file."""
         try:
@@ -89,9 +157,180 @@ class VisualizationService:
             current_app.logger.error(f"Error creating map visualization: {str(e)}")
             return None
     
+    def choropleth_areas(self, dataset, level: str = 'zip', metric: str = 'sum',
+                         cell_degrees: Optional[float] = None) -> Dict:
+        """Aggregate a dataset into styled choropleth areas, as a GeoJSON FeatureCollection.
+
+        ZIP areas come from the dataset's contribution cube and use polygons
+        from the boundary file when available, otherwise a point at the ZIP
+        centroid. Grid areas are square cells of ``cell_degrees``. Each
+        feature carries the area's count, sum, mean and fill color, so the
+        cost depends on the number of areas, not of households.
+        """
+        if level not in CHOROPLETH_LEVELS:
+            raise ValueError(f"Unsupported choropleth level: {level} (use {', '.join(CHOROPLETH_LEVELS)})")
+        if metric not in CHOROPLETH_METRICS:
+            raise ValueError(f"Unsupported choropleth metric: {metric} (use {', '.join(CHOROPLETH_METRICS)})")
+        
+        features, unplaced = [], 0
+        if level == 'zip':
+            boundaries = {}
+            if self.boundaries_file and os.path.exists(self.boundaries_file):
+                boundaries = load_zip_boundaries(self.boundaries_file, os.path.getmtime(self.boundaries_file))
+            cells = [cell for cell in dataset.cube.rollup(['postal_code'])['cells'] if cell['count']]
+            zip_codes = [cell['postal_code'][:5] for cell in cells]
+            lat, lng, found = get_zip_index(current_app.config.get('ZIP_CENTROIDS_FILE')).lookup_many(
+                pd.Series(zip_codes, dtype=str))
+            for i, (cell, zip_code) in enumerate(zip(cells, zip_codes)):
+                if zip_code in boundaries:
+                    geometry = boundaries[zip_code]
+                elif found[i] and zip_code != UNKNOWN:
+                    # Point-centroid fallback for ZIPs without a boundary
+                    geometry = {'type': 'Point', 'coordinates': [float(lng[i]), float(lat[i])]}
+                else:
+                    unplaced += cell['count']
+                    continue
+                features.append(self._area_feature(geometry, zip_code, cell['count'], cell['sum'], cell['mean']))
+        else:
+            size = float(cell_degrees or self.grid_degrees)
+            if size <= 0:
+                raise ValueError("Grid cell size must be positive")
+            grid = grid_cells(dataset['latitude'], dataset['longitude'], dataset['contribution_amount'], size)
+            for south, west, count, valued, total in zip(grid['south'].tolist(), grid['west'].tolist(),
+                                                         grid['count'].tolist(), grid['valued'].tolist(),
+                                                         grid['sum'].tolist()):
+                ring = [[west, south], [west + size, south], [west + size, south + size],
+                        [west, south + size], [west, south]]
+                features.append(self._area_feature({'type': 'Polygon', 'coordinates': [ring]},
+                                                   f'{south:.4f}, {west:.4f}', count, total,
+                                                   total / valued if valued else 0.0))
+            unplaced = len(dataset) - int(grid['count'].sum())
+        
+        values = [feature['properties'][metric] for feature in features]
+        low, high = (min(values), max(values)) if values else (0.0, 0.0)
+        colormap = LinearColormap(CHOROPLETH_COLORS, vmin=low, vmax=high if high > low else low + 1)
+        for feature in features:
+            feature['properties']['fill'] = colormap(feature['properties'][metric])
+        
+        return {
+            'type': 'FeatureCollection',
+            'features': features,
+            'level': level,
+            'metric': metric,
+            'range': [low, high],
+            'unplaced': unplaced
+        }
+    
+    @staticmethod
+    def _area_feature(geometry: Dict, label: str, count: int, total: float, mean: float) -> Dict:
+        return {
+            'type': 'Feature',
+            'geometry': geometry,
+            'properties': {'label': label, 'count': int(count), 'sum': round(float(total), 2),
+                           'mean': round(float(mean), 2)}
+        }
+    
+    def create_choropleth(self, level: str = 'zip', metric: str = 'sum', analysis_id: Optional[str] = None,
+                          cell_degrees: Optional[float] = None) -> Optional[Dict]:
+        """Render giving density per ZIP or grid cell as one styled map layer.
+
+        Uses the current dataset, or the upload named by ``analysis_id``.
+        Returns the map file and area counts, or None if no data is available.
+        Raises ValueError for a malformed analysis ID.
+        """
+        if analysis_id not in (None, '') and (not isinstance(analysis_id, str) or not _ANALYSIS_ID.match(analysis_id)):
+            raise ValueError("Invalid analysis ID")
+        if analysis_id:
+            dataset = self.datasets.open_file(f'processed_{analysis_id}.csv')
+        else:
+            dataset = self.datasets.current()
+        if dataset is None:
+            return None
+        
+        areas = self.choropleth_areas(dataset, level, metric, cell_degrees)
+        polygons = [f for f in areas['features'] if f['geometry']['type'] != 'Point']
+        points = [f for f in areas['features'] if f['geometry']['type'] == 'Point']
+        
+        m = folium.Map(tiles='OpenStreetMap')
+        tooltip_fields = ['label', 'count', 'sum', 'mean']
+        if polygons:
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': polygons},
+                name='Areas',
+                style_function=lambda feature: {
+                    'fillColor': feature['properties']['fill'],
+                    'color': '#555555',
+                    'weight': 1,
+                    'fillOpacity': 0.7
+                },
+                tooltip=folium.GeoJsonTooltip(fields=tooltip_fields)
+            ).add_to(m)
+        if points:
+            folium.GeoJson(
+                {'type': 'FeatureCollection', 'features': points},
+                name='ZIP centroids',
+                marker=folium.CircleMarker(radius=10, fill=True),
+                style_function=lambda feature: {
+                    'fillColor': feature['properties']['fill'],
+                    'color': '#555555',
+                    'weight': 1,
+                    'fillOpacity': 0.8
+                },
+                tooltip=folium.GeoJsonTooltip(fields=tooltip_fields)
+            ).add_to(m)
+        
+        colormap = LinearColormap(CHOROPLETH_COLORS, vmin=areas['range'][0],
+                                  vmax=max(areas['range'][1], areas['range'][0] + 1),
+                                  caption=f'Contribution {metric} per {level}')
+        colormap.add_to(m)
+        
+        bounds = self._feature_bounds(areas['features'])
+        if bounds:
+            m.fit_bounds(bounds)
+        
+        # One file per map, like create_map; grid maps also differ by cell size
+        name = f'{level}_{float(cell_degrees or self.grid_degrees):g}' if level == 'grid' else level
+        map_file = os.path.join(self.upload_folder,
+                                f'choropleth_{name}_{metric}_{analysis_id or dataset.version}.html')
+        m.save(map_file)
+        
+        return {
+            'map_file': map_file,
+            'level': level,
+            'metric': metric,
+            'areas': len(areas['features']),
+            'boundaries': len(polygons),
+            'centroids': len(points),
+            'unplaced': areas['unplaced']
+        }
+    
+    @staticmethod
+    def _feature_bounds(features: List[Dict]) -> Optional[List[List[float]]]:
+        """[[south, west], [north, east]] over every coordinate of the features."""
+        coordinates = []
+        for feature in features:
+            geometry = feature['geometry']
+            if geometry['type'] == 'Point':
+                coordinates.append(geometry['coordinates'])
+            else:
+                polygons = geometry['coordinates'] if geometry['type'] == 'MultiPolygon' else [geometry['coordinates']]
+                coordinates.extend(position for polygon in polygons for position in polygon[0])
+        if not coordinates:
+            return None
+        points = np.asarray(coordinates, dtype=np.float64)[:, :2]
+        return [[float(points[:, 1].min()), float(points[:, 0].min())],
+                [float(points[:, 1].max()), float(points[:, 0].max())]]
+    
     def create_chart_data(self, data: Dict) -> Dict:
-        """Create data for charts."""
+        """Create data for charts.
+
+        ``data`` holds either per-direction ``statistics`` or a ``rollup``
+        from the contribution cube, charted by its first dimension.
+        """
         try:
+            if 'rollup' in data:
+                return self.create_rollup_chart_data(data['rollup'])
+            
             chart_data = {
                 'directions': {
                     'labels': [],
@@ -113,6 +352,20 @@ class VisualizationService:
             current_app.logger.error(f"Error creating chart data: {str(e)}")
             return {}
     
+    def create_rollup_chart_data(self, rollup: Dict) -> Dict:
+        """Chart series for a cube roll-up, one entry per group."""
+        dimension = rollup['dimensions'][0] if rollup['dimensions'] else 'total'
+        cells = rollup['cells'] if rollup['dimensions'] else [rollup['total']]
+        return {
+            dimension: {
+                'labels': [str(cell.get(dimension, 'Total')).capitalize() for cell in cells],
+                'counts': [cell['count'] for cell in cells],
+                'totals': [cell['sum'] for cell in cells],
+                'averages': [cell['mean'] for cell in cells],
+                'std': [cell['std'] for cell in cells]
+            }
+        }
+    
     def generate_map_data(self, analysis_id: str) -> Dict:
         """Generate map data for visualization."""
         try:
@@ -208,42 +461,49 @@ class VisualizationService:
         except Exception as e:
             raise Exception(f"Map generation error: {str(e)}")
     
-    def generate_chart_data(self, analysis_id: str, chart_type: str = 'income_distribution') -> Dict:
-        """Generate data for statistical charts."""
+    def generate_chart_data(self, analysis_id: str, chart_type: str = 'income_distribution',
+                            cube: Optional[ContributionCube] = None) -> Dict:
+        """Generate data for statistical charts from the contribution cube.
+
+        Direction charts need a cube split by direction (see
+        AnalysisService.cube); the others work from the published cube.
+        Distribution charts also carry median, min and max per label, from
+        one grouped pass over the households' cells.
+        """
         try:
-            # Load analysis results
-            results_file = os.path.join(self.upload_folder, f'processed_{analysis_id}.csv')
-            if not os.path.exists(results_file):
+            if chart_type not in CHART_DIMENSIONS:
+                raise ValueError(f"Unsupported chart type: {chart_type}")
+            
+            dataset = self.datasets.open_file(f'processed_{analysis_id}.csv')
+            if dataset is None:
                 raise FileNotFoundError("Analysis results not found")
+            if cube is None:
+                cube = dataset.cube
             
-            df = pd.read_csv(results_file)
+            dimension = CHART_DIMENSIONS[chart_type]
+            if dimension not in cube.dimensions:
+                raise ValueError(f"{chart_type} charts need a reference point")
+            cells = cube.rollup([dimension])['cells']
             
-            if chart_type == 'income_distribution':
-                # Calculate income distribution by direction
-                distribution = df.groupby('direction')['contribution_amount'].agg([
-                    'count',
-                    'mean',
-                    'median',
-                    'min',
-                    'max'
-                ]).to_dict()
-                
-                return {
-                    'type': 'income_distribution',
-                    'data': distribution
-                }
-            
-            elif chart_type == 'direction_comparison':
+            if chart_type == 'direction_comparison':
                 # Count of contributions by direction
-                direction_counts = df['direction'].value_counts().to_dict()
-                
                 return {
-                    'type': 'direction_comparison',
-                    'data': direction_counts
+                    'type': chart_type,
+                    'data': {cell[dimension]: cell['count'] for cell in cells}
                 }
             
-            else:
-                raise ValueError(f"Unsupported chart type: {chart_type}")
+            # Statistic -> label -> value, as DataFrame.to_dict() gives
+            data = {
+                name: {cell[dimension]: cell[name] for cell in cells}
+                for name in ('count', 'sum', 'mean', 'std')
+            }
+            labels = cube.labels[dimension]
+            codes = cube.coords[cube.row_cells, cube.dimensions.index(dimension)]
+            stats = grouped_stats(codes, dataset['contribution_amount'], len(labels))
+            order = {'median': stats['quantiles'][0.5], 'min': stats['min'], 'max': stats['max']}
+            for name, values in order.items():
+                data[name] = {cell[dimension]: float(values[labels.index(cell[dimension])]) for cell in cells}
+            return {'type': chart_type, 'data': data}
             
         except Exception as e:
             raise Exception(f"Chart generation error: {str(e)}")
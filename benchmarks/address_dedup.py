@@ -0,0 +1,97 @@
+"""Report how much address canonicalization deduplicates geocoding cache keys.
+
+Usage: python benchmarks/address_dedup.py [csv] [--variants N] [--seed S]
+
+Runs over the combined addresses of the given upload (default
+jk-st-rita.csv) and over a synthetic set in which each address is
+rewritten N times with the kinds of variation seen in real exports:
+case, street suffix and directional spelling, punctuation, unit
+designators and ZIP+4 codes.
+"""
+import argparse
+import os
+import random
+import re
+import sys
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'address-dedup-benchmark')
+
+from app.services.address import STREET_SUFFIXES, DIRECTIONALS, dedup_report  # noqa: E402
+
+LONG_FORMS = {}
+for long_form, short in STREET_SUFFIXES.items():
+    if len(long_form) > len(LONG_FORMS.get(short, '')):
+        LONG_FORMS[short] = long_form
+LONG_DIRECTIONS = {v: k for k, v in DIRECTIONALS.items() if len(k) > 2}
+
+
+def combined_addresses(csv_path: str) -> pd.Series:
+    """Build addresses the same way process_csv does."""
+    df = pd.read_csv(csv_path, dtype=str).fillna('')
+    parts = ['Address_Line_1', 'Address_Line_2', 'City', 'State/Region']
+    zip_base = df['Postal_Code'].str.split('-').str[0].str.strip()
+    rows = df[parts].apply(lambda col: col.str.strip()).assign(zip=zip_base)
+    addresses = rows.apply(lambda row: ', '.join(filter(None, row)), axis=1)
+    return addresses[df['Address_Line_1'].str.strip() != '']
+
+
+def vary(address: str, rng: random.Random) -> str:
+    """Rewrite one address the way a different export might spell it."""
+    street, _, locality = address.partition(', ')
+    tokens = street.split(' ')
+    for i, token in enumerate(tokens):
+        bare = token.rstrip('.').upper()
+        if i == len(tokens) - 1 and bare in STREET_SUFFIXES and rng.random() < 0.6:
+            # Spell the suffix out or abbreviate it, with or without a period
+            short = STREET_SUFFIXES[bare]
+            tokens[i] = rng.choice([LONG_FORMS.get(short, short).title(), short.title() + '.', short])
+        elif 0 < i < len(tokens) - 1 and bare in DIRECTIONALS and rng.random() < 0.6:
+            short = DIRECTIONALS[bare]
+            tokens[i] = rng.choice([LONG_DIRECTIONS.get(short, short).title(), short + '.'])
+    text = ' '.join(tokens) + (', ' + locality if locality else '')
+
+    if rng.random() < 0.3:
+        text = re.sub(r'\bApt\.? ', rng.choice(['Apartment ', 'APT ', 'Apt. # ']), text)
+        text = re.sub(r'\bUnit ', rng.choice(['UNIT ', 'unit ', 'Unit # ']), text)
+        text = re.sub(r'#(\w)', r'# \1', text)
+    if rng.random() < 0.3:
+        text = re.sub(r'(\d{5})$', lambda m: f'{m.group(1)}-{rng.randint(1000, 9999)}', text)
+    case = rng.random()
+    if case < 0.25:
+        text = text.upper()
+    elif case < 0.5:
+        text = text.lower()
+    if rng.random() < 0.2:
+        text = text.replace(', ', ' , ') + rng.choice([',', ' ', ', '])
+    return text
+
+
+def print_report(label: str, report: dict):
+    print(f'{label}:')
+    print(f'  addresses         {report["addresses"]:>8}')
+    print(f'  unique (strip)    {report["unique_stripped"]:>8}')
+    print(f'  unique (canonical){report["unique_canonical"]:>8}')
+    print(f'  keys saved        {report["keys_saved"]:>8}  ({report["dedup_ratio"]:.1%})')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv', nargs='?', default='jk-st-rita.csv')
+    parser.add_argument('--variants', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    addresses = combined_addresses(args.csv)
+    print_report(args.csv, dedup_report(addresses))
+
+    rng = random.Random(args.seed)
+    originals = addresses.drop_duplicates().tolist()
+    synthetic = [vary(a, rng) for a in originals for _ in range(args.variants)]
+    print_report(f'synthetic ({args.variants} variants of {len(originals)} addresses)', dedup_report(synthetic))
+
+
+if __name__ == '__main__':
+    main()
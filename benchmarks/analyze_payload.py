@@ -0,0 +1,94 @@
+"""Compare the /api/analyze points payload in row and columnar form.
+
+Usage: python benchmarks/analyze_payload.py [--points 1000 10000 100000] [--runs 5]
+
+For each size, builds a synthetic result and reports bytes on the wire
+(raw, gzip and, if installed, brotli) and encode time for:
+
+- rows:     the default list of per-household objects, encoded with the
+            standard library json module as Flask's jsonify does
+- columnar: parallel arrays with dictionary-encoded directions, encoded
+            with app.api.encoding.dumps (orjson when installed)
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'analyze-payload-benchmark')
+
+from app.api import encoding  # noqa: E402
+from app.services.analysis import points_as_columns, points_as_rows  # noqa: E402
+
+DIRECTIONS = ['north', 'south', 'east', 'west']
+SURNAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis']
+
+
+def synthetic_points(count: int, seed: int = 0) -> dict:
+    """Build index-aligned point fields like analyze_directions does."""
+    rng = random.Random(seed)
+    return {
+        'lat': [round(30.3 + rng.random() * 0.2, 6) for _ in range(count)],
+        'lng': [round(-86.6 + rng.random() * 0.3, 6) for _ in range(count)],
+        'direction': [rng.choice(DIRECTIONS) for _ in range(count)],
+        'contribution': [round(rng.uniform(0, 5000), 2) for _ in range(count)],
+        'display_name': [f'Mr. and Mrs. {rng.choice(SURNAMES)}' for _ in range(count)],
+    }
+
+
+def time_encode(encode, payload, runs: int):
+    """Return (best seconds, encoded bytes)."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        body = encode(payload)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def measure(count: int, runs: int) -> list:
+    fields = synthetic_points(count)
+    variants = [
+        ('rows', lambda p: json.dumps(p, separators=(',', ':')).encode('utf-8'),
+         {'points': points_as_rows(**fields)}),
+        ('columnar', encoding.dumps, {'points': points_as_columns(**fields)}),
+    ]
+    results = []
+    for name, encode, payload in variants:
+        seconds, body = time_encode(encode, payload, runs)
+        result = {
+            'points': count,
+            'format': name,
+            'encode_ms': seconds * 1000,
+            'raw': len(body),
+            'gzip': len(gzip.compress(body, compresslevel=6)),
+        }
+        if encoding.brotli is not None:
+            result['br'] = len(encoding.brotli.compress(body, quality=5))
+        results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--points', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if encoding.orjson is not None else 'json'}; "
+          f"brotli: {'yes' if encoding.brotli is not None else 'not installed'}")
+    print(f"{'points':>8} {'format':>9} {'encode':>10} {'raw':>11} {'gzip':>11} {'br':>11}")
+    for count in args.points:
+        for r in measure(count, args.runs):
+            br = f"{r['br']:>11,}" if 'br' in r else f"{'-':>11}"
+            print(f"{r['points']:>8,} {r['format']:>9} {r['encode_ms']:>8.1f}ms "
+                  f"{r['raw']:>11,} {r['gzip']:>11,} {br}")
+
+
+if __name__ == '__main__':
+    main()
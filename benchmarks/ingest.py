@@ -0,0 +1,89 @@
+"""Measure CSV ingestion time and peak memory at several worker counts.
+
+Usage: python benchmarks/ingest.py [csv] [--rows N] [--workers 1 2 4 8] [--chunk-mb M]
+
+Builds a synthetic upload of N rows by repeating the given export (default
+jk-st-rita.csv) with fresh record IDs, then ingests it with
+app.services.ingest.ingest_csv once per worker count. Every run happens in
+a fresh interpreter so the peak RSS of the parent and of the pool workers
+is measured per run.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'ingest-benchmark')
+
+
+def build_upload(source: str, rows: int, path: str):
+    """Repeat the data rows of ``source`` until ``rows`` rows, renumbering dp_RecordID."""
+    import pandas as pd
+    template = pd.read_csv(source, dtype=str)
+    copies = -(-rows // len(template))
+    with open(path, 'w', newline='') as f:
+        for i in range(copies):
+            block = template.copy()
+            block['dp_RecordID'] = [str(i * len(template) + n) for n in range(len(template))]
+            block = block.iloc[:rows - i * len(template)]
+            block.to_csv(f, index=False, header=(i == 0))
+
+
+def run_once(path: str, workers: int, chunk_bytes: int):
+    """Ingest once and print wall time and peak RSS (MB) as JSON; runs in a child interpreter."""
+    from app.services.ingest import ingest_csv
+    with tempfile.TemporaryDirectory() as folder:
+        start = time.perf_counter()
+        summary = ingest_csv(path, os.path.join(folder, 'processed.csv'), workers=workers, chunk_bytes=chunk_bytes)
+        seconds = time.perf_counter() - start
+    print(json.dumps({
+        'workers': workers,
+        'seconds': seconds,
+        'rows': summary['total_records'],
+        'chunks': summary['chunks'],
+        'parent_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'worker_peak_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv', nargs='?', default='jk-st-rita.csv')
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--chunk-mb', type=int, default=16)
+    parser.add_argument('--run', nargs=2, metavar=('PATH', 'WORKERS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    chunk_bytes = args.chunk_mb * 1024 * 1024
+
+    if args.run:
+        run_once(args.run[0], int(args.run[1]), chunk_bytes)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        upload = os.path.join(folder, 'upload.csv')
+        build_upload(args.csv, args.rows, upload)
+        size_mb = os.path.getsize(upload) / 1024 / 1024
+        print(f'{args.rows:,} rows, {size_mb:.0f} MB, {os.cpu_count()} CPUs, {args.chunk_mb} MB chunks')
+        print(f'{"workers":>8} {"chunks":>7} {"seconds":>8} {"speedup":>8} {"parent MB":>10} {"worker MB":>10}')
+        baseline = None
+        for workers in args.workers:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--chunk-mb', str(args.chunk_mb),
+                 '--run', upload, str(workers)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            baseline = baseline or result['seconds']
+            print(f'{workers:>8} {result["chunks"]:>7} {result["seconds"]:>8.2f} '
+                  f'{baseline / result["seconds"]:>7.2f}x {result["parent_peak_mb"]:>10.0f} '
+                  f'{result["worker_peak_mb"]:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
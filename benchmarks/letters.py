@@ -0,0 +1,83 @@
+"""Measure mail-merge letter throughput and peak memory at several worker counts.
+
+Usage: python benchmarks/letters.py [csv] [--letters N] [--workers 1 2 4] [--shard-size S]
+
+Ingests a synthetic upload of N households built by repeating the given
+export (default jk-st-rita.csv), selects every household, then renders one
+letter per household with ReportingService.generate_letters once per worker
+count. Every run happens in a fresh interpreter so the peak RSS of the
+parent and of the pool workers is measured per run.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'letters-benchmark')
+
+from ingest import build_upload  # noqa: E402
+
+
+def run_once(folder: str, workers: int, shard_size: int):
+    """Render every household's letter and print throughput and peak RSS (MB) as JSON."""
+    from flask import Flask
+    from app.services.analysis import AnalysisService
+    from app.services.reporting import ReportingService
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=folder, REPORT_FOLDER=folder,
+                      LETTERS_WORKERS=workers, LETTERS_SHARD_SIZE=shard_size)
+    with app.app_context():
+        analysis = AnalysisService()
+        analysis.load_current()
+        result_id = analysis.query({'contribution': {'min': 0}})['result_id']
+        summary = ReportingService().generate_letters(result_id, analysis.get_analysis_results(result_id))
+        letters = os.path.join(folder, os.path.basename(summary['report_file']))
+        summary['megabytes'] = os.path.getsize(letters) / 1024 / 1024
+        os.remove(letters)
+    print(json.dumps({
+        **summary,
+        'parent_peak_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'worker_peak_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv', nargs='?', default='jk-st-rita.csv')
+    parser.add_argument('--letters', type=int, default=20000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--shard-size', type=int, default=500)
+    parser.add_argument('--run', nargs=2, metavar=('FOLDER', 'WORKERS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run_once(args.run[0], int(args.run[1]), args.shard_size)
+        return
+
+    with tempfile.TemporaryDirectory() as folder:
+        from app.services.ingest import ingest_csv
+        upload = os.path.join(folder, 'upload.csv')
+        build_upload(args.csv, args.letters, upload)
+        ingest_csv(upload, os.path.join(folder, 'processed_20240101_000000.csv'))
+        os.remove(upload)
+        print(f'{args.letters:,} letters, {os.cpu_count()} CPUs, {args.shard_size} letters per shard')
+        print(f'{"workers":>8} {"shards":>7} {"seconds":>8} {"pages/s":>8} {"PDF MB":>7} '
+              f'{"parent MB":>10} {"worker MB":>10}')
+        for workers in args.workers:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--shard-size', str(args.shard_size),
+                 '--run', folder, str(workers)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f'{result["workers"]:>8} {result["shards"]:>7} {result["seconds"]:>8.2f} '
+                  f'{result["pages_per_second"]:>8.0f} {result["megabytes"]:>7.1f} '
+                  f'{result["parent_peak_mb"]:>10.0f} {result["worker_peak_mb"]:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""Measure import and ``create_app()`` time in a fresh interpreter.
+
+Usage: python benchmarks/startup.py [--runs N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEAVY_MODULES = ['pandas', 'numpy', 'folium', 'geopy', 'reportlab']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+import app.api.routes
+imported = time.perf_counter()
+from app import create_app
+from app.config import TestingConfig
+create_app(TestingConfig)
+created = time.perf_counter()
+print(json.dumps({
+    'import_seconds': imported - start,
+    'create_app_seconds': created - imported,
+    'heavy_modules': [m for m in %r if m in sys.modules],
+}))
+''' % (HEAVY_MODULES,)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure_startup() -> dict:
+    """Run one cold start in a subprocess and return its timings."""
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'startup-benchmark')
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [measure_startup() for _ in range(args.runs)]
+    for key in ('import_seconds', 'create_app_seconds'):
+        values = sorted(run[key] for run in runs)
+        print(f'{key:20s} min={values[0] * 1000:7.1f}ms  median={values[len(values) // 2] * 1000:7.1f}ms')
+    print(f'heavy modules loaded: {runs[-1]["heavy_modules"] or "none"}')
+
+
+if __name__ == '__main__':
+    main()
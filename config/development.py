@@ -8,14 +8,54 @@ class DevelopmentConfig:
     TESTING = False
 
     # File upload configuration
-    MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
+    MAX_CONTENT_LENGTH = 512 * 1024 * 1024  # 512MB max upload (compressed size for .gz/.zst)
+    UPLOAD_CHUNK_BYTES = 1024 * 1024  # uploads are hashed and written in chunks of this size
+    UPLOAD_MAX_CSV_BYTES = 4 * 1024 * 1024 * 1024  # decompressed size limit
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'uploads')
     ALLOWED_EXTENSIONS = {'csv'}
 
+    # Ingestion configuration
+    # Parallel ingestion: uploads of at least INGEST_PARALLEL_MIN_BYTES are split into
+    # row-aligned chunks ingested by INGEST_WORKERS processes (0 = one per CPU)
+    INGEST_WORKERS = 0
+    INGEST_CHUNK_BYTES = 64 * 1024 * 1024
+    INGEST_PARALLEL_MIN_BYTES = 32 * 1024 * 1024
+    # Upload validation: issue codes whose rows are left out (the others are only reported)
+    VALIDATION_REJECT = ['bad_currency', 'negative_amount', 'duplicate_record_id']
+
+    # Shared dataset configuration (DATASET_FOLDER defaults to UPLOAD_FOLDER/datasets)
+    DATASET_VERSIONS_KEPT = 3
+    CUBE_CONTRIBUTION_BANDS = [100, 500, 1000, 5000]  # upper edges of the cube's contribution bands
+
     # Geocoding configuration
     GEOCODING_API_KEY = os.environ.get('GEOCODING_API_KEY')
     GEOCODING_CACHE_TTL = timedelta(days=7)
+    GEOCODING_NEGATIVE_CACHE_TTL = timedelta(days=1)
     GEOCODING_RATE_LIMIT = 1000  # requests per day
+    # Bundled US ZIP centroid table used for instant approximate coordinates
+    ZIP_CENTROIDS_FILE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app', 'data', 'us_zip_centroids.csv.gz')
+    # Refine centroid coordinates with street-level geocoding after upload
+    GEOCODING_BACKGROUND_REFINE = True
+    # Publish refined coordinates as a new revision at most this often, and when done
+    GEOCODING_REFINE_PUBLISH_SECONDS = 60
+    # Provider resilience: bounded retries with jittered backoff, circuit breaker
+    # and negative caching of unresolvable addresses
+    GEOCODING_MAX_ATTEMPTS = 3
+    GEOCODING_BACKOFF_BASE = 0.5  # seconds
+    GEOCODING_BACKOFF_MAX = 8.0  # seconds
+    GEOCODING_BREAKER_THRESHOLD = 5  # consecutive failures before failing fast
+    GEOCODING_BREAKER_RESET = 60  # seconds before a trial call
+    # Reverse geocoding answers from the nearest cached result within the tolerance
+    REVERSE_GEOCODING_CELL_DEGREES = 0.001  # grid cell size (~110 m of latitude)
+    REVERSE_GEOCODING_TOLERANCE_M = 50
+    # Rebuild the address autocomplete index at most this often while the geocoding cache grows
+    AUTOCOMPLETE_REFRESH_SECONDS = 30
+
+    # API response configuration
+    # JSON API responses larger than this are gzip/brotli compressed on request
+    API_COMPRESS_MIN_SIZE = 1024  # bytes
+    API_GZIP_LEVEL = 6
+    API_BROTLI_QUALITY = 5
 
     # Database configuration
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
@@ -32,18 +72,38 @@ class DevelopmentConfig:
         'summary': 'templates/reports/summary.html',
         'detailed': 'templates/reports/detailed.html'
     }
+    # Mail-merge letters: households per PDF shard, shard-rendering processes (0 = one per CPU)
+    LETTERS_SHARD_SIZE = 500
+    LETTERS_WORKERS = 0
 
     # Map configuration
     MAP_CENTER = [40.7128, -74.0060]  # Default to NYC
     MAP_ZOOM = 12
     MAP_TILE_URL = 'https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png'
     MAP_TILE_ATTRIBUTION = '© OpenStreetMap contributors'
+    # Choropleth maps: optional local GeoJSON of ZIP boundaries (ZIP centroids otherwise)
+    CHOROPLETH_BOUNDARIES_FILE = None
+    CHOROPLETH_GRID_DEGREES = 0.01  # grid cell size (~1.1 km of latitude)
 
     # Analysis configuration
     DEFAULT_THRESHOLD = 500
+    # Analysis result sets for paging and export: stored on disk per upload,
+    # shared by all workers, and cached in memory per worker
+    ANALYSIS_RESULTS_STORED = 256
+    ANALYSIS_RESULTS_KEPT = 32
+    ANALYSIS_PAGE_SIZE_MAX = 1000
+    # Direction sectors (4, 8 or 16); DIRECTION_ANGLES, when set, defines custom sectors
     DIRECTION_ANGLES = {
         'north': (315, 45),
         'east': (45, 135),
         'south': (135, 225),
         'west': (225, 315)
-    } 
\ No newline at end of file
+    }
+    DIRECTION_SECTORS = 4
+    DISTANCE_RINGS_KM = [1, 2, 5, 10, 25]  # ring edges for sector analysis
+    # Batch site comparison: sites per request, households per vectorized block
+    ANALYSIS_MAX_SITES = 50
+    ANALYSIS_SITE_CHUNK_ROWS = 65536
+    POLAR_CACHE_SIZE = 16  # reference points whose bearings/distances are cached per worker
+    REGION_MASKS_KEPT = 32  # region membership masks cached per worker
+    FILTER_CACHE_SIZE = 64  # declarative filter sub-masks cached per worker
\ No newline at end of file
@@ -0,0 +1,12 @@
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+timeout = 120
+keepalive = 5
+
+# Load the app and map the current dataset before forking so that workers
+# share its pages instead of each loading a private copy.
+preload_app = True
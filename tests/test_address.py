@@ -0,0 +1,29 @@
+from app.services.address import canonicalize_address, dedup_report
+
+def test_suffix_case_and_punctuation_fold_together():
+    """Test that common spelling variants share one canonical key."""
+    variants = ['123 Main St', '123 Main Street', '123 MAIN ST., ', '123  main st.']
+    assert {canonicalize_address(v) for v in variants} == {'123 MAIN ST'}
+
+def test_directionals_units_and_zip4():
+    """Test directional, unit designator and ZIP+4 normalization."""
+    a = canonicalize_address('100 North Lake Shore Drive West, Apt. #4, Destin, FL 32541-1234')
+    b = canonicalize_address('100 N Lake Shore Dr W Apartment 4, Destin, FL, 32541')
+    assert a == b == '100 N LAKE SHORE DR W APT 4, DESTIN FL 32541'
+
+def test_street_name_that_is_a_suffix_is_kept():
+    """Test that a suffix word used as the street name is not abbreviated."""
+    assert canonicalize_address('1 Park, Destin') == '1 PARK, DESTIN'
+    assert canonicalize_address('12 Lake Shore Dr') == '12 LAKE SHORE DR'
+
+def test_empty_address():
+    """Test that blank input produces an empty key."""
+    assert canonicalize_address('  , ') == ''
+    assert canonicalize_address(None) == ''
+
+def test_dedup_report():
+    """Test the deduplication summary."""
+    report = dedup_report(['123 Main St', '123 Main Street', '9 Oak Ave', ''])
+    assert report['unique_stripped'] == 3
+    assert report['unique_canonical'] == 2
+    assert report['keys_saved'] == 1
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.services.aggregation import grouped_stats, stats_by_label
+
+@pytest.fixture
+def sample():
+    """Random contributions in five groups, with NaNs and ungrouped rows."""
+    rng = np.random.default_rng(0)
+    groups = rng.integers(-1, 5, 2000)
+    values = rng.lognormal(6, 1, 2000)
+    values[::37] = np.nan
+    return groups, values
+
+def expected(groups, values):
+    frame = pd.DataFrame({'group': groups, 'value': values})
+    return frame[frame['group'] >= 0].groupby('group')['value']
+
+def test_exact_stats_match_pandas(sample):
+    """Test every exact statistic against a pandas groupby."""
+    groups, values = sample
+    stats = grouped_stats(groups, values, 5, quantiles=(0.25, 0.5, 0.9))
+    by_group = expected(groups, values)
+    assert np.array_equal(stats['count'], by_group.size().to_numpy())
+    assert np.array_equal(stats['valued'], by_group.count().to_numpy())
+    assert np.allclose(stats['sum'], by_group.sum().to_numpy())
+    assert np.allclose(stats['mean'], by_group.mean().to_numpy())
+    assert np.allclose(stats['var'], by_group.var().to_numpy())
+    assert np.allclose(stats['min'], by_group.min().to_numpy())
+    assert np.allclose(stats['max'], by_group.max().to_numpy())
+    for q in (0.25, 0.5, 0.9):
+        assert np.allclose(stats['quantiles'][q], by_group.quantile(q).to_numpy())
+
+def test_presorted_values_give_the_same_result(sample):
+    """Test that a shared value order changes nothing but the cost."""
+    groups, values = sample
+    order = np.argsort(values)
+    plain = grouped_stats(groups, values, 5)
+    presorted = grouped_stats(groups, values, 5, value_order=order)
+    for name in ('min', 'max'):
+        assert np.array_equal(plain[name], presorted[name])
+    assert np.allclose(plain['quantiles'][0.5], presorted['quantiles'][0.5])
+
+def test_approximate_quantiles_are_close(sample):
+    """Test histogram quantiles against exact ones."""
+    groups, values = sample
+    exact = grouped_stats(groups, values, 5, quantiles=(0.5, 0.9))
+    approximate = grouped_stats(groups, values, 5, quantiles=(0.5, 0.9), approximate=True)
+    assert np.array_equal(exact['min'], approximate['min'])
+    for q in (0.5, 0.9):
+        spread = exact['max'] - exact['min']
+        assert (np.abs(exact['quantiles'][q] - approximate['quantiles'][q]) <= spread / 100).all()
+
+def test_components_and_labels():
+    """Test component sums, empty groups and conversion to labelled records."""
+    groups = np.array([0, 0, 1, -1])
+    values = np.array([10.0, 30.0, 5.0, 99.0])
+    csa = np.array([1.0, np.nan, 2.0, 50.0])
+    stats = grouped_stats(groups, values, 3, components={'csa': csa})
+    records = stats_by_label(stats, ['north', 'east', 'south'])
+    assert records['north']['median'] == 20.0
+    assert records['north']['components'] == {'csa': 1.0}
+    assert records['south']['count'] == 0 and records['south']['mean'] == 0.0
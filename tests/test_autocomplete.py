@@ -0,0 +1,90 @@
+import time
+import numpy as np
+from flask import Flask
+from app.services.autocomplete import AddressAutocomplete, AddressPrefixIndex
+
+def entry(key, precision='street', lat=30.4, lng=-86.5):
+    return {'key': key, 'address': key.title(), 'lat': lat, 'lng': lng,
+            'precision': precision, 'source': 'test'}
+
+def test_prefix_matches_canonical_and_street_name():
+    """Test that prefixes match with and without the house number."""
+    index = AddressPrefixIndex([
+        entry('39 EAGLE HAVEN DR, SANTA ROSA BEACH FL 32459'),
+        entry('1222 DEERWOOD DR, MIRAMAR BEACH FL 32550'),
+    ])
+    assert [s['key'] for s in index.suggest('39 eagle haven drive')] == \
+        ['39 EAGLE HAVEN DR, SANTA ROSA BEACH FL 32459']
+    assert len(index.suggest('Deerwood')) == 1
+    assert index.suggest('40 Eagle') == []
+
+def test_street_level_entry_wins_over_centroid():
+    """Test that a street-level result replaces a centroid for the same address."""
+    index = AddressPrefixIndex([
+        entry('1 MAIN ST, DESTIN FL 32541', precision='zip', lat=1),
+        entry('1 MAIN ST, DESTIN FL 32541', precision='street', lat=2),
+    ])
+    assert index.suggest('1 Main')[0]['lat'] == 2
+
+def test_suggest_is_fast_on_large_index():
+    """Test that a lookup over 100k addresses takes well under a millisecond."""
+    index = AddressPrefixIndex(entry(f'{n} OAK ST, DESTIN FL 32541') for n in range(100000))
+    start = time.perf_counter()
+    for _ in range(100):
+        suggestions = index.suggest('4711 Oak', limit=10)
+    elapsed = (time.perf_counter() - start) / 100
+    assert suggestions[0]['key'] == '4711 OAK ST, DESTIN FL 32541'
+    assert elapsed < 0.001
+
+class FakeGeocoder:
+    def __init__(self):
+        self.entries = []
+        self.reads = 0
+
+    def cache_size(self):
+        return len(self.entries)
+
+    def cached_addresses(self):
+        self.reads += 1
+        return iter(list(self.entries))
+
+class FakeDataset(dict):
+    def __init__(self, version, keys):
+        super().__init__(
+            address_key=np.array(keys), address=np.array([k.title() for k in keys]),
+            latitude=np.array([30.4, np.nan, 30.4][:len(keys)]), longitude=np.full(len(keys), -86.5),
+            geo_precision=np.array(['street'] * len(keys))
+        )
+        self.version = version
+        self.reads = 0
+
+    def __getitem__(self, column):
+        self.reads += 1
+        return super().__getitem__(column)
+
+def test_refresh_rebuilds_in_background_and_serves_old_index():
+    """Test that cache growth does not rebuild per request and new versions swap in when ready."""
+    app = Flask(__name__)
+    app.config['AUTOCOMPLETE_REFRESH_SECONDS'] = 3600
+    geocoder, autocomplete = FakeGeocoder(), AddressAutocomplete()
+    # The second household has no coordinates, the third no address
+    first = FakeDataset('v1', ['1 MAIN ST, DESTIN FL 32541', '2 OAK AVE, DESTIN FL 32541', ''])
+    with app.app_context():
+        index = autocomplete.refresh(geocoder, first)
+        assert len(index.suggest('1 Main')) == 1 and index.suggest('2 Oak') == []
+        reads = first.reads
+
+        # New cache entries within the refresh interval keep the current index
+        for n in range(50):
+            geocoder.entries.append(entry(f'{n} PINE RD, DESTIN FL 32541'))
+            assert autocomplete.refresh(geocoder, first) is index
+        assert geocoder.reads == 1
+
+        # A new dataset version is indexed in the background; the same version is not re-read
+        second = FakeDataset('v2', ['3 ELM ST, DESTIN FL 32541'])
+        assert autocomplete.refresh(geocoder, second) is index
+        autocomplete._thread.join()
+        assert autocomplete.suggest('3 Elm')[0]['source'] == 'dataset'
+        assert len(autocomplete.suggest('49 Pine')) == 1
+        assert autocomplete.refresh(geocoder, second) is not index
+        assert first.reads == reads and geocoder.reads == 2
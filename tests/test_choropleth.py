@@ -0,0 +1,100 @@
+import json
+import os
+import numpy as np
+import pytest
+from flask import Flask
+from app.api import bp, routes
+from app.services.cube import grid_cells
+from app.services.dataset import DatasetStore
+from app.services.visualization import VisualizationService
+
+PROCESSED_CSV = """address,contribution_amount,display_name,latitude,longitude,postal_code,city
+"1 Main St",500.0,carol,30.391,-86.451,32541,Destin
+"2 Oak Ave",1200.0,Alice,30.392,-86.452,32541,Destin
+"3 Pine Rd",50.0,bob,30.511,-86.391,32578,Niceville
+"4 Elm St",900.0,Dave,30.468,-86.641,32547,Fort Walton Beach
+"5 Bay Dr",100.0,Erin,,,,
+"""
+
+# Boundary for 32541 only; the other ZIPs fall back to their centroids
+BOUNDARIES = {
+    'type': 'FeatureCollection',
+    'features': [{
+        'type': 'Feature',
+        'properties': {'ZCTA5CE20': '32541'},
+        'geometry': {'type': 'Polygon',
+                     'coordinates': [[[-86.5, 30.35], [-86.4, 30.35], [-86.4, 30.45], [-86.5, 30.45], [-86.5, 30.35]]]}
+    }]
+}
+
+@pytest.fixture
+def app(tmp_path):
+    """Create an app with a published dataset and a ZIP boundary file."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    boundaries_file = tmp_path / 'zcta.geojson'
+    boundaries_file.write_text(json.dumps(BOUNDARIES))
+    app.config['CHOROPLETH_BOUNDARIES_FILE'] = str(boundaries_file)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(PROCESSED_CSV)
+    with app.app_context():
+        DatasetStore().publish(str(tmp_path / 'processed_20240101_000000.csv'))
+        yield app
+
+def test_grid_cells_aggregate_located_households():
+    """Test grid cell counts and sums, including negative coordinates."""
+    lat = np.array([30.001, 30.009, 30.011, np.nan, -0.5])
+    lng = np.array([-86.001, -86.009, -86.001, -86.0, -0.5])
+    values = np.array([1.0, 2.0, 4.0, 8.0, np.nan])
+    grid = grid_cells(lat, lng, values, 0.01)
+    cells = {(round(s, 2), round(w, 2)): (c, t) for s, w, c, t in
+             zip(grid['south'], grid['west'], grid['count'], grid['sum'])}
+    assert cells == {(30.0, -86.01): (2, 3.0), (30.01, -86.01): (1, 4.0), (-0.5, -0.5): (1, 0.0)}
+
+def test_zip_areas_use_boundaries_with_centroid_fallback(app):
+    """Test that ZIP areas are polygons when a boundary exists and centroids otherwise."""
+    service = VisualizationService()
+    areas = service.choropleth_areas(service.datasets.current(), 'zip', 'sum')
+    by_label = {f['properties']['label']: f for f in areas['features']}
+    assert by_label['32541']['geometry']['type'] == 'Polygon'
+    assert by_label['32541']['properties']['sum'] == 1700.0
+    assert by_label['32578']['geometry'] == {'type': 'Point', 'coordinates': [-86.3962, 30.5184]}
+    assert areas['unplaced'] == 1
+    assert areas['range'] == [50.0, 1700.0]
+    assert all(f['properties']['fill'].startswith('#') for f in areas['features'])
+    with pytest.raises(ValueError):
+        service.choropleth_areas(service.datasets.current(), 'county')
+
+def test_choropleth_map_renders_one_feature_per_area(app):
+    """Test rendering grid and ZIP choropleths to a map file."""
+    service = VisualizationService()
+    result = service.create_choropleth('grid', 'count', cell_degrees=0.05)
+    assert result['areas'] == result['boundaries'] == 3
+    assert result['unplaced'] == 1
+    grid_file = result['map_file']
+
+    result = service.create_choropleth('zip', 'mean')
+    assert (result['boundaries'], result['centroids']) == (1, 2)
+    with open(result['map_file']) as f:
+        assert 'Contribution mean per zip' in f.read()
+
+    # Each map keeps its own file
+    version = service.datasets.current().version
+    assert os.path.basename(grid_file) == f'choropleth_grid_0.05_count_{version}.html'
+    assert os.path.basename(result['map_file']) == f'choropleth_zip_mean_{version}.html'
+    assert os.path.exists(grid_file)
+
+    assert service.create_choropleth('zip', 'sum', analysis_id='20990101_000000') is None
+    for bad_id in ('../../etc/passwd', 'a/b', 42):
+        with pytest.raises(ValueError, match='Invalid analysis ID'):
+            service.create_choropleth('zip', 'sum', analysis_id=bad_id)
+
+def test_choropleth_route_checks_analysis_id(app, monkeypatch):
+    """Test that the route answers 400 for a malformed analysis ID and 404 for an unknown one."""
+    app.register_blueprint(bp, url_prefix='/api')
+    monkeypatch.setattr(routes, 'visualization_service', None)
+    client = app.test_client()
+    assert client.post('/api/visualization/choropleth', json={'analysis_id': '../x'}).status_code == 400
+    assert client.post('/api/visualization/choropleth', json={'analysis_id': '20990101_000000'}).status_code == 404
+    response = client.post('/api/visualization/choropleth', json={'analysis_id': '20240101_000000'})
+    assert response.status_code == 200
+    assert response.json['map_file'] == 'choropleth_zip_sum_20240101_000000.html'
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import pytest
+from flask import Flask
+from app.services.analysis import AnalysisService
+from app.services.cube import ContributionCube, band_labels, build_cube
+from app.services.visualization import VisualizationService
+
+PROCESSED_CSV = """address,contribution_amount,display_name,latitude,longitude,postal_code,city,offertory
+"1 Main St",500.0,carol,30.50,-86.50,32541,Destin,50
+"2 Oak Ave",1200.0,Alice,30.60,-86.50,32541,Destin,100
+"3 Pine Rd",50.0,bob,29.70,-86.50,32578,Niceville,
+"4 Elm St",900.0,Dave,30.80,-86.50,32578,Niceville,20
+"5 Bay Dr",,Erin,,,,,
+"""
+
+REFERENCE_POINT = {'lat': 30.0, 'lng': -86.5}
+
+@pytest.fixture
+def service(tmp_path):
+    """Create an analysis service over a small published dataset."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(PROCESSED_CSV)
+    with app.app_context():
+        service = AnalysisService()
+        assert service.load_current()
+        yield service
+
+def random_columns(count=2000):
+    rng = np.random.default_rng(0)
+    amounts = rng.uniform(0, 8000, count)
+    amounts[::11] = np.nan
+    return {
+        'contribution_amount': amounts,
+        'postal_code': rng.choice(['32541', '32578', '32547', ''], count),
+        'city': rng.choice(['Destin', 'Niceville', 'Valparaiso'], count),
+        'offertory': rng.uniform(0, 100, count)
+    }
+
+def test_band_labels():
+    """Test labels of the contribution bands."""
+    assert band_labels([100, 500]) == ['<100', '100-500', '500+']
+
+def test_rollups_match_pandas_groupby():
+    """Test roll-ups and filtered drill-downs against groupbys over the households."""
+    columns = random_columns()
+    cube = build_cube(columns, [1000, 5000], ['offertory'])
+    df = pd.DataFrame(columns)
+    df['postal_code'] = df['postal_code'].replace('', 'unknown')
+
+    rollup = cube.rollup(['postal_code'])
+    expected = df.groupby('postal_code')['contribution_amount'].agg(['size', 'sum', 'mean', 'std'])
+    for cell in rollup['cells']:
+        row = expected.loc[cell['postal_code']]
+        assert cell['count'] == row['size']
+        assert np.isclose(cell['sum'], row['sum'])
+        assert np.isclose(cell['mean'], row['mean'])
+        assert np.isclose(cell['std'], row['std'])
+    assert rollup['total']['count'] == len(df)
+    assert np.isclose(rollup['total']['components']['offertory'], df['offertory'].sum())
+
+    drill = cube.rollup(['city'], {'postal_code': ['32541']})
+    expected = df[df['postal_code'] == '32541'].groupby('city')['contribution_amount'].sum()
+    assert {cell['city']: round(cell['sum'], 6) for cell in drill['cells']} == \
+        {city: round(total, 6) for city, total in expected.items()}
+    with pytest.raises(ValueError):
+        cube.rollup(['direction'])
+
+def test_refine_and_save_round_trip(tmp_path):
+    """Test adding a dimension from row cells and reloading a saved cube."""
+    columns = random_columns()
+    cube = build_cube(columns)
+    codes = np.arange(len(columns['city'])) % 3
+    refined = cube.refine('direction', codes, ['a', 'b', 'c'], columns['contribution_amount'])
+    by_direction = {cell['direction']: cell['count'] for cell in refined.rollup(['direction'])['cells']}
+    assert by_direction == {label: int(np.count_nonzero(codes == i)) for i, label in enumerate('abc')}
+    for refined_cell, cell in zip(refined.rollup(['band'])['cells'], cube.rollup(['band'])['cells']):
+        assert (refined_cell['band'], refined_cell['count']) == (cell['band'], cell['count'])
+        assert np.isclose(refined_cell['sum'], cell['sum'])
+
+    cube.save(str(tmp_path / 'cube.npz'))
+    loaded = ContributionCube.load(str(tmp_path / 'cube.npz'))
+    assert loaded.rollup(['city', 'band']) == cube.rollup(['city', 'band'])
+
+def test_publish_saves_cube_and_service_splits_by_direction(service, tmp_path):
+    """Test the published cube, direction roll-ups and summary statistics."""
+    assert (tmp_path / 'datasets' / '20240101_000000' / 'cube.npz').exists()
+
+    by_city = service.rollup(['city'])
+    assert {cell['city']: cell['count'] for cell in by_city['cells']} == \
+        {'Destin': 2, 'Niceville': 2, 'unknown': 1}
+
+    by_direction = service.rollup(['direction'], reference_point=REFERENCE_POINT)
+    assert {cell['direction']: cell['count'] for cell in by_direction['cells']} == \
+        {'north': 3, 'south': 1, 'unlocated': 1}
+    assert service.cube(REFERENCE_POINT) is service.cube(dict(REFERENCE_POINT))
+
+    summary = service.get_summary_statistics()
+    assert summary['total_contribution'] == 2650.0
+    assert summary['median_contribution'] == 700.0
+    assert (summary['min_contribution'], summary['max_contribution']) == (50.0, 1200.0)
+    assert summary['component_totals']['offertory'] == 170.0
+
+def test_chart_data_from_cube(service):
+    """Test chart series from a roll-up and from a direction cube."""
+    visualization = VisualizationService()
+    chart = visualization.create_chart_data({'rollup': service.rollup(['band'])})
+    assert chart['band']['labels'][:2] == ['500-1000', '1000-5000']
+    assert sum(chart['band']['counts']) == 5
+
+    comparison = visualization.generate_chart_data('20240101_000000', 'direction_comparison',
+                                                   cube=service.cube(REFERENCE_POINT))
+    assert comparison['data']['north'] == 3
+
+    distribution = visualization.generate_chart_data('20240101_000000', 'income_distribution',
+                                                     cube=service.cube(REFERENCE_POINT))
+    assert set(distribution['data']) == {'count', 'sum', 'mean', 'std', 'median', 'min', 'max'}
+    assert set(distribution['data']['median']) == set(distribution['data']['count'])
+    north = {name: values['north'] for name, values in distribution['data'].items()}
+    assert (north['count'], north['median'], north['min'], north['max']) == (3, 900.0, 500.0, 1200.0)
+    assert distribution['data']['median']['south'] == 50.0
+    with pytest.raises(Exception):
+        visualization.generate_chart_data('20240101_000000', 'direction_comparison')
+    assert visualization.generate_chart_data('20240101_000000', 'city')['data']['count']['Destin'] == 2
@@ -0,0 +1,106 @@
+import os
+import pytest
+import numpy as np
+from flask import Flask
+from app.services.dataset import DatasetStore
+
+PROCESSED_CSV = """address,contribution_amount,display_name,latitude,longitude
+"1 Main St, Destin, FL, 32541",500.0,Mr. Smith,30.39,-86.49
+"2 Oak Ave, Destin, FL, 32541",1200.0,Ms. Jones,30.40,-86.47
+"""
+
+@pytest.fixture
+def store_app(tmp_path):
+    """Create a minimal app whose upload folder is a temporary directory."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['DATASET_VERSIONS_KEPT'] = 2
+    with app.app_context():
+        yield app
+
+def write_processed(folder, version, content=PROCESSED_CSV):
+    path = os.path.join(folder, f'processed_{version}.csv')
+    with open(path, 'w') as f:
+        f.write(content)
+    return path
+
+def test_publish_memory_maps_columns(store_app):
+    """Test that published columns are read back as memory maps."""
+    store = DatasetStore()
+    path = write_processed(store_app.config['UPLOAD_FOLDER'], '20250101_000000')
+    dataset = store.publish(path)
+    
+    assert dataset.version == '20250101_000000'
+    assert len(dataset) == 2
+    assert isinstance(dataset['contribution_amount'], np.memmap)
+    assert dataset['display_name'][1] == 'Ms. Jones'
+    assert store.current().version == '20250101_000000'
+
+def test_new_upload_swaps_current_version(store_app):
+    """Test that a second store (another worker) follows the pointer swap."""
+    folder = store_app.config['UPLOAD_FOLDER']
+    writer, reader = DatasetStore(), DatasetStore()
+    writer.publish(write_processed(folder, '20250101_000000'))
+    assert reader.current().version == '20250101_000000'
+    
+    writer.publish(write_processed(folder, '20250102_000000'))
+    assert reader.current().version == '20250102_000000'
+
+def test_missing_coordinates_are_nan(store_app):
+    """Test that artifacts without coordinates publish NaN columns."""
+    store = DatasetStore()
+    path = write_processed(store_app.config['UPLOAD_FOLDER'], '20250101_000000',
+                           'address,contribution_amount,display_name\n"1 Main St",10,Smith\n')
+    dataset = store.publish(path)
+    assert np.isnan(dataset['latitude']).all()
+
+def test_prune_keeps_recent_versions(store_app):
+    """Test that old versions beyond DATASET_VERSIONS_KEPT are removed."""
+    folder = store_app.config['UPLOAD_FOLDER']
+    store = DatasetStore()
+    for day in range(1, 5):
+        store.publish(write_processed(folder, f'2025010{day}_000000'))
+    
+    versions = sorted(v for v in os.listdir(store.dataset_folder) if v[0].isdigit())
+    assert versions == ['20250103_000000', '20250104_000000']
+
+def test_preload_publishes_latest_upload(store_app):
+    """Test that preload maps the newest processed file when nothing is current."""
+    folder = store_app.config['UPLOAD_FOLDER']
+    write_processed(folder, '20250101_000000')
+    write_processed(folder, '20250102_000000')
+    dataset = DatasetStore().preload()
+    assert dataset.version == '20250102_000000'
+
+def test_components_read_from_family_info_of_older_artifacts(store_app):
+    """Test that artifacts without component columns take them from family_info."""
+    path = os.path.join(store_app.config['UPLOAD_FOLDER'], 'processed_20250101_000000.csv')
+    info = '"{""contributions"": {""taxable_donations"": 100.0, ""csa"": 25.0, ""offertory"": 5.0}}"'
+    with open(path, 'w') as f:
+        f.write(f'address,contribution_amount,family_info\n"1 Main St",130.0,{info}\n"2 Oak Ave",0.0,\n')
+    dataset = DatasetStore().publish(path)
+    assert dataset['taxable_donations'][0] == 100.0
+    assert dataset['csa'][0] == 25.0
+    assert np.isnan(dataset['offertory'][1])
+
+def test_family_info_materialized_for_requested_rows(store_app):
+    """Test that household details come from typed columns, including older artifacts."""
+    path = os.path.join(store_app.config['UPLOAD_FOLDER'], 'processed_20250101_000000.csv')
+    with open(path, 'w') as f:
+        f.write('record_id,address,contribution_amount,csa,display_name,family_name,salutation\n'
+                '7,"1 Main St",130.0,25.0,Mr. Smith,Smith,Dear John\n'
+                '8,"2 Oak Ave",0.0,,Ms. Jones,Jones,\n')
+    dataset = DatasetStore().publish(path)
+    assert dataset['salutation'].dtype.kind == 'U'
+    [info] = dataset.family_info([1])
+    assert info['record_id'] == '8'
+    assert info['family_name'] == 'Jones'
+    assert info['salutation'] == ''
+    assert info['contributions'] == {'taxable_donations': None, 'csa': None, 'offertory': None}
+    assert dataset.family_info([0])[0]['contributions']['csa'] == 25.0
+
+    info = '"{""salutation"": ""Dear Ann"", ""formal_addressee"": ""Mrs. Ann Gray""}"'
+    with open(path, 'w') as f:
+        f.write(f'address,contribution_amount,family_info\n"1 Main St",130.0,{info}\n')
+    dataset = DatasetStore().publish(path, '20250101_000000.001')
+    assert dataset.family_info([0])[0]['formal_addressee'] == 'Mrs. Ann Gray'
@@ -0,0 +1,55 @@
+import gzip
+import json
+import pytest
+from flask import Flask
+from app.api.encoding import dumps, json_response, negotiate_encoding
+from app.services.analysis import points_as_columns, points_as_rows
+
+FIELDS = {
+    'lat': [30.1, 30.2, 30.3],
+    'lng': [-86.1, -86.2, -86.3],
+    'direction': ['north', 'east', 'north'],
+    'contribution': [100.0, 200.0, 300.0],
+    'display_name': ['A', 'B', 'C'],
+}
+
+@pytest.fixture
+def app():
+    """Create a minimal app with a low compression threshold."""
+    app = Flask(__name__)
+    app.config['API_COMPRESS_MIN_SIZE'] = 10
+
+    @app.route('/payload')
+    def payload():
+        return json_response({'points': points_as_rows(**FIELDS)})
+
+    return app
+
+def test_columnar_points_round_trip_to_rows():
+    """Test that the columnar payload decodes to the same points."""
+    columns = json.loads(dumps(points_as_columns(**FIELDS)))
+    assert columns['directions'] == ['east', 'north']
+    assert columns['direction'] == [1, 0, 1]
+    rows = [
+        {'lat': la, 'lng': ln, 'direction': columns['directions'][d], 'contribution': c, 'display_name': n}
+        for la, ln, d, c, n in zip(columns['lat'], columns['lng'], columns['direction'],
+                                   columns['contribution'], columns['display_name'])
+    ]
+    assert rows == points_as_rows(**FIELDS)
+
+def test_negotiate_encoding():
+    """Test Accept-Encoding parsing, including q=0 refusals."""
+    assert negotiate_encoding('gzip, deflate') == 'gzip'
+    assert negotiate_encoding('gzip;q=0, deflate') == 'identity'
+    assert negotiate_encoding('') == 'identity'
+
+def test_json_response_is_gzipped_on_request(app):
+    """Test that responses are compressed only when the client asks."""
+    client = app.test_client()
+    plain = client.get('/payload')
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.headers['Vary'] == 'Accept-Encoding'
+
+    compressed = client.get('/payload', headers={'Accept-Encoding': 'gzip'})
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
@@ -0,0 +1,65 @@
+import csv
+import io
+import json
+import numpy as np
+import pytest
+from flask import Flask, Response, stream_with_context
+from app.services.dataset import DatasetStore
+from app.services.export import StreamingExporter, normalize_format
+
+PROCESSED_CSV = """address,contribution_amount,display_name,latitude,longitude
+"1 Main St, Destin, FL, 32541",500.0,Mr. Smith,30.39,-86.49
+"2 Oak Ave, Destin, FL, 32541",1200.0,Ms. Jones,,
+"3 Pine Rd, Destin, FL, 32541",800.0,Dr. Brown,30.41,-86.46
+"""
+
+COLUMNS = ['address', 'latitude', 'contribution_amount']
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Publish a small processed upload into a temporary dataset store."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    processed = tmp_path / 'processed_20240101_000000.csv'
+    processed.write_text(PROCESSED_CSV)
+    with app.app_context():
+        yield DatasetStore().publish(str(processed))
+
+def test_csv_export_is_chunked_per_batch(dataset):
+    """Test that CSV rows are written in batches and NaN becomes empty."""
+    chunks = list(StreamingExporter(dataset, COLUMNS, batch_size=2).stream('csv'))
+    assert len(chunks) == 2
+    rows = list(csv.reader(io.StringIO(b''.join(chunks).decode())))
+    assert rows[0] == COLUMNS
+    assert rows[2] == ['2 Oak Ave, Destin, FL, 32541', '', '1200.0']
+    assert len(rows) == 4
+
+def test_ndjson_export_of_selected_rows(dataset):
+    """Test that an export of selected rows carries aligned extra columns."""
+    exporter = StreamingExporter(
+        dataset, COLUMNS + ['direction'], rows=np.array([2, 1]),
+        extra_columns={'direction': np.array(['north', 'east'])}
+    )
+    records = [json.loads(line) for line in b''.join(exporter.stream('json')).splitlines()]
+    assert [r['direction'] for r in records] == ['north', 'east']
+    assert records[0]['contribution_amount'] == 800.0
+    assert records[1]['latitude'] is None
+
+def test_unknown_format_is_rejected_before_streaming(dataset):
+    """Test that invalid formats fail eagerly."""
+    with pytest.raises(ValueError):
+        StreamingExporter(dataset, COLUMNS).stream('docx')
+    assert normalize_format('JSONL') == 'ndjson'
+
+def test_export_streams_through_response(dataset):
+    """Test that an export can be served with chunked transfer."""
+    app = Flask(__name__)
+
+    @app.route('/export')
+    def export():
+        chunks = StreamingExporter(dataset, COLUMNS, batch_size=1).stream('csv')
+        return Response(stream_with_context(chunks), mimetype='text/csv')
+
+    response = app.test_client().get('/export')
+    assert response.is_streamed
+    assert response.data.decode().count('\n') == 4
@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+from flask import Flask
+from app.services.analysis import AnalysisService
+from app.services.filters import FilterContext, MaskCache, compile_filters
+
+PROCESSED_CSV = """address,contribution_amount,taxable_donations,csa,offertory,display_name,latitude,longitude,postal_code,city,statement_type
+"1 Main St",500.0,400.0,100.0,0.0,Mr. Carol Smith,30.50,-86.50,32541,Destin,Family
+"2 Oak Ave",1200.0,1000.0,200.0,0.0,Alice Jones,30.00,-86.00,32541-1234,Destin,Individual
+"3 Pine Rd",50.0,50.0,0.0,0.0,Bob Smithers,29.50,-86.50,32578,Niceville,Family
+"4 Elm St",900.0,0.0,900.0,0.0,Dave Brown,30.00,-87.00,32547,Fort Walton Beach,
+"5 Bay Dr",,,,,Erin Gray,,,,,Family
+"""
+
+REFERENCE_POINT = {'lat': 30.0, 'lng': -86.5}
+
+@pytest.fixture
+def service(tmp_path):
+    """Create an analysis service over a small processed upload."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(PROCESSED_CSV)
+    with app.app_context():
+        service = AnalysisService()
+        assert service.load_current()
+        yield service
+
+def names(service, filters, reference_point=None):
+    mask, _ = service.filter_mask(filters, reference_point)
+    return sorted(str(name) for name in np.asarray(service._dataset['display_name'])[mask])
+
+def test_predicates(service):
+    """Test each predicate kind over the columnar dataset."""
+    assert names(service, {'contribution': {'min': 500, 'max': 1000}}) == ['Dave Brown', 'Mr. Carol Smith']
+    assert names(service, {'csa': 200}) == ['Alice Jones', 'Dave Brown']
+    assert names(service, {'zip': '32541'}) == ['Alice Jones', 'Mr. Carol Smith']
+    assert names(service, {'city': ['destin', 'NICEVILLE']}) == ['Alice Jones', 'Bob Smithers', 'Mr. Carol Smith']
+    assert names(service, {'statement_type': 'family'}) == ['Bob Smithers', 'Erin Gray', 'Mr. Carol Smith']
+    assert names(service, {'name': 'SMITH'}) == ['Bob Smithers', 'Mr. Carol Smith']
+    assert names(service, {'direction': ['east']}, REFERENCE_POINT) == ['Alice Jones']
+    assert names(service, {'sector': {'from': 315, 'to': 45}}, REFERENCE_POINT) == ['Mr. Carol Smith']
+    assert names(service, {'radius': {'km': 50, 'center': {'lat': 30.0, 'lng': -86.0}}}) == ['Alice Jones']
+    assert names(service, {'radius': {'km': 60, 'min_km': 1}}, REFERENCE_POINT) == \
+        ['Alice Jones', 'Bob Smithers', 'Dave Brown', 'Mr. Carol Smith']
+    square = {'type': 'Polygon', 'coordinates': [[[-86.6, 29.9], [-85.9, 29.9], [-85.9, 30.6], [-86.6, 30.6], [-86.6, 29.9]]]}
+    assert names(service, {'polygon': square}) == ['Alice Jones', 'Mr. Carol Smith']
+
+def test_combinators(service):
+    """Test implicit and explicit all, any and not."""
+    assert names(service, {'zip': '32541', 'contribution': {'max': 1000}}) == ['Mr. Carol Smith']
+    assert names(service, {'any': [{'city': 'Niceville'}, {'contribution': 1000}]}) == ['Alice Jones', 'Bob Smithers']
+    assert names(service, {'not': {'statement_type': 'Family'}}) == ['Alice Jones', 'Dave Brown']
+    assert names(service, [{'name': 'smith'}, {'not': {'zip': '32578'}}]) == ['Mr. Carol Smith']
+    assert names(service, {'zip': ['32541-1234', ' 32547-0001 ']}) == ['Alice Jones', 'Dave Brown', 'Mr. Carol Smith']
+
+def test_invalid_filters():
+    """Test that malformed filters are rejected when compiled."""
+    for spec in ({}, {'colour': 'red'}, {'contribution': {'above': 3}}, {'any': []},
+                 {'sector': {'from': 10}}, {'name': ' '}, {'polygon': {'type': 'Point'}}):
+        with pytest.raises(ValueError):
+            compile_filters(spec)
+
+class Columns(dict):
+    """A bare column mapping, as datasets other than published uploads provide."""
+    version = 'columns'
+
+def test_filters_on_missing_columns_are_rejected():
+    """Test that set and range predicates both raise ValueError when their column is absent."""
+    context = FilterContext(Columns(contribution_amount=np.array([500.0])), MaskCache())
+    for spec in ({'statement_type': 'family'}, {'csa': {'min': 1}}):
+        with pytest.raises(ValueError, match='Column not available'):
+            compile_filters(spec).evaluate(context)
+
+def test_sub_masks_are_memoized_per_dataset(service):
+    """Test that overlapping queries reuse predicate and sub-expression masks."""
+    _, steps = service.filter_mask({'zip': '32541', 'name': 'smith'})
+    assert [step['cached'] for step in steps] == [False, False, False]
+
+    # Same predicates in a different order, plus a new one
+    _, steps = service.filter_mask({'all': [{'name': 'smith'}, {'zip': '32541'}], 'csa': 100})
+    assert [(step['step'], step['cached']) for step in steps] == [('all', True), ('csa', False), ('all', False)]
+
+    mask, _ = service.filter_mask({'zip': '32541'})
+    assert not mask.flags.writeable
+    with pytest.raises(ValueError):
+        service.filter_mask({'direction': ['north']})
+
+def test_query_and_filtered_analyses(service):
+    """Test filter queries, paging their results and filters on analyses and top-k."""
+    result = service.query({'statement_type': 'family', 'contribution': {'min': 0}}, REFERENCE_POINT, explain=True)
+    assert result['matched'] == 2
+    assert result['contribution_stats']['sum'] == 550.0
+    assert len(result['plan']) == 3
+    page = service.result_page(result['result_id'])
+    assert [p['display_name'] for p in page['points']] == ['Mr. Carol Smith', 'Bob Smithers']
+    assert [p['direction'] for p in page['points']] == ['north', 'south']
+
+    analysis = service.analyze_directions(REFERENCE_POINT, ['north', 'south', 'east', 'west'],
+                                          filters={'name': 'smith'})
+    assert analysis['stats']['records_analyzed'] == 2
+    assert analysis['result_id'] != service.analyze_directions(REFERENCE_POINT, ['north'])['result_id']
+
+    top = service.top_k(5, filters={'zip': ['32541', '32547']})
+    assert [p['display_name'] for p in top['points']] == ['Alice Jones', 'Dave Brown', 'Mr. Carol Smith']
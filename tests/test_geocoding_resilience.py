@@ -0,0 +1,116 @@
+import pytest
+from types import SimpleNamespace
+from flask import Flask
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut
+from app.services.geocoding import GeocodingService
+from app.services.resilience import (
+    RetryPolicy, CircuitBreaker, ProviderUnavailableError, CircuitOpenError
+)
+
+class StubProvider:
+    """Local provider that times out a set number of times before answering."""
+    def __init__(self, timeouts=0, known=None):
+        self.timeouts = timeouts
+        self.known = known or {}
+        self.calls = 0
+    
+    def geocode(self, address):
+        self.calls += 1
+        if self.timeouts:
+            self.timeouts -= 1
+            raise GeocoderTimedOut('stub timeout')
+        lat_lng = self.known.get(address)
+        if lat_lng is None:
+            return None
+        return SimpleNamespace(latitude=lat_lng[0], longitude=lat_lng[1], address=address, raw={})
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def service(tmp_path):
+    """Create a geocoding service wired to a stub provider and no real sleeping."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        service = GeocodingService()
+        service._retry = RetryPolicy(max_attempts=3, base_delay=1, sleep=lambda s: None)
+        service._breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=FakeClock())
+        yield service
+
+def test_retry_policy_backoff_is_bounded_and_jittered():
+    """Test that delays grow exponentially, are capped and scaled by jitter."""
+    policy = RetryPolicy(max_attempts=5, base_delay=1, max_delay=3, jitter=lambda: 0.5)
+    assert list(policy.delays()) == [0.5, 1.0, 1.5, 1.5]
+
+def test_retries_recover_from_transient_timeouts(service):
+    """Test that a timeout followed by success returns the result."""
+    service._provider = StubProvider(timeouts=2, known={'1 MAIN ST, DESTIN FL 32541': (30.4, -86.5)})
+    result = service.geocode_address('1 Main Street, Destin, FL 32541')
+    assert result['lat'] == 30.4
+    assert service._provider.calls == 3
+
+def test_retries_are_bounded(service):
+    """Test that a provider that always times out gives up instead of recursing."""
+    service._provider = StubProvider(timeouts=100)
+    with pytest.raises(ProviderUnavailableError):
+        service.geocode('1 MAIN ST')
+    assert service._provider.calls == 3
+
+def test_circuit_opens_and_fails_fast(service):
+    """Test that calls are refused while the circuit is open, then retried half-open."""
+    service._provider = StubProvider(timeouts=100)
+    with pytest.raises(ProviderUnavailableError):
+        service.geocode('1 MAIN ST')
+    assert service.breaker.state == CircuitBreaker.OPEN
+    
+    with pytest.raises(CircuitOpenError):
+        service.geocode('2 MAIN ST')
+    assert service._provider.calls == 3
+    
+    service.breaker._clock.now += 30
+    service._provider.timeouts = 0
+    assert service.geocode('3 MAIN ST') is None
+    assert service.breaker.state == CircuitBreaker.CLOSED
+
+def test_non_retryable_error_ends_half_open_trial():
+    """Test that an error outside retry_on during the trial reopens the circuit instead of wedging it."""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=clock)
+    policy = RetryPolicy(max_attempts=1, sleep=lambda s: None)
+    breaker.record_failure()
+    clock.now += 30
+
+    def rate_limited():
+        raise GeocoderRateLimited('stub rate limit')
+    with pytest.raises(GeocoderRateLimited):
+        policy.call(rate_limited, retry_on=(GeocoderTimedOut,), breaker=breaker)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now += 30
+    assert policy.call(lambda: 'ok', retry_on=(GeocoderTimedOut,), breaker=breaker) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_outage_falls_back_to_zip_without_negative_caching(service):
+    """Test that an outage yields a ZIP centroid and leaves the address retryable."""
+    service._provider = StubProvider(timeouts=100)
+    result = service.geocode_address('1 Main St, Destin, FL 32541')
+    assert result['precision'] == 'zip'
+    assert not service._is_known_failure('1 MAIN ST, DESTIN FL 32541')
+
+def test_unresolvable_addresses_are_negatively_cached(service):
+    """Test that an address the provider cannot resolve is not retried within the TTL."""
+    service._provider = StubProvider()
+    service.geocode_address('99 Nowhere Rd, Destin, FL 32541')
+    service.geocode_address('99 Nowhere Road, Destin, FL 32541')
+    assert service._provider.calls == 1
+    
+    # The negative cache survives a restart but expires after its TTL
+    restarted = GeocodingService()
+    restarted._ensure_cache_loaded()
+    assert restarted._is_known_failure('99 NOWHERE RD, DESTIN FL 32541')
+    restarted._failures['99 NOWHERE RD, DESTIN FL 32541'] = 0
+    assert not restarted._is_known_failure('99 NOWHERE RD, DESTIN FL 32541')
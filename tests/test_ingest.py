@@ -0,0 +1,34 @@
+import os
+import pytest
+from app.services.ingest import ingest_csv, row_aligned_ranges
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'jk-st-rita.csv')
+
+def test_ranges_split_on_row_boundaries_outside_quotes(tmp_path):
+    """Test that byte ranges never split a row, even one with a quoted newline."""
+    path = tmp_path / 'quoted.csv'
+    rows = [b'a,b\n'] + [b'%d,"line one\nline ""two"""\n' % i for i in range(50)]
+    path.write_bytes(b''.join(rows))
+    ranges = row_aligned_ranges(str(path), len(rows[0]), 7)
+    data = path.read_bytes()
+    assert ranges[0][0] == len(rows[0]) and ranges[-1][1] == len(data)
+    assert all(hi == lo for (_, hi), (lo, _) in zip(ranges, ranges[1:]))
+    starts = {len(b''.join(rows[:i])) for i in range(1, len(rows))}
+    assert len(ranges) > 1 and all(lo in starts for lo, _ in ranges)
+
+def test_parallel_ingestion_matches_serial(tmp_path):
+    """Test that chunked, multi-process ingestion writes the same file and summary."""
+    serial = ingest_csv(SAMPLE_CSV, str(tmp_path / 'serial.csv'))
+    parallel = ingest_csv(SAMPLE_CSV, str(tmp_path / 'parallel.csv'), workers=2, chunk_bytes=40000)
+    assert serial['chunks'] == 1 and parallel['chunks'] > 2
+    assert (tmp_path / 'serial.csv').read_bytes() == (tmp_path / 'parallel.csv').read_bytes()
+    assert {k: v for k, v in parallel.items() if k != 'chunks'} == {k: v for k, v in serial.items() if k != 'chunks'}
+    assert serial['total_records'] == 1129
+    assert sorted(os.listdir(tmp_path)) == ['parallel.csv', 'serial.csv']
+
+def test_missing_columns_are_rejected(tmp_path):
+    """Test that the header is validated before any chunk is processed."""
+    path = tmp_path / 'bad.csv'
+    path.write_text('name,value\nJohn,100\n')
+    with pytest.raises(ValueError, match='Missing required columns'):
+        ingest_csv(str(path), str(tmp_path / 'out.csv'))
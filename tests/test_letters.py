@@ -0,0 +1,110 @@
+import os
+import re
+import pytest
+from flask import Flask
+from reportlab.pdfgen.canvas import Canvas
+from app.services.analysis import AnalysisService
+from app.services.letters import address_lines, template_fields
+from app.services.pdfconcat import PdfConcatenator
+from app.services.reporting import ReportingService
+
+# Optional: a real PDF reader to check the merged output
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+PROCESSED_CSV = """record_id,address,contribution_amount,taxable_donations,csa,offertory,display_name,latitude,longitude,postal_code,city,family_name,salutation,formal_addressee
+1,"1 Main St, Destin, FL, 32541",500.0,400.0,100.0,0.0,Mr. Carol Smith,30.50,-86.50,32541,Destin,Smith,Carol,Mr. Carol Smith
+2,"2 Oak Ave, Apt 4, Destin, FL, 32541",1200.0,1000.0,200.0,0.0,Alice Jones,30.00,-86.00,32541,Destin,Jones,,
+3,"3 Pine Rd, Niceville, FL, 32578",50.0,50.0,0.0,0.0,Bob Smithers,29.50,-86.50,32578,Niceville,Smithers,Bob & Ann,Mr. and Mrs. Bob Smithers
+4,"4 Elm St, Fort Walton Beach, FL, 32547",900.0,0.0,900.0,0.0,Dave Brown,30.00,-87.00,32547,Fort Walton Beach,Brown,Dave,Mr. Dave Brown
+5,"5 Bay Dr, Destin, FL, 32541",75.0,75.0,0.0,0.0,Erin Gray,30.40,-86.40,32541,Destin,Gray,Erin,Ms. Erin Gray
+"""
+
+def _shard(path, labels):
+    canvas = Canvas(str(path), pageCompression=0)
+    for label in labels:
+        canvas.drawString(72, 720, f'Page {label}')
+        canvas.showPage()
+    canvas.save()
+
+def test_concatenated_pdf_keeps_every_page_in_order(tmp_path):
+    """Test that shards are merged into one valid PDF with the pages in shard order."""
+    _shard(tmp_path / 'a.pdf', [0, 1, 2])
+    _shard(tmp_path / 'b.pdf', [3])
+    _shard(tmp_path / 'c.pdf', [4, 5])
+    output = PdfConcatenator(str(tmp_path / 'all.pdf'), title='Letters')
+    assert [output.append(str(tmp_path / name)) for name in ('a.pdf', 'b.pdf', 'c.pdf')] == [3, 1, 2]
+    output.close()
+    with pytest.raises(FileExistsError):
+        PdfConcatenator(str(tmp_path / 'all.pdf'))
+
+    data = (tmp_path / 'all.pdf').read_bytes()
+    assert re.search(rb'/Count 6 /Type /Pages', data)
+    positions = [data.index(b'(Page %d)' % i) for i in range(6)]
+    assert positions == sorted(positions)
+
+    # Every xref entry points at its object, and every reference resolves
+    xref = int(re.search(rb'startxref\n(\d+)', data).group(1))
+    size = int(re.search(rb'/Size (\d+)', data).group(1))
+    entries = data[xref:].split(b'\n')[3:2 + size]
+    for number, entry in enumerate(entries, start=1):
+        assert data[int(entry[:10]):].startswith(b'%d 0 obj' % number)
+    assert all(0 < int(n) < size for n in re.findall(rb'(\d+) 0 R', data))
+
+@pytest.mark.skipif(pypdf is None, reason='pypdf is not installed')
+def test_concatenated_pdf_opens_in_a_pdf_reader(tmp_path):
+    """Test the merged file with a real PDF reader: page count, page text and title."""
+    _shard(tmp_path / 'a.pdf', [0, 1])
+    _shard(tmp_path / 'b.pdf', [2, 3, 4])
+    output = PdfConcatenator(str(tmp_path / 'all.pdf'), title='Letters')
+    output.append(str(tmp_path / 'a.pdf'))
+    output.append(str(tmp_path / 'b.pdf'))
+    output.close()
+
+    reader = pypdf.PdfReader(str(tmp_path / 'all.pdf'), strict=True)
+    assert len(reader.pages) == output.pages == 5
+    assert [page.extract_text().strip() for page in reader.pages] == [f'Page {i}' for i in range(5)]
+    assert reader.metadata.title == 'Letters'
+
+def test_letters_for_every_selected_household(tmp_path):
+    """Test sharded rendering into one PDF, serially and with a process pool."""
+    app = Flask(__name__)
+    app.config.update(UPLOAD_FOLDER=str(tmp_path), REPORT_FOLDER=str(tmp_path), LETTERS_SHARD_SIZE=2)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(PROCESSED_CSV)
+    with app.app_context():
+        analysis = AnalysisService()
+        assert analysis.load_current()
+        result_id = analysis.query({'city': 'destin'})['result_id']
+        results = analysis.get_analysis_results(result_id)
+        reporting = ReportingService()
+
+        report_files = set()
+        for workers in (1, 2, 2):
+            app.config['LETTERS_WORKERS'] = workers
+            summary = reporting.generate_letters(result_id, results)
+            report_files.add(summary['report_file'])
+            assert (summary['letters'], summary['pages'], summary['shards']) == (3, 3, 2)
+            assert summary['workers'] == workers and summary['truncated'] == 0
+            assert summary['pages_per_second'] > 0
+            letters = tmp_path / os.path.basename(summary['report_file'])
+            assert re.search(rb'/Count 3 /Type /Pages', letters.read_bytes())
+            if pypdf is not None:
+                texts = [page.extract_text() for page in pypdf.PdfReader(str(letters), strict=True).pages]
+                assert [text.split('\n')[1] for text in texts] == ['Mr. Carol Smith', 'Alice Jones', 'Ms. Erin Gray']
+                assert 'Dear Carol,' in texts[0] and '$1,200.00' in texts[1]
+            os.remove(letters)
+        assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+        assert len(report_files) == 3
+
+        with pytest.raises(ValueError, match='Unknown letter fields: pledge'):
+            reporting.generate_letters(result_id, results, 'Dear {salutation}, you pledged {pledge}.')
+
+def test_template_fields_and_address_lines():
+    """Test template validation and splitting processed addresses into mailing lines."""
+    assert template_fields('Dear {salutation}, thank you for {contribution}.') == ['salutation', 'contribution']
+    with pytest.raises(ValueError):
+        template_fields('Dear {salutation')
+    assert address_lines('2 Oak Ave, Apt 4, Destin, FL, 32541') == ['2 Oak Ave', 'Apt 4', 'Destin, FL 32541']
+    assert address_lines('Destin, FL') == ['Destin, FL']
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+from app.services.local_geocoding import get_zip_index, extract_postal_code
+
+def test_lookup_zip_centroid():
+    """Test single ZIP lookup against the bundled table."""
+    result = get_zip_index().lookup('32459')
+    assert result['precision'] == 'zip'
+    assert abs(result['lat'] - 30.36) < 0.1
+    assert abs(result['lng'] + 86.16) < 0.1
+
+def test_lookup_many_handles_zip4_and_invalid():
+    """Test vectorized lookup of ZIP+4, unknown and malformed codes."""
+    lat, lng, found = get_zip_index().lookup_many(pd.Series(['32550-1234', '00000', 'abc', None]))
+    assert found.tolist() == [True, False, False, False]
+    assert np.isnan(lat[1:]).all()
+
+def test_locate_many_falls_back_to_city():
+    """Test that unknown ZIPs resolve to the city centroid."""
+    lat, lng, precision = get_zip_index().locate_many(
+        pd.Series(['32541', '99999', '']),
+        pd.Series(['Destin', 'Destin', 'Nowhere']),
+        pd.Series(['FL', 'FL', 'ZZ'])
+    )
+    assert precision.tolist() == ['zip', 'city', 'none']
+    assert abs(lat[1] - 30.39) < 0.1
+
+def test_extract_postal_code():
+    """Test ZIP extraction from a combined address."""
+    assert extract_postal_code('39 Eagle Haven Dr, Santa Rosa Beach, FL, 32459-8384') == '32459'
+    assert extract_postal_code('123 Main St') is None
@@ -0,0 +1,130 @@
+import numpy as np
+import pytest
+from flask import Flask
+from app.services.analysis import AnalysisService
+from app.services.pagination import decode_cursor, encode_cursor, stable_order, top_k_rows
+
+PROCESSED_CSV = """address,contribution_amount,display_name,latitude,longitude
+"1 Main St",500.0,carol,30.50,-86.50
+"2 Oak Ave",1200.0,Alice,30.60,-86.50
+"3 Pine Rd",500.0,bob,30.70,-86.50
+"4 Elm St",900.0,Dave,30.80,-86.50
+"5 Bay Dr",100.0,Erin,,
+"""
+
+REFERENCE_POINT = {'lat': 30.0, 'lng': -86.5, 'threshold': 0}
+
+@pytest.fixture
+def service(tmp_path):
+    """Create an analysis service over a small published dataset."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(PROCESSED_CSV)
+    with app.app_context():
+        service = AnalysisService()
+        assert service.load_current()
+        yield service
+
+def walk(service, result_id, sort, limit):
+    """Follow cursors through every page of a result set."""
+    names, cursor = [], None
+    while True:
+        page = service.result_page(result_id, sort, cursor, limit)
+        names.extend(p['display_name'] for p in page['points'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return names
+
+def test_pages_follow_stable_sort_orders(service):
+    """Test contribution, distance and name orders, with ties broken by row."""
+    result_id = service.analyze_directions(REFERENCE_POINT, ['north'], format=None)['result_id']
+    assert walk(service, result_id, 'contribution', 2) == ['Alice', 'Dave', 'carol', 'bob']
+    assert walk(service, result_id, 'distance', 3) == ['carol', 'Alice', 'bob', 'Dave']
+    assert walk(service, result_id, 'name', 1) == ['Alice', 'bob', 'carol', 'Dave']
+
+def test_repeated_query_reuses_result_id(service):
+    """Test that the same query maps to the same stored result set."""
+    first = service.analyze_directions(REFERENCE_POINT, ['north'])
+    second = service.analyze_directions(REFERENCE_POINT, ['north'])
+    assert first['result_id'] == second['result_id']
+    assert len(first['points']) == 4
+
+def test_result_sets_are_shared_between_workers(service):
+    """Test that another worker's service pages through a result set it did not compute."""
+    result_id = service.analyze_directions(REFERENCE_POINT, ['north'], format=None)['result_id']
+    first_page = service.result_page(result_id, 'name', None, 2)
+    other = AnalysisService()
+    assert other.get_analysis_results(result_id)['reference_point'] == REFERENCE_POINT
+    assert walk(other, result_id, 'name', 2) == walk(service, result_id, 'name', 2)
+    assert other.result_page(result_id, 'name', first_page['next_cursor'], 2)['points'][0]['display_name'] == 'carol'
+    with pytest.raises(ValueError, match='not found'):
+        other.result_page('../../etc-passwd', 'name')
+
+def test_result_sets_outlive_pruned_revisions(service, tmp_path):
+    """Test that refinement revisions pruning the version a result was computed on keep the result."""
+    result_id = service.analyze_directions(REFERENCE_POINT, ['north'], format=None)['result_id']
+    store = service.datasets
+    for _ in range(4):
+        store.publish(str(tmp_path / 'processed_20240101_000000.csv'), store.next_revision('20240101_000000'))
+    assert store.open('20240101_000000') is None
+    assert walk(service, result_id, 'name', 2) == ['Alice', 'bob', 'carol', 'Dave']
+    assert walk(AnalysisService(), result_id, 'name', 2) == ['Alice', 'bob', 'carol', 'Dave']
+
+def test_stream_batches_match_pages(service):
+    """Test that streamed batches carry the same points as the pages."""
+    result_id = service.analyze_directions(REFERENCE_POINT, ['north'], format=None)['result_id']
+    streamed = [p for batch in service.iter_result_points(result_id, 'name', batch_size=3) for p in batch]
+    assert [p['display_name'] for p in streamed] == walk(service, result_id, 'name', 10)
+
+def test_cursor_is_bound_to_result_and_sort(service):
+    """Test that cursors are opaque, validated and tied to their sort order."""
+    result_id = service.analyze_directions(REFERENCE_POINT, ['north'], format=None)['result_id']
+    cursor = service.result_page(result_id, 'name', limit=1)['next_cursor']
+    assert decode_cursor(cursor) == (result_id, 'name', 1)
+    with pytest.raises(ValueError):
+        service.result_page(result_id, 'distance', cursor)
+    with pytest.raises(ValueError):
+        decode_cursor('not a cursor')
+    assert decode_cursor(encode_cursor('x', 'name', 5)) == ('x', 'name', 5)
+
+def test_analyze_sites_matches_single_site_analysis(service):
+    """Test that batch site stats agree with analyze_directions per site."""
+    sites = [{'id': 'a', 'lat': 30.45, 'lng': -86.5}, {'id': 'b', 'lat': 30.72, 'lng': -86.5}]
+    result = service.analyze_sites(sites, ['north', 'south'], rings=[50])
+    for site_result, site in zip(result['sites'], sites):
+        single = service.analyze_directions(site, ['north', 'south'], format=None)['stats']
+        assert site_result['records_analyzed'] == single['records_analyzed']
+        counts = {name: stats['count'] for name, stats in site_result['direction_stats'].items()}
+        assert counts == {name: single['direction_filtered'][name] for name in ('north', 'south')}
+    assert [s['catchment']['count'] for s in result['sites']] == [1, 3]
+    assert result['sites'][0]['rings']['count'] == [[4, 0], [0, 0]]
+
+def test_top_k_rows_matches_full_sort():
+    """Test partial selection against a full stable sort, including ties and NaN."""
+    rng = np.random.default_rng(0)
+    values = rng.integers(0, 20, 1000).astype(float)
+    values[::7] = np.nan
+    mask = rng.random(1000) < 0.8
+    candidates = np.flatnonzero(mask & ~np.isnan(values))
+    for largest in (True, False):
+        key = -values[candidates] if largest else values[candidates]
+        expected = candidates[stable_order(key, candidates)]
+        for k in (1, 10, 37, len(candidates), len(candidates) + 5):
+            assert top_k_rows(values, mask, k, largest).tolist() == expected[:k].tolist()
+    assert len(top_k_rows(values, mask, 0)) == 0
+
+def test_top_k_by_contribution_and_distance(service):
+    """Test top-k givers, nearest households and the filters they combine with."""
+    top = service.top_k(2)
+    assert [p['display_name'] for p in top['points']] == ['Alice', 'Dave']
+    assert top['candidates'] == 5
+
+    nearest = service.top_k(3, by='distance', reference_point=REFERENCE_POINT, directions=['north'])
+    assert [p['display_name'] for p in nearest['points']] == ['carol', 'Alice', 'bob']
+    assert nearest['points'][0]['direction'] == 'north'
+
+    filtered = service.top_k(10, threshold=600, reference_point=REFERENCE_POINT, directions=['north'])
+    assert [p['display_name'] for p in filtered['points']] == ['Alice', 'Dave']
+
+    assert 'error' in service.top_k(5, by='distance')
+    assert 'error' in service.top_k(5, by='bogus')
@@ -0,0 +1,141 @@
+import multiprocessing
+import numpy as np
+import pytest
+from flask import Flask
+from app.services.analysis import AnalysisService
+from app.services.dataset import Dataset
+from app.services.polygons import Region, RegionStore, parse_geojson, points_in_ring
+
+# A 1 x 1 degree square with a 0.5 x 0.5 hole in the middle
+SQUARE_WITH_HOLE = {
+    'type': 'Polygon',
+    'coordinates': [
+        [[-87, 30], [-86, 30], [-86, 31], [-87, 31], [-87, 30]],
+        [[-86.75, 30.25], [-86.25, 30.25], [-86.25, 30.75], [-86.75, 30.75], [-86.75, 30.25]]
+    ]
+}
+
+PROCESSED_CSV = """address,contribution_amount,display_name,latitude,longitude
+"1 Main St",500.0,carol,30.50,-86.50
+"2 Oak Ave",1200.0,Alice,30.60,-86.50
+"3 Pine Rd",500.0,bob,30.70,-86.50
+"4 Elm St",900.0,Dave,30.80,-86.50
+"5 Bay Dr",100.0,Erin,,
+"""
+
+# Covers Alice and bob only
+BAND = {
+    'type': 'Feature',
+    'properties': {'name': 'Band'},
+    'geometry': {'type': 'Polygon',
+                 'coordinates': [[[-86.6, 30.55], [-86.4, 30.55], [-86.4, 30.75], [-86.6, 30.75]]]}
+}
+
+@pytest.fixture
+def service(tmp_path):
+    """Create an analysis service over a small published dataset."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(PROCESSED_CSV)
+    with app.app_context():
+        service = AnalysisService()
+        assert service.load_current()
+        yield service
+
+def test_parse_geojson_shapes():
+    """Test Polygon, MultiPolygon, Feature and FeatureCollection input."""
+    assert len(parse_geojson(SQUARE_WITH_HOLE)) == 1
+    assert len(parse_geojson(SQUARE_WITH_HOLE)[0]) == 2
+    multi = {'type': 'MultiPolygon', 'coordinates': [SQUARE_WITH_HOLE['coordinates']] * 2}
+    assert len(parse_geojson({'type': 'FeatureCollection', 'features': [BAND, {'type': 'Feature', 'geometry': multi}]})) == 3
+    # Unclosed rings are closed
+    assert np.array_equal(parse_geojson(BAND)[0][0][-1], [-86.6, 30.55])
+    for invalid in ({'type': 'Point', 'coordinates': [0, 0]}, {'type': 'Polygon', 'coordinates': [[[0, 0], [1, 1]]]},
+                    {'type': 'FeatureCollection', 'features': []}, []):
+        with pytest.raises(ValueError):
+            parse_geojson(invalid)
+
+def test_region_contains_respects_holes_and_missing_coordinates():
+    """Test membership inside the ring, inside the hole, outside and without coordinates."""
+    region = Region('r1', 'Parish', SQUARE_WITH_HOLE)
+    lat = np.array([30.1, 30.5, 31.5, np.nan, 30.9])
+    lng = np.array([-86.9, -86.5, -86.5, -86.5, -86.1])
+    assert region.contains(lat, lng).tolist() == [True, False, False, False, True]
+    assert region.bbox == (-87.0, 30.0, -86.0, 31.0)
+
+def test_ray_casting_matches_reference_on_concave_ring():
+    """Test vectorized ray casting against a per-point loop on a concave ring."""
+    ring = parse_geojson({'type': 'Polygon', 'coordinates': [
+        [[0, 0], [4, 0], [4, 4], [2, 1], [0, 4], [0, 0]]]})[0][0]
+    rng = np.random.default_rng(0)
+    lng, lat = rng.uniform(-1, 5, 2000), rng.uniform(-1, 5, 2000)
+
+    def inside(x, y):
+        result = False
+        for (ax, ay), (bx, by) in zip(ring[:-1], ring[1:]):
+            if (ay > y) != (by > y) and x < ax + (y - ay) * (bx - ax) / (by - ay):
+                result = not result
+        return result
+
+    assert points_in_ring(lng, lat, ring).tolist() == [inside(x, y) for x, y in zip(lng, lat)]
+
+def test_store_persists_regions_per_dataset_and_caches_masks(tmp_path):
+    """Test that regions survive a new store, follow refinements and cache read-only masks."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        store = RegionStore()
+        region = store.add('20240101_000000', 'Parish', SQUARE_WITH_HOLE)
+        assert [r.region_id for r in RegionStore().list('20240101_000000.001')] == [region.region_id]
+        assert RegionStore().list('20240202_000000') == []
+
+        dataset = Dataset('20240101_000000', '', {'latitude': np.array([30.1, 30.5]),
+                                                  'longitude': np.array([-86.9, -86.5])}, {'rows': 2})
+        mask = store.mask(dataset, region.region_id)
+        assert mask.tolist() == [True, False]
+        assert store.mask(dataset, region.region_id) is mask
+        assert not mask.flags.writeable
+        with pytest.raises(ValueError):
+            store.mask(dataset, 'missing')
+
+        assert store.remove('20240101_000000', region.region_id)
+        assert not store.remove('20240101_000000', region.region_id)
+
+def _add_many(folder, worker):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = folder
+    with app.app_context():
+        store = RegionStore()
+        for i in range(10):
+            store.add('20240101_000000', f'Region {worker}-{i}', SQUARE_WITH_HOLE)
+
+def test_store_keeps_regions_added_by_concurrent_workers(tmp_path):
+    """Test that the region file read-modify-write is serialized across processes."""
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_add_many, args=(str(tmp_path), n)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    with app.app_context():
+        assert len(RegionStore().list('20240101_000000')) == 40
+
+def test_analysis_within_region(service):
+    """Test region summaries, region-filtered directions and distinct result IDs."""
+    summary = service.add_region('Band', BAND)
+    assert summary['households'] == 2
+    assert summary['contribution_stats']['sum'] == 1700.0
+    assert [r['name'] for r in service.list_regions()] == ['Band']
+
+    reference_point = {'lat': 30.0, 'lng': -86.5, 'threshold': 0}
+    everyone = service.analyze_directions(reference_point, ['north'])
+    inside = service.analyze_directions(reference_point, ['north'], region_id=summary['region_id'])
+    assert sorted(p['display_name'] for p in inside['points']) == ['Alice', 'bob']
+    assert inside['stats']['region_records'] == 2
+    assert inside['result_id'] != everyone['result_id']
+
+    matrix = service.sector_matrix(reference_point, rings=[], region_id=summary['region_id'])
+    assert matrix['count'][0] == [2]
+    assert 'error' in service.analyze_directions(reference_point, ['north'], region_id='missing')
@@ -0,0 +1,51 @@
+import pytest
+from types import SimpleNamespace
+from flask import Flask
+from app.services.geocoding import GeocodingService
+from app.services.spatial import SpatialGridIndex
+
+class StubReverseProvider:
+    def __init__(self):
+        self.calls = 0
+    
+    def reverse(self, lat_lng):
+        self.calls += 1
+        return SimpleNamespace(address=f'Near {lat_lng[0]:.4f},{lat_lng[1]:.4f}', raw={'stub': True})
+
+@pytest.fixture
+def service(tmp_path):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['REVERSE_GEOCODING_TOLERANCE_M'] = 50
+    with app.app_context():
+        service = GeocodingService()
+        service._provider = StubReverseProvider()
+        yield service
+
+def test_grid_index_nearest_within_tolerance():
+    """Test nearest lookup across cell boundaries and beyond tolerance."""
+    index = SpatialGridIndex(cell_degrees=0.001)
+    index.add(30.39990, -86.50000, 'a')
+    index.add(30.40100, -86.50000, 'b')
+    # ~22 m from 'a', across a cell boundary
+    assert index.nearest(30.40010, -86.50000, tolerance_m=50) == 'a'
+    assert index.nearest(30.40500, -86.50000, tolerance_m=50) is None
+
+def test_nearby_clicks_share_one_provider_call(service):
+    """Test that points a few metres apart are answered from the cache."""
+    first = service.reverse_geocode(30.400000, -86.500000)
+    second = service.reverse_geocode(30.400005, -86.500010)
+    assert second == first
+    assert service._provider.calls == 1
+    
+    service.reverse_geocode(30.410000, -86.500000)
+    assert service._provider.calls == 2
+
+def test_reverse_cache_persists_and_reindexes(service):
+    """Test that a fresh service rebuilds the grid index from the cache file."""
+    service.reverse_geocode(30.400000, -86.500000)
+    
+    restarted = GeocodingService()
+    restarted._provider = StubReverseProvider()
+    assert restarted.reverse_geocode(30.400100, -86.500000)['address'].startswith('Near 30.4000')
+    assert restarted._provider.calls == 0
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+from app.services.dataset import Dataset
+from app.services.sectors import (PolarCache, SectorScheme, aggregate_cells, classify,
+                                  initial_bearing, ring_labels, sector_matrix, sector_scheme,
+                                  site_sectors)
+
+REFERENCE_POINT = {'lat': 30.0, 'lng': -86.0}
+
+def test_initial_bearing_cardinal_points():
+    """Test bearings towards the four cardinal directions."""
+    bearings = initial_bearing(30.0, -86.0, np.array([30.1, 30.0, 29.9, 30.0]),
+                               np.array([-86.0, -85.9, -86.0, -86.1]))
+    assert np.allclose(bearings, [0, 90, 180, 270], atol=0.1)
+
+def test_uniform_schemes_centre_first_sector_on_north():
+    """Test 4, 8 and 16 sector schemes, including the wrap around north."""
+    four = SectorScheme.uniform(4)
+    assert [four.names[i] for i in four.classify([350, 10, 100, 200, 300])] == \
+        ['north', 'north', 'east', 'south', 'west']
+    eight = SectorScheme.uniform(8)
+    assert eight.names[eight.classify([45])[0]] == 'northeast'
+    assert len(SectorScheme.uniform(16)) == 16
+    with pytest.raises(ValueError):
+        SectorScheme.uniform(5)
+
+def test_custom_angles_match_uniform_scheme():
+    """Test that DIRECTION_ANGLES-style maps give the same sectors."""
+    angles = {'north': (315, 45), 'east': (45, 135), 'south': (135, 225), 'west': (225, 315)}
+    bearings = np.arange(0, 360, 7.5)
+    custom, uniform = sector_scheme(angles), sector_scheme(4)
+    assert [custom.names[i] for i in custom.classify(bearings)] == \
+        [uniform.names[i] for i in uniform.classify(bearings)]
+    with pytest.raises(ValueError):
+        sector_scheme({'front': (0, 90), 'back': (180, 270)})
+
+def test_aggregate_cells_matches_pandas():
+    """Test per-cell count, sum, mean and median against a groupby."""
+    rng = np.random.default_rng(0)
+    cells = rng.integers(-1, 6, 500)
+    values = rng.uniform(0, 1000, 500)
+    values[::17] = np.nan
+    stats = aggregate_cells(cells, values, 6)
+    for cell in range(6):
+        in_cell = values[cells == cell]
+        assert stats['count'][cell] == len(in_cell)
+        assert np.isclose(stats['sum'][cell], np.nansum(in_cell))
+        assert np.isclose(stats['median'][cell], np.nanmedian(in_cell))
+
+def test_sector_matrix_with_rings():
+    """Test a sector x ring matrix around a reference point."""
+    lat = np.array([30.005, 30.05, 29.95, 30.0, np.nan])
+    lng = np.array([-86.0, -86.0, -86.0, -85.95, -86.0])
+    contributions = np.array([100.0, 200.0, 300.0, 400.0, 500.0])
+    matrix = sector_matrix(lat, lng, contributions, REFERENCE_POINT, SectorScheme.uniform(4), [1, 5])
+    assert matrix['rings'] == ring_labels([1, 5]) == ['0-1 km', '1-5 km', '5+ km']
+    assert matrix['count'] == [[1, 0, 1], [0, 1, 0], [0, 0, 1], [0, 0, 0]]
+    assert matrix['sum'][0] == [100.0, 0.0, 200.0]
+
+def make_dataset(version, count=100):
+    """Build an in-memory dataset of random households."""
+    rng = np.random.default_rng(0)
+    columns = {'latitude': 30 + rng.random(count), 'longitude': -86.5 + rng.random(count)}
+    return Dataset(version, '', columns, {'rows': count})
+
+def test_polar_cache_reuses_arrays_per_reference_point():
+    """Test that repeated lookups hit the cache and return read-only arrays."""
+    cache = PolarCache(max_entries=2)
+    dataset = make_dataset('v1')
+    first = cache.get(dataset, REFERENCE_POINT)
+    assert cache.get(dataset, {'lat': 30.0 + 1e-9, 'lng': -86.0}) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert not first['bearing'].flags.writeable
+    with pytest.raises(ValueError):
+        first['distance_km'][0] = 0
+    assert cache.get(make_dataset('v2'), REFERENCE_POINT) is not first
+
+def test_polar_cache_evicts_least_recently_used():
+    """Test that the cache stays bounded and keeps recently used entries."""
+    cache = PolarCache(max_entries=2)
+    dataset = make_dataset('v1')
+    a = cache.get(dataset, {'lat': 30.0, 'lng': -86.0})
+    cache.get(dataset, {'lat': 31.0, 'lng': -86.0})
+    cache.get(dataset, {'lat': 30.0, 'lng': -86.0})
+    cache.get(dataset, {'lat': 32.0, 'lng': -86.0})
+    assert len(cache) == 2
+    assert cache.get(dataset, {'lat': 30.0, 'lng': -86.0}) is a
+    assert cache.misses == 3
+
+def test_classify_with_cached_polar_matches_direct():
+    """Test that classifying from cached coordinates gives the same cells."""
+    dataset = make_dataset('v1')
+    polar = PolarCache().get(dataset, REFERENCE_POINT)
+    scheme = SectorScheme.uniform(8)
+    direct = classify(dataset['latitude'], dataset['longitude'], REFERENCE_POINT, scheme, [10, 50])
+    cached = classify(dataset['latitude'], dataset['longitude'], REFERENCE_POINT, scheme, [10, 50], polar)
+    assert np.array_equal(direct['sector'], cached['sector'])
+    assert np.array_equal(direct['ring'], cached['ring'])
+
+def test_site_sectors_match_single_site_classification():
+    """Test that chunked multi-site classification matches one site at a time."""
+    dataset = make_dataset('v1', count=1000)
+    dataset['latitude'][::50] = np.nan
+    sites = [REFERENCE_POINT, {'lat': 30.5, 'lng': -86.0}, {'lat': 30.9, 'lng': -86.3}]
+    scheme = SectorScheme.uniform(8)
+    placed = site_sectors(dataset['latitude'], dataset['longitude'], sites, scheme, [10, 50], chunk_size=128)
+    for i, site in enumerate(sites):
+        single = classify(dataset['latitude'], dataset['longitude'], site, scheme, [10, 50])
+        assert np.array_equal(placed['sector'][i], single['sector'])
+        assert np.array_equal(placed['ring'][i], single['ring'])
+    distances = np.array([classify(dataset['latitude'], dataset['longitude'], site, scheme)['distance_km']
+                          for site in sites])
+    located = ~np.isnan(dataset['latitude'])
+    assert np.array_equal(placed['nearest'][located], np.argmin(distances[:, located], axis=0))
+    assert (placed['nearest'][~located] == -1).all()
+
+def test_aggregate_cells_with_presorted_values():
+    """Test that medians from a shared value order match the full sort."""
+    rng = np.random.default_rng(1)
+    values = rng.uniform(0, 1000, 300)
+    values[::13] = np.nan
+    order = np.argsort(values)
+    for _ in range(3):
+        cells = rng.integers(-1, 5, 300)
+        expected = aggregate_cells(cells, values, 5)
+        presorted = aggregate_cells(cells, values, 5, order)
+        assert np.allclose(expected['median'], presorted['median'])
+        assert np.array_equal(expected['count'], presorted['count'])
@@ -0,0 +1,121 @@
+import json
+import numpy as np
+import pytest
+from flask import Flask
+from app.services.analysis import AnalysisService
+from app.services.dataset import KeyIndex
+
+LAST_YEAR = """record_id,address,address_key,contribution_amount,display_name,latitude,longitude,postal_code
+101,"1 Main St",1 MAIN ST,500.0,carol,30.50,-86.50,32541
+102,"2 Oak Ave",2 OAK AVE,1200.0,Alice,30.60,-86.50,32541
+103,"3 Pine Rd",3 PINE RD,300.0,bob,30.70,-86.50,32578
+104,"4 Elm St",4 ELM ST,900.0,Dave,30.80,-86.50,32578
+"""
+
+# carol gives more, Alice moved south and to another ZIP, bob lapsed, Frank is new
+THIS_YEAR = """record_id,address,address_key,contribution_amount,display_name,latitude,longitude,postal_code
+102,"9 Bay Dr",9 BAY DR,1000.0,Alice,29.60,-86.50,32547
+101,"1 Main St",1 MAIN ST,800.0,carol,30.50,-86.50,32541
+104,"4 Elm St",4 ELM ST,900.0,Dave,30.80,-86.50,32578
+105,"5 Gulf Way",5 GULF WAY,250.0,Frank,30.90,-86.50,32578
+"""
+
+# The household without a record ID turns the column into floats unless it is read as text
+CENTROID_UPLOAD = """record_id,address,address_key,contribution_amount,display_name,latitude,longitude,postal_code,geo_precision
+101,"1 Main St",1 MAIN ST,500.0,carol,30.50,-86.50,32541,zip
+102,"2 Oak Ave",2 OAK AVE,1200.0,Alice,30.60,-86.50,32541,zip
+103,"3 Pine Rd",3 PINE RD,300.0,bob,30.70,-86.50,32578,zip
+104,"4 Elm St",4 ELM ST,900.0,Dave,30.80,-86.50,32578,zip
+,"6 Palm Ct",6 PALM CT,100.0,erin,30.95,-86.50,32578,zip
+"""
+
+REFERENCE_POINT = {'lat': 30.0, 'lng': -86.5}
+
+@pytest.fixture
+def service(tmp_path):
+    """Create an analysis service with two processed uploads."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    (tmp_path / 'processed_20240101_000000.csv').write_text(LAST_YEAR)
+    (tmp_path / 'processed_20250101_000000.csv').write_text(THIS_YEAR)
+    with app.app_context():
+        yield AnalysisService()
+
+def test_key_index_lookup_and_fallback():
+    """Test record ID lookups, missing keys and the address fallback."""
+    index = KeyIndex.build({'record_id': np.array(['7', '3', '', '3']), 'address_key': np.array(['A', 'B', 'C', 'D'])})
+    assert index.key_column == 'record_id'
+    assert index.lookup(np.array(['3', '7', '9', ''])).tolist() == [1, 0, -1, -1]
+    assert KeyIndex.build({'record_id': np.array(['', '']), 'address_key': np.array(['A', 'B'])}).key_column == 'address_key'
+
+def test_catalog_lists_processed_uploads(service):
+    """Test the snapshot catalog over the upload folder."""
+    snapshots = service.snapshots.list()
+    assert [s['snapshot_id'] for s in snapshots] == ['20240101_000000', '20250101_000000']
+    assert snapshots[0]['created'] == '2024-01-01T00:00:00'
+    assert service.snapshots.open('../etc') is None
+
+def test_compare_snapshots(service, tmp_path):
+    """Test new, lapsed and retained giving, ZIP and direction moves and per-household changes."""
+    result = service.compare_snapshots('20240101_000000', '20250101_000000', REFERENCE_POINT)
+    assert (tmp_path / 'datasets' / '20250101_000000' / 'key_index.npz').exists()
+
+    summary = result['summary']
+    assert summary['key'] == 'record_id'
+    assert summary['total_change'] == 2950.0 - 2900.0
+    assert summary['new'] == {'households': 1, 'total': 250.0}
+    assert summary['lapsed'] == {'households': 1, 'total': 300.0}
+    assert {k: summary['retained'][k] for k in ('households', 'increased', 'decreased', 'unchanged')} == \
+        {'households': 3, 'increased': 1, 'decreased': 1, 'unchanged': 1}
+    assert summary['zip_moves']['top'] == [{'from': '32541', 'to': '32547', 'households': 1}]
+    assert summary['direction_moves']['top'] == [{'from': 'north', 'to': 'south', 'households': 1}]
+    by_zip = {row['postal_code']: row['change'] for row in summary['by_zip']}
+    assert by_zip == {'32541': -900.0, '32547': 1000.0, '32578': -50.0}
+
+    households = {h['display_name']: h for h in result['households']}
+    assert households['carol']['change'] == 300.0
+    assert households['bob']['status'] == 'lapsed'
+    assert households['Alice']['direction_after'] == 'south'
+    assert [h['display_name'] for h in result['households']][:2] == ['carol', 'bob']
+
+    lapsed = service.compare_snapshots('20240101_000000', '20250101_000000', status='lapsed')
+    assert [h['display_name'] for h in lapsed['households']] == ['bob']
+    assert 'error' in service.compare_snapshots('20240101_000000', '20990101_000000')
+
+class StreetGeocoder:
+    def geocode_address(self, address):
+        return {'lat': 30.0, 'lng': -86.0, 'precision': 'street'}
+
+def test_compare_with_refined_copy_retains_every_household(service, tmp_path):
+    """Test that refining coordinates keeps record IDs, so a refined upload still joins to its original."""
+    (tmp_path / 'processed_20240101_000000.csv').write_text(CENTROID_UPLOAD)
+    (tmp_path / 'processed_20250101_000000.csv').write_text(CENTROID_UPLOAD)
+    assert service.refine_geocodes('20250101_000000', StreetGeocoder())['refined'] == 5
+    assert '\n101,' in (tmp_path / 'processed_20250101_000000.csv').read_text()
+
+    summary = service.compare_snapshots('20240101_000000', '20250101_000000')['summary']
+    assert summary['key'] == 'record_id'
+    assert summary['retained']['households'] == 4
+    assert summary['new']['households'] == summary['lapsed']['households'] == 0
+
+def test_refinement_publishes_once_when_done(service, tmp_path):
+    """Test that a refinement finishing within the publish interval adds a single revision."""
+    lines = ['record_id,address,address_key,contribution_amount,display_name,latitude,longitude,postal_code,geo_precision']
+    lines += [f'{n},"{n} Main St",{n} MAIN ST,10.0,x,30.5,-86.5,32541,zip' for n in range(1, 121)]
+    (tmp_path / 'processed_20250101_000000.csv').write_text('\n'.join(lines) + '\n')
+    assert service.refine_geocodes('20250101_000000', StreetGeocoder()) == \
+        {'analysis_id': '20250101_000000', 'refined': 120, 'remaining': 0}
+    assert [v for v in service.datasets.published_versions() if v.startswith('20250101_000000')] == \
+        ['20250101_000000.001']
+
+def test_record_ids_from_family_info_of_older_artifacts(service, tmp_path):
+    """Test that uploads processed before record_id had a column still join on it."""
+    rows = [('1 Main St', 500.0, '101'), ('2 Oak Ave', 700.0, '102')]
+    lines = ['address,contribution_amount,display_name,family_info']
+    for address, amount, record_id in rows:
+        info = json.dumps({'record_id': record_id}).replace('"', '""')
+        lines.append(f'"{address}",{amount},x,"{info}"')
+    (tmp_path / 'processed_20230101_000000.csv').write_text('\n'.join(lines) + '\n')
+    result = service.compare_snapshots('20230101_000000', '20240101_000000')
+    assert result['summary']['key'] == 'record_id'
+    assert result['summary']['retained']['households'] == 2
@@ -0,0 +1,17 @@
+from benchmarks.startup import measure_startup
+
+# Startup budget for a cold worker, in seconds. Generous enough for a slow
+# CI box; importing the heavy service dependencies alone blows through it.
+IMPORT_BUDGET = 0.5
+CREATE_APP_BUDGET = 0.25
+
+def test_startup_does_not_import_heavy_libraries():
+    """Test that app import and create_app() leave heavy libraries unloaded."""
+    result = measure_startup()
+    assert result['heavy_modules'] == []
+
+def test_startup_within_budget():
+    """Test that import and create_app() time stay within budget."""
+    result = min((measure_startup() for _ in range(3)), key=lambda r: r['import_seconds'])
+    assert result['import_seconds'] < IMPORT_BUDGET
+    assert result['create_app_seconds'] < CREATE_APP_BUDGET
@@ -0,0 +1,124 @@
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import tracemalloc
+import pytest
+from flask import Flask
+from app.api import bp, routes
+from app.services.uploads import UploadStore, csv_name
+
+SAMPLE_CSV = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'jk-st-rita.csv')
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """Create an app with the API blueprint and fresh services over a temporary upload folder."""
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['UPLOAD_CHUNK_BYTES'] = 4096
+    app.register_blueprint(bp, url_prefix='/api')
+    monkeypatch.setattr(routes, 'analysis_service', None)
+    monkeypatch.setattr(routes, 'upload_store', None)
+    return app
+
+def test_plain_and_gzip_uploads_hash_the_same(app, tmp_path):
+    """Test that uploads are decompressed while hashing, so compression does not change the hash."""
+    content = b'a,b\n' + b'1,2\n' * 10000
+    with app.app_context():
+        store = UploadStore()
+        plain = store.save_stream(io.BytesIO(content))
+        packed = store.save_stream(io.BytesIO(gzip.compress(content)))
+    assert plain['sha256'] == packed['sha256']
+    assert (plain['compression'], packed['compression']) == (None, 'gzip')
+    assert packed['received_bytes'] < packed['csv_bytes'] == len(content)
+    with open(packed['path'], 'rb') as f:
+        assert f.read() == content
+
+def test_rejected_uploads_leave_no_files(app, tmp_path):
+    """Test empty, truncated and oversized uploads."""
+    app.config['UPLOAD_MAX_CSV_BYTES'] = 100
+    with app.app_context():
+        store = UploadStore()
+        for body in (b'', gzip.compress(b'a,b\n1,2\n')[:-8], b'x' * 200):
+            with pytest.raises(ValueError):
+                store.save_stream(io.BytesIO(body))
+    assert os.listdir(tmp_path) == []
+    assert csv_name('giving.csv.zst') == 'giving.csv'
+
+def test_repeat_upload_returns_existing_analysis(app, tmp_path):
+    """Test that re-uploading processed content skips processing."""
+    with open(SAMPLE_CSV, 'rb') as f:
+        content = f.read()
+    client = app.test_client()
+
+    first = client.post('/api/upload', data={'file': (io.BytesIO(gzip.compress(content)), 'giving.csv.gz')})
+    assert first.status_code == 200
+    assert first.json['duplicate'] is False
+    assert first.json['upload']['compression'] == 'gzip'
+    assert (tmp_path / 'giving.csv').read_bytes() == content
+
+    again = client.post('/api/upload?filename=giving.csv', data=content, content_type='text/csv')
+    assert again.status_code == 200
+    assert again.json['duplicate'] is True
+    assert again.json['analysis']['analysis_id'] == first.json['analysis']['analysis_id']
+    assert len([name for name in os.listdir(tmp_path) if name.startswith('processed_')]) == 1
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.part')]
+
+    response = client.post('/api/upload', data={'file': (io.BytesIO(b'a'), 'giving.xlsx')})
+    assert response.status_code == 400
+
+def test_concatenated_gzip_members_are_all_decompressed(app):
+    """Test multi-member gzip (pigz, cat a.gz b.gz) against the plain content."""
+    content = b'a,b\n' + b'1,2\n' * 5000
+    with app.app_context():
+        store = UploadStore()
+        plain = store.save_stream(io.BytesIO(content + content))
+        members = store.save_stream(io.BytesIO(gzip.compress(content) + gzip.compress(content)))
+    assert members['csv_bytes'] == 2 * len(content)
+    assert members['sha256'] == plain['sha256']
+
+def test_size_limit_is_checked_before_a_bomb_expands(app, tmp_path):
+    """Test that a small, highly compressed upload over the limit never expands in memory."""
+    app.config['UPLOAD_MAX_CSV_BYTES'] = 1000
+    bomb = gzip.compress(b'\0' * (64 * 1024 * 1024))
+    tracemalloc.start()
+    try:
+        with app.app_context():
+            with pytest.raises(ValueError, match='larger than'):
+                UploadStore().save_stream(io.BytesIO(bomb))
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak < 4 * 1024 * 1024
+    assert os.listdir(tmp_path) == []
+
+def test_truncated_zstd_upload_is_rejected(app, tmp_path):
+    """Test that a zstd frame cut short is an error rather than a shorter CSV."""
+    zstandard = pytest.importorskip('zstandard')
+    content = b'a,b\n' + b'1,2\n' * 10000
+    packed = zstandard.ZstdCompressor().compress(content)
+    with app.app_context():
+        store = UploadStore()
+        assert store.save_stream(io.BytesIO(packed + packed))['csv_bytes'] == 2 * len(content)
+        with pytest.raises(ValueError, match='truncated'):
+            store.save_stream(io.BytesIO(packed[:-8]))
+
+def _record_many(folder, worker):
+    app = Flask(__name__)
+    app.config['UPLOAD_FOLDER'] = folder
+    with app.app_context():
+        store = UploadStore()
+        for i in range(25):
+            store.record(f'{worker}-{i}', f'analysis-{worker}-{i}', 'giving.csv')
+
+def test_index_keeps_entries_recorded_by_concurrent_workers(tmp_path):
+    """Test that the upload index read-modify-write is serialized across processes."""
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_record_many, args=(str(tmp_path), n)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    with open(tmp_path / 'upload_index.json') as f:
+        assert len(json.load(f)) == 100
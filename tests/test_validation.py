@@ -0,0 +1,57 @@
+import io
+import pandas as pd
+from app.services.ingest import CONTRIBUTION_COLUMNS, ingest_csv
+from app.services.validation import validate_frame
+
+HEADER = ('dp_RecordID,HOH_Titles,Family_Name,Address_Line_1,Address_Line_2,City,State/Region,'
+          'Postal_Code,Taxable_Donations_Last_52,CSA_Last_Year,Offertory_Rolling_52\n')
+
+def _row(record_id, street='1 Main St', postal_code='66209', taxable='$1,200.00', csa='0', offertory='10'):
+    return f'{record_id},Mr.,Smith,{street},,Leawood,KS,{postal_code},"{taxable}",{csa},{offertory}\n'
+
+def test_every_check_runs_over_the_whole_frame():
+    """Test the issue table and which issues reject their row."""
+    rows = [
+        _row(1),
+        _row(2, taxable='12.5.0'),
+        _row(3, csa='-25'),
+        _row(4, postal_code='6620'),
+        _row(5, street=''),
+        _row(6, street='P.O. Box 12'),
+        _row(1, postal_code='66209-1234'),
+    ]
+    df = pd.read_csv(io.StringIO(HEADER + ''.join(rows)), dtype=str)
+    rejected, issues = validate_frame(df, CONTRIBUTION_COLUMNS)
+
+    assert rejected.tolist() == [False, True, True, False, False, False, True]
+    assert issues[['row', 'code', 'column']].values.tolist() == [
+        [2, 'bad_currency', 'Taxable_Donations_Last_52'],
+        [3, 'negative_amount', 'CSA_Last_Year'],
+        [4, 'bad_zip', 'Postal_Code'],
+        [5, 'empty_address', 'Address_Line_1'],
+        [6, 'po_box', 'Address_Line_1'],
+        [7, 'duplicate_record_id', 'dp_RecordID'],
+    ]
+    assert issues['value'].tolist()[:2] == ['12.5.0', '-25']
+
+def test_ingestion_drops_rejected_rows_across_chunks(tmp_path):
+    """Test that repeated record IDs are caught across chunks and row numbers are global."""
+    rows = [_row(i) for i in range(300)] + [_row(5), _row(400, taxable='abc')]
+    path = tmp_path / 'upload.csv'
+    path.write_text(HEADER + ''.join(rows))
+
+    serial = ingest_csv(str(path), str(tmp_path / 'serial.csv'), issues_path=str(tmp_path / 'serial_issues.csv'))
+    chunked = ingest_csv(str(path), str(tmp_path / 'chunked.csv'), chunk_bytes=2000,
+                         issues_path=str(tmp_path / 'chunked_issues.csv'))
+
+    assert chunked['chunks'] > 2
+    assert (tmp_path / 'serial.csv').read_bytes() == (tmp_path / 'chunked.csv').read_bytes()
+    assert (tmp_path / 'serial_issues.csv').read_bytes() == (tmp_path / 'chunked_issues.csv').read_bytes()
+    assert serial['validation'] == chunked['validation']
+    assert serial['total_records'] == 300
+
+    validation = chunked['validation']
+    assert (validation['rows_checked'], validation['rows_valid'], validation['rows_rejected']) == (302, 300, 2)
+    assert validation['rejected_by'] == {'duplicate_record_id': 1, 'bad_currency': 1}
+    issues = pd.read_csv(tmp_path / 'chunked_issues.csv')
+    assert issues[['row', 'code']].values.tolist() == [[301, 'duplicate_record_id'], [302, 'bad_currency']]
@@ -0,0 +1,17 @@
+"""Production WSGI entry point.
+
+Run with ``gunicorn -c gunicorn.conf.py``. The app and the current dataset
+are loaded once in the gunicorn master (``preload_app``) so that every
+forked worker shares the same memory-mapped columns instead of parsing its
+own copy of the processed upload.
+"""
+from app import create_app
+from app.config import ProductionConfig
+
+app = create_app(ProductionConfig)
+
+with app.app_context():
+    from app.api.routes import get_analysis_service
+    dataset = get_analysis_service().datasets.preload()
+    if dataset is not None:
+        app.logger.info(f'Preloaded dataset {dataset.version} ({len(dataset)} records)')